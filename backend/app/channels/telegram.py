@@ -1,25 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import logging
 import os
-import requests
+import threading
+import time
 import uuid
 from typing import Dict, Any, Optional, List
 
+from app.services.conversation_store import ConversationStore
 from app.services.openai_service import (
     generate_response,
+    generate_response_stream,
+    summarize_conversation,
+    embed_text,
+    prompt_fingerprint,
     transcribe_audio_with_openai,
     synthesize_speech_with_openai
 )
-from app.services.google_service import synthesize_speech_with_google
+from app.services.google_service import (
+    synthesize_speech_bytes_with_google,
+    iter_speech_chunks_with_google
+)
+from app.services.response_cache import ResponseCache
+from app.services.tts_cache import tts_cache, tts_cache_key
+from app.utils.audio import AudioBuffer, AudioTooLargeError, buffer_from_chunks, REPLY_AUDIO_FORMATS
+from app.utils.config import get_config
+from app.utils.dedup import UpdateDeduplicator, DEDUP_PERSISTENT
+from app.utils.langid import detect_language, validate_language
+from app.utils.send_scheduler import send_budget, send_scheduler
+from app.utils import tracing
+from cal.clients import get_http_session, TELEGRAM_TIMEOUT
 from cal.storage import upload_to_gcs
 from cal.firestore import (
-    get_weekly_stats,
-    set_weekly_stats,
-    get_overall_summary,
-    set_overall_summary,
     log_interaction,
-    Increment
+    record_interaction_stats,
+    claim_update_id,
+    release_update_id,
 )
 
 LANGUAGE_MAP = {
@@ -46,6 +64,105 @@ LANGUAGE_MAP = {
 
 TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/"
 
+# "sequential" runs every stage inline; "concurrent" moves GCS/Firestore work off the reply path
+PIPELINE_MODE = get_config("PIPELINE_MODE", "sequential")
+PIPELINE_WORKERS = int(get_config("PIPELINE_WORKERS", 4))
+# "complete" waits for the whole LLM reply; "stream" posts the first tokens and edits the message as more arrive
+REPLY_MODE = get_config("REPLY_MODE", "complete")
+STREAM_EDIT_INTERVAL = float(get_config("STREAM_EDIT_INTERVAL", 1.0))
+# "single" synthesizes the whole reply at once; "chunked" synthesizes sentences in parallel
+# and joins them; "chunked_stream" sends each sentence's audio as soon as it is ready
+TTS_MODE = get_config("TTS_MODE", "single")
+# Encoding of spoken replies: "mp3" is sent with sendAudio as a music track, "ogg_opus"
+# with sendVoice as a voice note (smaller for speech); see REPLY_AUDIO_FORMATS
+VOICE_REPLY_FORMAT = get_config("VOICE_REPLY_FORMAT", "mp3")
+# Sent instead of a reply when a voice note is over AUDIO_MAX_BYTES (or the in-memory
+# limit, with AUDIO_SPILL_TO_DISK off)
+VOICE_TOO_LONG_MESSAGE = get_config(
+    "VOICE_TOO_LONG_MESSAGE",
+    "Sorry, that voice note is too long for me. Please send a shorter one or type your question.",
+)
+_pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+
+# Per-user conversation history sent to the LLM as context
+CONVERSATION_MEMORY = bool(get_config("CONVERSATION_MEMORY", False))
+conversation_store = ConversationStore(summarizer=summarize_conversation)
+
+# Replies to repeated questions; near-duplicate matching needs NumPy and one embedding call per lookup
+RESPONSE_CACHE = bool(get_config("RESPONSE_CACHE", False))
+RESPONSE_CACHE_SEMANTIC = bool(get_config("RESPONSE_CACHE_SEMANTIC", False))
+response_cache = ResponseCache(prompt_fingerprint(), embed_fn=embed_text if RESPONSE_CACHE_SEMANTIC else None)
+
+# In-process language identification: checks the language claimed by the LLM/Whisper
+# (which picks the TTS voice). ANSWER_FORMAT "plain" also lets it replace the LLM's
+# language detection, so the reply is plain text with no JSON to parse.
+LANGUAGE_ID = bool(get_config("LANGUAGE_ID", False))
+ANSWER_FORMAT = get_config("ANSWER_FORMAT", "json")
+
+# Adds the per-stage timing breakdown ({"llm": 812.4, ...} in ms) to each logs document
+TRACE_IN_LOGS = bool(get_config("TRACE_IN_LOGS", False))
+
+update_dedup = UpdateDeduplicator(
+    persistent_claim=claim_update_id if DEDUP_PERSISTENT else None,
+    persistent_release=release_update_id if DEDUP_PERSISTENT else None,
+)
+
+tracing.metrics.register_provider("tts_cache", tts_cache.stats)
+tracing.metrics.register_provider("response_cache", response_cache.stats)
+tracing.metrics.register_provider("update_dedup", update_dedup.stats)
+
+# -----------------------------
+# ⏱️ STAGE TIMINGS
+# -----------------------------
+class StageTimer:
+    """
+    Collects wall-clock durations (ms) for the stages of a single interaction.
+    Each stage is also a tracing span, so the service calls inside it nest under it.
+    """
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            with tracing.span(f"stage.{name}"):
+                yield
+        finally:
+            elapsed_ms = round((time.perf_counter() - t0) * 1000, 1)
+            with self._lock:
+                self.stages[name] = elapsed_ms
+
+    def mark(self, name: str):
+        """Records the time elapsed since the interaction started (e.g. time to first visible text)."""
+        with self._lock:
+            self.stages[name] = self.total_ms()
+
+    @property
+    def replied(self) -> bool:
+        """True once any part of the reply (text or audio) has reached the user."""
+        with self._lock:
+            return "first_text" in self.stages or "first_audio" in self.stages
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 1)
+
+    def log(self, mode: str, content_type: str, reply_ms: Optional[float] = None):
+        """Logs the per-stage breakdown alongside the total and reply-path wall-clock time."""
+        stages = ", ".join(f"{name}={ms}ms" for name, ms in self.stages.items())
+        tracing.metrics.observe("interaction.total_ms", self.total_ms(), mode=mode, type=content_type)
+        tracing.metrics.observe("interaction.reply_path_ms", reply_ms if reply_ms is not None else self.total_ms(),
+                                mode=mode, type=content_type)
+        for name in ("first_text", "first_audio"):
+            if name in self.stages:
+                tracing.metrics.observe(f"interaction.{name}_ms", self.stages[name], mode=mode, type=content_type)
+        logging.info(
+            f"[pipeline] mode={mode} type={content_type} total={self.total_ms()}ms "
+            f"reply_path={reply_ms if reply_ms is not None else self.total_ms()}ms stages: {stages}"
+        )
+
 # -----------------------------
 # 📅 DATE UTILITY
 # -----------------------------
@@ -65,44 +182,14 @@ def generate_log_doc_id(user_id: str, timestamp: datetime) -> str:
 # -----------------------------
 # 🤖 APPLICATION LOGIC FOR UPDATES
 # -----------------------------
-def update_language_distribution(current_data: Dict[str, Any], lang: str, is_voice: bool) -> Dict[str, Any]:
-    """
-    Updates the language_distribution array in a document (overall or weekly).
-    Performs a Read-Modify-Write operation on the array.
-    """
-    
-    lang_dist: List[Dict] = current_data.get("language_distribution", [])
-    
-    # Find existing language entry
-    found = False
-    for item in lang_dist:
-        if item.get("lang") == lang:
-            item["interactions"] = item.get("interactions", 0) + 1
-            if is_voice:
-                item["voice"] = item.get("voice", 0) + 1
-            found = True
-            break
-            
-    # If language not found, create a new entry
-    if not found:
-        new_entry = {
-            "lang": lang,
-            "interactions": 1,
-            "voice": 1 if is_voice else 0
-        }
-        lang_dist.append(new_entry)
-
-    current_data["language_distribution"] = lang_dist
-    return current_data
-
-
-def handle_new_interaction(interaction_data: Dict[str, Any], is_new_user: bool = False, timestamp: Optional[datetime] = None):
+def handle_new_interaction(interaction_data: Dict[str, Any], is_new_user: Optional[bool] = None, timestamp: Optional[datetime] = None):
     """
     Primary function to update all Firestore documents after a single interaction.
 
     Args:
         interaction_data: A dict containing log data (must include 'user_id', 'lang', 'modal').
-        is_new_user: Boolean indicating if this is the first interaction for this user_id.
+        is_new_user: Boolean indicating if this is the first interaction for this user_id
+            (None, the default, looks it up in the users collection).
         timestamp: Optional datetime object representing the interaction timestamp.
     """
     logging.info("handle_new_interaction called")
@@ -117,6 +204,7 @@ def handle_new_interaction(interaction_data: Dict[str, Any], is_new_user: bool =
     # Use passed timestamp or generate new if not provided
     log_entry_data = interaction_data.copy()
     log_entry_data["date"] = timestamp if timestamp else datetime.now(ZoneInfo("Asia/Kolkata"))
+    week_id = get_week_start_date_str(log_entry_data["date"])
     
     # -----------------------------
     # 1. LOG THE INTERACTION (Custom ID)
@@ -124,43 +212,12 @@ def handle_new_interaction(interaction_data: Dict[str, Any], is_new_user: bool =
     log_interaction(log_entry_data)
     
     # -----------------------------
-    # 2. UPDATE WEEKLY STATS (Read-Modify-Write)
+    # 2. UPDATE WEEKLY STATS + OVERALL SUMMARY (one batched write, Increments only)
     # -----------------------------
-    week_id = get_week_start_date_str()
-    weekly_stats = get_weekly_stats(week_id) # Read
-    
-    # Update simple number fields using Increment
-    weekly_updates = {
-        'interactions': Increment(1),  # changed from "interaction_volume"
-        'voice': Increment(1) if is_voice else Increment(0),
-        'week_start_date': week_id 
-    }
-    
-    # Update language distribution array
-    updated_weekly_stats = update_language_distribution(weekly_stats, lang, is_voice)
-    weekly_updates['language_distribution'] = updated_weekly_stats['language_distribution']
-    
-    set_weekly_stats(week_id, weekly_updates, merge=True) # Write
-    
-    # -----------------------------
-    # 3. UPDATE OVERALL SUMMARY (Read-Modify-Write)
-    # -----------------------------
-    overall_summary = get_overall_summary() # Read
-    
-    # Update simple number fields using Increment
-    overall_updates = {
-        'interactions': Increment(1),         # changed from 'total_interactions'
-        'voice': Increment(1) if is_voice else Increment(0),  # changed from 'voice_interactions'
-    }
-
-    if is_new_user:
-        overall_updates['active_users'] = Increment(1)
-        
-    # Update language distribution array
-    updated_overall_summary = update_language_distribution(overall_summary, lang, is_voice)
-    overall_updates['language_distribution'] = updated_overall_summary['language_distribution']
-    
-    set_overall_summary(overall_updates, merge=True) # Write
+    # language_distribution is rebuilt from the lang_counts map by the periodic roll-up
+    # Unless the caller says, the user's first interaction is detected in the same batch
+    record_interaction_stats(week_id, lang, is_voice, is_new_user=bool(is_new_user),
+                             user_id=user_id if is_new_user is None else None)
 
     print(f"Firestore updates complete for user {user_id}.")
 
@@ -179,41 +236,135 @@ def get_google_language_code(openai_language):
     voice_code = entry.get("voice") or None
     return google_code, voice_code
 
-def send_message(token, chat_id, text=None, audio_path=None):
+def _rewind_files(files):
+    """Seeks file uploads back to the start, so a retried attempt sends the whole file again."""
+    for value in (files or {}).values():
+        handle = value[1] if isinstance(value, tuple) else value
+        if hasattr(handle, "seek"):
+            handle.seek(0)
+
+def _telegram_post(token, method, payload_bytes=0, chat_id=None, coalesce_key=None, **kwargs):
+    """
+    POSTs to a Bot API method through the send scheduler, which paces it per chat
+    and globally and retries 429s and transient failures. Each attempt is a tracing
+    span. Returns the decoded response.
+    """
+    url = TELEGRAM_API_URL.format(token=token) + method
+
+    def attempt():
+        _rewind_files(kwargs.get("files"))
+        with tracing.span(f"telegram.{method}", request_bytes=payload_bytes) as span:
+            response = get_http_session().post(url, timeout=TELEGRAM_TIMEOUT, **kwargs)
+            span.set("status", response.status_code)
+            response.raise_for_status()
+            return response.json()
+
+    return send_scheduler.send(chat_id, method, attempt, coalesce_key=coalesce_key)
+
+def send_message(token, chat_id, text=None, audio_path=None, audio_bytes=None, audio_file_id=None, audio_format="mp3"):
     """
     Sends either a text message or an audio message to the specified chat.
     If text is provided, sends a text message.
     If audio_path is provided, sends an audio file.
+    If audio_bytes is provided, sends the in-memory audio without touching disk.
+    If audio_file_id is provided, re-sends audio Telegram already has, without uploading it.
+    audio_format picks how bytes and file_ids are sent: "mp3" via sendAudio, "ogg_opus" via sendVoice.
     """
+    fmt = REPLY_AUDIO_FORMATS[audio_format]
     if text:
-        url = TELEGRAM_API_URL.format(token=token) + "sendMessage"
         payload = {
             "chat_id": chat_id,
             "text": text,
         }
         try:
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return _telegram_post(token, "sendMessage", len(text.encode("utf-8")), chat_id=chat_id, json=payload)
         except Exception as e:
             logging.error(f"Failed to send Telegram text message: {e}")
             return None
     elif audio_path:
-        url = TELEGRAM_API_URL.format(token=token) + "sendAudio"
         try:
             with open(audio_path, "rb") as audio_file:
                 files = {"audio": audio_file}
                 data = {"chat_id": chat_id}
-                response = requests.post(url, data=data, files=files, timeout=20)
-                response.raise_for_status()
-                return response.json()
+                return _telegram_post(token, "sendAudio", os.path.getsize(audio_path), chat_id=chat_id, data=data, files=files)
         except Exception as e:
             logging.error(f"Failed to send Telegram audio message: {e}")
             return None
+    elif audio_bytes:
+        try:
+            files = {fmt["field"]: (f"reply.{fmt['ext']}", audio_bytes, fmt["content_type"])}
+            data = {"chat_id": chat_id}
+            return _telegram_post(token, fmt["method"], len(audio_bytes), chat_id=chat_id, data=data, files=files)
+        except Exception as e:
+            logging.error(f"Failed to send Telegram audio message: {e}")
+            return None
+    elif audio_file_id:
+        payload = {
+            "chat_id": chat_id,
+            fmt["field"]: audio_file_id,
+        }
+        try:
+            return _telegram_post(token, fmt["method"], chat_id=chat_id, json=payload)
+        except Exception as e:
+            logging.error(f"Failed to send Telegram audio by file_id: {e}")
+            return None
     else:
-        logging.error("No text or audio_path provided to send_message.")
+        logging.error("No text, audio_path, audio_bytes or audio_file_id provided to send_message.")
+        return None
+
+def edit_message_text(token, chat_id, message_id, text):
+    """Replaces the text of a message previously sent by the bot."""
+    payload = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+    }
+    try:
+        # Edits of one message waiting for the same chat slot collapse into the newest text
+        return _telegram_post(token, "editMessageText", len(text.encode("utf-8")), chat_id=chat_id,
+                              coalesce_key=("edit", chat_id, message_id), json=payload)
+    except Exception as e:
+        logging.error(f"Failed to edit Telegram message: {e}")
         return None
 
+def send_streaming_message(token, chat_id, deltas, edit_interval: float = STREAM_EDIT_INTERVAL, timer: Optional[StageTimer] = None):
+    """
+    Posts a message as soon as the first text arrives, then edits it with the
+    accumulated text at most once every `edit_interval` seconds, and once more at
+    the end. Returns the full text.
+    """
+    deltas = iter(deltas)
+    text = ""
+    shown = ""
+    message_id = None
+    last_edit = 0.0
+    for delta in deltas:
+        text += delta
+        if not text.strip():
+            continue
+        now = time.monotonic()
+        if message_id is None:
+            result = send_message(token, chat_id, text=text)
+            if timer is not None:
+                timer.mark("first_text")
+            message_id = ((result or {}).get("result") or {}).get("message_id")
+            shown, last_edit = text, now
+            if message_id is None:
+                break  # Could not post; fall back to a single final send below
+        elif now - last_edit >= edit_interval and text != shown and not send_scheduler.would_wait(chat_id):
+            # A chat over its send rate skips this edit; a later one (or the final edit) shows the text
+            edit_message_text(token, chat_id, message_id, text)
+            shown, last_edit = text, now
+
+    if message_id is None:
+        # Drain whatever is left and send it in one go
+        text += "".join(deltas)
+        if text.strip():
+            send_message(token, chat_id, text=text)
+    elif text != shown:
+        edit_message_text(token, chat_id, message_id, text)
+    return text
+
 def recv_message(update):
     """
     Extracts chat_id and content from the Telegram update.
@@ -238,29 +389,34 @@ def recv_message(update):
     else:
         return chat_id, user_id, None, None
 
-def download_telegram_audio(token, file_id, output_path="voice.ogg"):
+def voice_info(update) -> Dict[str, Any]:
+    """The duration (seconds) and file_size Telegram reports for a voice note, if any."""
+    voice = (update.get("message") or {}).get("voice") or {}
+    return {"duration": voice.get("duration"), "file_size": voice.get("file_size")}
+
+def download_telegram_audio(token, file_id, filename="voice.ogg") -> AudioBuffer:
+    """
+    Streams a Telegram file into an in-memory AudioBuffer; nothing is written to
+    disk unless AUDIO_SPILL_TO_DISK is enabled and the file is over the memory limit.
+    """
     # Get file path from Telegram
     url = TELEGRAM_API_URL.format(token=token) + f"getFile?file_id={file_id}"
-    resp = requests.get(url)
-    resp.raise_for_status()
-    file_path = resp.json()["result"]["file_path"]
+    session = get_http_session()
+    with tracing.span("telegram.getFile"):
+        resp = session.get(url, timeout=TELEGRAM_TIMEOUT)
+        resp.raise_for_status()
+        file_path = resp.json()["result"]["file_path"]
     # Download the file
     file_url = f"https://api.telegram.org/file/bot{token}/{file_path}"
-    audio_resp = requests.get(file_url)
-    audio_resp.raise_for_status()
-    with open(output_path, "wb") as f:
-        f.write(audio_resp.content)
-    return output_path
+    with tracing.span("telegram.download") as span:
+        with session.get(file_url, timeout=TELEGRAM_TIMEOUT, stream=True) as audio_resp:
+            audio_resp.raise_for_status()
+            audio = buffer_from_chunks(filename, audio_resp.iter_content(chunk_size=64 * 1024))
+        span.set("response_bytes", audio.size)
+        return audio
 
-def handle_update(token, update):
-    chat_id, user_id, content_type, content = recv_message(update)
-    if not chat_id or not content_type:
-        return
-
-    # Calculate timestamp once for this interaction (India time)
-    timestamp = datetime.now(ZoneInfo("Asia/Kolkata"))
-
-    interaction = {
+def _new_interaction(user_id, content, content_type, timestamp):
+    return {
         "user_id": str(user_id) if user_id else None,
         "question": content,
         "modal": content_type,
@@ -270,37 +426,297 @@ def handle_update(token, update):
         "date": timestamp  # Pass timestamp to handle_new_interaction
     }
 
-    if content_type == "text":
-        result = generate_response(content)
+def _identify_prompt_language(prompt, language=None):
+    """
+    Language of the user's message from the local identifier. A Whisper language is
+    kept unless the transcript clearly says otherwise. Returns None if unsure.
+    """
+    if language and language.lower() not in LANGUAGE_MAP:
+        return None
+    identified = validate_language(language, prompt) if language else detect_language(prompt)
+    return identified if identified in LANGUAGE_MAP else None
+
+def _reply_with_text(token, chat_id, prompt, timer, language=None, default_language=None, user_id=None):
+    """Generates the LLM reply and sends it as text. Returns (reply, language)."""
+    plain = False
+    if LANGUAGE_ID or ANSWER_FORMAT == "plain":
+        with timer.stage("langid"):
+            identified = _identify_prompt_language(prompt, language)
+        # Unidentified messages fall back to the LLM's own detection (JSON answer)
+        plain = ANSWER_FORMAT == "plain" and identified is not None
+        language = identified or language
+
+    kwargs = {"language": language} if language else {}
+    if plain:
+        kwargs["plain"] = True
+    if CONVERSATION_MEMORY:
+        with timer.stage("history"):
+            kwargs["history"] = conversation_store.get_messages(user_id)
+
+    # A reply that depends on earlier turns is not reusable for other users
+    use_cache = RESPONSE_CACHE and not kwargs.get("history")
+    if use_cache:
+        with timer.stage("response_cache"):
+            cached = response_cache.get(prompt, language, plain)
+        if cached is not None:
+            with timer.stage("send_text"):
+                send_message(token, chat_id, text=cached["answer"])
+            timer.mark("first_text")
+            return cached["answer"], cached.get("language") or language or default_language
+
+    if REPLY_MODE == "stream":
+        detected = {}
+
+        def deltas():
+            for lang, delta in generate_response_stream(prompt, **kwargs):
+                detected["language"] = lang
+                yield delta
+
+        with timer.stage("llm_and_send_text"):
+            reply = send_streaming_message(token, chat_id, deltas(), timer=timer)
+        result = {"language": detected.get("language"), "answer": reply}
+        reply_language = detected.get("language") or language or default_language
+    else:
+        with timer.stage("llm"):
+            result = generate_response(prompt, **kwargs)
         reply = result.get("answer")
-        language = result.get("language", "english")
-        send_message(token, chat_id, text=reply)
+        with timer.stage("send_text"):
+            send_message(token, chat_id, text=reply)
+        timer.mark("first_text")
+        reply_language = result.get("language", language or default_language)
+
+    if LANGUAGE_ID and reply:
+        # The reply's language decides the TTS voice; don't trust a mislabelled claim
+        validated = validate_language(reply_language, reply)
+        if validated in LANGUAGE_MAP:
+            reply_language = result["language"] = validated
+
+    if use_cache:
+        response_cache.put(prompt, result, language, plain)
+    return reply, reply_language
+
+def _remember_turn(interaction, timer):
+    """Appends the exchange to the user's conversation history (older turns are summarized in the background)."""
+    if CONVERSATION_MEMORY:
+        with timer.stage("history_update"):
+            conversation_store.append_turn(interaction["user_id"], interaction["question"], interaction["reply"])
+
+def _sent_audio_file_id(result) -> Optional[str]:
+    """Extracts the file_id Telegram assigned to an uploaded audio or voice message."""
+    message = (result or {}).get("result") or {}
+    return (message.get("audio") or message.get("voice") or {}).get("file_id")
+
+def _observe_voice_reply(audio_format, source, started, size=None):
+    """Records a spoken reply: time from TTS start to sent, and uploaded bytes, per format."""
+    tracing.metrics.observe("voice_reply.e2e_ms", round((time.perf_counter() - started) * 1000, 1),
+                            format=audio_format, source=source)
+    if size is not None:
+        tracing.metrics.observe("voice_reply.bytes", size, bounds=tracing.SIZE_BUCKETS_BYTES,
+                                format=audio_format, source=source)
+
+def _reply_with_audio(token, chat_id, reply, google_lang_code, google_voice_code, timer,
+                      audio_format=VOICE_REPLY_FORMAT):
+    """
+    Sends the reply as speech, according to TTS_MODE and audio_format. Repeated
+    replies are served from the TTS cache: by Telegram file_id if the audio was
+    uploaded before, or from cached bytes otherwise, skipping Google TTS in both cases.
+    """
+    fmt = REPLY_AUDIO_FORMATS[audio_format]
+    started = time.perf_counter()
+    cache_key = tts_cache_key(reply, google_lang_code, google_voice_code, audio_format=audio_format)
+    file_id = tts_cache.get_file_id(cache_key)
+    if file_id is not None:
+        with timer.stage("send_audio"):
+            result = send_message(token, chat_id, audio_file_id=file_id, audio_format=audio_format)
+        if result is not None:
+            timer.mark("first_audio")
+            _observe_voice_reply(audio_format, "file_id", started)
+            return
+        tts_cache.forget_file_id(cache_key)
+
+    audio_content = tts_cache.get(cache_key, ext=fmt["ext"])
+    if audio_content is None and TTS_MODE == "chunked_stream":
+        chunks = []
+        with timer.stage("tts_and_send_audio"):
+            for index, chunk in enumerate(iter_speech_chunks_with_google(
+                reply, language_code=google_lang_code, voice_code=google_voice_code, audio_format=audio_format
+            )):
+                send_message(token, chat_id, audio_bytes=chunk, audio_format=audio_format)
+                chunks.append(chunk)
+                if index == 0:
+                    timer.mark("first_audio")
+        _observe_voice_reply(audio_format, "tts", started, size=sum(len(chunk) for chunk in chunks))
+        # MP3 chunks concatenate cleanly, so the next hit is sent as one message;
+        # separate Ogg streams do not, so those replies are not cached
+        if fmt["joinable"]:
+            tts_cache.put(cache_key, b"".join(chunks), ext=fmt["ext"])
+        return
+
+    source = "cache"
+    if audio_content is None:
+        source = "tts"
+        with timer.stage("tts"):
+            # "chunked" joins the chunks into one file, which only MP3 allows
+            if TTS_MODE == "chunked" and fmt["joinable"]:
+                audio_content = b"".join(iter_speech_chunks_with_google(
+                    reply, language_code=google_lang_code, voice_code=google_voice_code, audio_format=audio_format
+                ))
+            else:
+                audio_content = synthesize_speech_bytes_with_google(
+                    reply, language_code=google_lang_code, voice_code=google_voice_code, audio_format=audio_format
+                )
+        tts_cache.put(cache_key, audio_content, ext=fmt["ext"])
+
+    with timer.stage("send_audio"):
+        result = send_message(token, chat_id, audio_bytes=audio_content, audio_format=audio_format)
+    timer.mark("first_audio")
+    _observe_voice_reply(audio_format, source, started, size=len(audio_content))
+    file_id = _sent_audio_file_id(result)
+    if file_id is not None:
+        tts_cache.put_file_id(cache_key, file_id, size=len(audio_content))
+
+def _handle_update_sequential(token, chat_id, user_id, content_type, content, timestamp, timer, voice=None):
+    """Runs every stage one after another; the reference path for timings."""
+    interaction = _new_interaction(user_id, content, content_type, timestamp)
+
+    if content_type == "text":
+        reply, language = _reply_with_text(token, chat_id, content, timer, default_language="english", user_id=interaction["user_id"])
         interaction["reply"] = reply
         interaction["lang"] = language
 
     elif content_type == "audio":
         # Use a unique filename for each audio upload
         audio_filename = f"voice_{user_id}_{timestamp.strftime('%Y%m%d%H%M%S')}.ogg"
-        audio_path = download_telegram_audio(token, content, output_path=audio_filename)
-        transcript, language = transcribe_audio_with_openai(audio_path)
-        result = generate_response(transcript, language=language)
-        reply = result.get("answer")
-        language = result.get("language", language)
-        send_message(token, chat_id, text=reply)
-        google_lang_code, google_voice_code = get_google_language_code(language)
-        interaction["lang"] = language
-        interaction["question"] = transcript
-        interaction["reply"] = reply
-        interaction["audio_file"] = audio_path
-        if google_lang_code is not None:
-            unique_audio_path = f"reply_{user_id}_{timestamp.strftime('%Y%m%d%H%M%S')}.mp3"
-            audio_reply_path = synthesize_speech_with_google(
-                reply, language_code=google_lang_code, voice_code=google_voice_code, output_path=unique_audio_path
-            )
-            send_message(token, chat_id, audio_path=audio_reply_path)
-            os.remove(audio_reply_path)
-        gcs_audio_path = upload_to_gcs(audio_path, user_id)
+        with timer.stage("download"):
+            audio = download_telegram_audio(token, content, filename=audio_filename)
+        with audio:
+            with timer.stage("transcribe"):
+                transcript, language = transcribe_audio_with_openai(audio, **(voice or {}))
+            reply, language = _reply_with_text(token, chat_id, transcript, timer, language=language, user_id=interaction["user_id"])
+            google_lang_code, google_voice_code = get_google_language_code(language)
+            interaction["lang"] = language
+            interaction["question"] = transcript
+            interaction["reply"] = reply
+            if google_lang_code is not None:
+                _reply_with_audio(token, chat_id, reply, google_lang_code, google_voice_code, timer)
+            with timer.stage("gcs_upload"):
+                gcs_audio_path = upload_to_gcs(audio, user_id)
         interaction["audio_file"] = gcs_audio_path
 
+    _remember_turn(interaction, timer)
+    if TRACE_IN_LOGS:
+        interaction["timings"] = dict(timer.stages)
     # Pass timestamp to handle_new_interaction
-    handle_new_interaction(interaction, timestamp=timestamp)
\ No newline at end of file
+    with timer.stage("firestore"):
+        handle_new_interaction(interaction, timestamp=timestamp)
+    return timer.total_ms()
+
+def _handle_update_concurrent(token, chat_id, user_id, content_type, content, timestamp, timer, voice=None):
+    """
+    Keeps only the user-visible stages (transcribe, LLM, send, TTS) on the reply path.
+    The GCS upload starts as soon as the voice note is downloaded, and the Firestore
+    log/stats writes overlap with TTS and sendAudio. All background work is joined
+    before returning so the instance never returns with writes still in flight.
+    """
+    interaction = _new_interaction(user_id, content, content_type, timestamp)
+    background = []
+
+    def timed(name, fn, *args, **kwargs):
+        with timer.stage(name):
+            return fn(*args, **kwargs)
+
+    if content_type == "text":
+        reply, language = _reply_with_text(token, chat_id, content, timer, default_language="english", user_id=interaction["user_id"])
+        interaction["reply"] = reply
+        interaction["lang"] = language
+        if TRACE_IN_LOGS:
+            interaction["timings"] = dict(timer.stages)
+        background.append(tracing.submit(
+            _pipeline_executor, timed, "firestore", handle_new_interaction, interaction, timestamp=timestamp
+        ))
+
+    elif content_type == "audio":
+        audio_filename = f"voice_{user_id}_{timestamp.strftime('%Y%m%d%H%M%S')}.ogg"
+        with timer.stage("download"):
+            audio = download_telegram_audio(token, content, filename=audio_filename)
+        upload_future = tracing.submit(_pipeline_executor, timed, "gcs_upload", upload_to_gcs, audio, user_id)
+        background.append(upload_future)
+
+        try:
+            with timer.stage("transcribe"):
+                transcript, language = transcribe_audio_with_openai(audio, **(voice or {}))
+            reply, language = _reply_with_text(token, chat_id, transcript, timer, language=language, user_id=interaction["user_id"])
+            interaction["lang"] = language
+            interaction["question"] = transcript
+            interaction["reply"] = reply
+
+            def record_interaction():
+                # The log entry references the GCS URI, so wait for the upload first
+                interaction["audio_file"] = upload_future.result()
+                if TRACE_IN_LOGS:
+                    interaction["timings"] = dict(timer.stages)
+                with timer.stage("firestore"):
+                    handle_new_interaction(interaction, timestamp=timestamp)
+
+            background.append(tracing.submit(_pipeline_executor, record_interaction))
+
+            google_lang_code, google_voice_code = get_google_language_code(language)
+            if google_lang_code is not None:
+                _reply_with_audio(token, chat_id, reply, google_lang_code, google_voice_code, timer)
+        except Exception:
+            # Let the upload finish reading the buffer before releasing it
+            upload_future.exception()
+            audio.close()
+            raise
+
+    if interaction["reply"]:
+        background.append(tracing.submit(_pipeline_executor, _remember_turn, dict(interaction), timer))
+
+    reply_ms = timer.total_ms()
+    try:
+        for future in background:
+            future.result()
+    finally:
+        if content_type == "audio":
+            audio.close()
+    return reply_ms
+
+def handle_update(token, update, mode: Optional[str] = None):
+    chat_id, user_id, content_type, content = recv_message(update)
+    if not chat_id or not content_type:
+        return
+
+    # Telegram redelivers slow webhooks; short-circuit before any paid API call
+    update_id = update.get("update_id")
+    if update_id is not None and not update_dedup.claim(update_id):
+        logging.info(f"[dedup] Skipping redelivered update {update_id} ({update_dedup.stats()})")
+        return
+
+    # Calculate timestamp once for this interaction (India time)
+    timestamp = datetime.now(ZoneInfo("Asia/Kolkata"))
+
+    mode = mode or PIPELINE_MODE
+    timer = StageTimer()
+    try:
+        with send_budget(), tracing.trace("interaction", mode=mode, type=content_type):
+            try:
+                if mode == "concurrent":
+                    reply_ms = _handle_update_concurrent(token, chat_id, user_id, content_type, content, timestamp,
+                                                         timer, voice=voice_info(update))
+                else:
+                    reply_ms = _handle_update_sequential(token, chat_id, user_id, content_type, content, timestamp,
+                                                         timer, voice=voice_info(update))
+            except AudioTooLargeError as e:
+                logging.warning(f"[pipeline] Voice note in update {update_id} rejected: {e}")
+                tracing.metrics.increment("voice.too_large", mode=mode)
+                send_message(token, chat_id, text=VOICE_TOO_LONG_MESSAGE)
+                return
+    except Exception:
+        # Once part of the reply is out, a redelivery would send it again: acknowledge instead
+        if timer.replied:
+            logging.exception(f"[pipeline] Update {update_id} failed after replying; not retrying")
+            return
+        if update_id is not None:
+            update_dedup.release(update_id)
+        raise
+    timer.log(mode, content_type, reply_ms=reply_ms)
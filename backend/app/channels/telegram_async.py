@@ -0,0 +1,401 @@
+"""
+Asyncio variant of the "concurrent" pipeline in app.channels.telegram, used by asgi.py.
+Blocking Firestore/GCS calls run on a small worker pool.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+from zoneinfo import ZoneInfo
+
+from app.channels.telegram import (
+    TELEGRAM_API_URL,
+    STREAM_EDIT_INTERVAL,
+    REPLY_MODE,
+    TTS_MODE,
+    VOICE_REPLY_FORMAT,
+    VOICE_TOO_LONG_MESSAGE,
+    CONVERSATION_MEMORY,
+    RESPONSE_CACHE,
+    RESPONSE_CACHE_SEMANTIC,
+    LANGUAGE_ID,
+    ANSWER_FORMAT,
+    TRACE_IN_LOGS,
+    LANGUAGE_MAP,
+    StageTimer,
+    conversation_store,
+    response_cache,
+    update_dedup,
+    get_google_language_code,
+    handle_new_interaction,
+    recv_message,
+    voice_info,
+    _identify_prompt_language,
+    _new_interaction,
+    _observe_voice_reply,
+    _sent_audio_file_id,
+)
+from app.services.google_service import (
+    synthesize_speech_bytes_with_google_async,
+    iter_speech_chunks_with_google_async,
+)
+from app.services.openai_service import (
+    generate_response_async,
+    generate_response_stream_async,
+    transcribe_audio_with_openai_async,
+)
+from app.services.tts_cache import tts_cache, tts_cache_key, TTS_CACHE_BACKEND
+from app.utils import tracing
+from app.utils.audio import AudioBuffer, AudioTooLargeError, buffer_from_chunks, REPLY_AUDIO_FORMATS
+from app.utils.config import get_config
+from app.utils.dedup import DEDUP_PERSISTENT
+from app.utils.langid import validate_language
+from app.utils.send_scheduler import send_budget, send_scheduler
+from cal.clients import get_async_http_client
+from cal.storage import upload_to_gcs
+
+# Threads for the calls that stay blocking (Firestore, GCS, disk/GCS cache tiers)
+ASYNC_BLOCKING_WORKERS = int(get_config("ASYNC_BLOCKING_WORKERS", 16))
+_blocking_executor = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix="async-blocking")
+
+async def run_blocking(fn, *args, **kwargs):
+    """Runs a blocking call on the worker pool, in the caller's trace."""
+    return await asyncio.wrap_future(tracing.submit(_blocking_executor, fn, *args, **kwargs))
+
+async def _cache_call(fn, *args, offload: bool):
+    """Calls a cache method inline when it only touches memory, on the worker pool otherwise."""
+    if offload:
+        return await run_blocking(fn, *args)
+    return fn(*args)
+
+# Memory-only TTS cache lookups are cheap; the disk and GCS tiers do I/O
+_TTS_CACHE_BLOCKS = TTS_CACHE_BACKEND not in ("none", "memory")
+
+# -----------------------------
+# 📨 TELEGRAM BOT API
+# -----------------------------
+async def _telegram_post(token, method, payload_bytes=0, chat_id=None, coalesce_key=None, **kwargs):
+    """POSTs to a Bot API method through the send scheduler; each attempt is a tracing span."""
+    url = TELEGRAM_API_URL.format(token=token) + method
+
+    async def attempt():
+        with tracing.span(f"telegram.{method}", request_bytes=payload_bytes) as span:
+            response = await get_async_http_client().post(url, **kwargs)
+            span.set("status", response.status_code)
+            response.raise_for_status()
+            return response.json()
+
+    return await send_scheduler.send_async(chat_id, method, attempt, coalesce_key=coalesce_key)
+
+async def send_message(token, chat_id, text=None, audio_bytes=None, audio_file_id=None, audio_format="mp3"):
+    """Async send_message: a text message, in-memory audio bytes, or audio Telegram already has (by file_id)."""
+    fmt = REPLY_AUDIO_FORMATS[audio_format]
+    try:
+        if text:
+            return await _telegram_post(token, "sendMessage", len(text.encode("utf-8")), chat_id=chat_id,
+                                        json={"chat_id": chat_id, "text": text})
+        if audio_bytes:
+            files = {fmt["field"]: (f"reply.{fmt['ext']}", audio_bytes, fmt["content_type"])}
+            return await _telegram_post(token, fmt["method"], len(audio_bytes), chat_id=chat_id,
+                                        data={"chat_id": chat_id}, files=files)
+        if audio_file_id:
+            return await _telegram_post(token, fmt["method"], chat_id=chat_id,
+                                        json={"chat_id": chat_id, fmt["field"]: audio_file_id})
+    except Exception as e:
+        logging.error(f"Failed to send Telegram message: {e}")
+        return None
+    logging.error("No text, audio_bytes or audio_file_id provided to send_message.")
+    return None
+
+async def edit_message_text(token, chat_id, message_id, text):
+    """Replaces the text of a message previously sent by the bot."""
+    payload = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+    }
+    try:
+        return await _telegram_post(token, "editMessageText", len(text.encode("utf-8")), chat_id=chat_id,
+                                    coalesce_key=("edit", chat_id, message_id), json=payload)
+    except Exception as e:
+        logging.error(f"Failed to edit Telegram message: {e}")
+        return None
+
+async def send_streaming_message(token, chat_id, deltas: AsyncIterator[str], edit_interval: float = STREAM_EDIT_INTERVAL,
+                                 timer: Optional[StageTimer] = None):
+    """Async send_streaming_message: posts the first text, then edits at most once per `edit_interval`."""
+    text = ""
+    shown = ""
+    message_id = None
+    last_edit = 0.0
+    async for delta in deltas:
+        text += delta
+        if not text.strip():
+            continue
+        now = time.monotonic()
+        if message_id is None:
+            result = await send_message(token, chat_id, text=text)
+            if timer is not None:
+                timer.mark("first_text")
+            message_id = ((result or {}).get("result") or {}).get("message_id")
+            shown, last_edit = text, now
+            if message_id is None:
+                break  # Could not post; fall back to a single final send below
+        elif now - last_edit >= edit_interval and text != shown and not send_scheduler.would_wait(chat_id):
+            # A chat over its send rate skips this edit; a later one (or the final edit) shows the text
+            await edit_message_text(token, chat_id, message_id, text)
+            shown, last_edit = text, now
+
+    if message_id is None:
+        # Drain whatever is left and send it in one go
+        async for delta in deltas:
+            text += delta
+        if text.strip():
+            await send_message(token, chat_id, text=text)
+    elif text != shown:
+        await edit_message_text(token, chat_id, message_id, text)
+    return text
+
+async def download_telegram_audio(token, file_id, filename="voice.ogg") -> AudioBuffer:
+    """Async download_telegram_audio: streams the voice note into an AudioBuffer."""
+    client = get_async_http_client()
+    url = TELEGRAM_API_URL.format(token=token) + "getFile"
+    with tracing.span("telegram.getFile"):
+        resp = await client.get(url, params={"file_id": file_id})
+        resp.raise_for_status()
+        file_path = resp.json()["result"]["file_path"]
+    file_url = f"https://api.telegram.org/file/bot{token}/{file_path}"
+    with tracing.span("telegram.download") as span:
+        async with client.stream("GET", file_url) as audio_resp:
+            audio_resp.raise_for_status()
+            chunks = [chunk async for chunk in audio_resp.aiter_bytes(64 * 1024)]
+        audio = buffer_from_chunks(filename, chunks)
+        span.set("response_bytes", audio.size)
+        return audio
+
+# -----------------------------
+# 🤖 PIPELINE
+# -----------------------------
+async def _reply_with_text(token, chat_id, prompt, timer, language=None, default_language=None, user_id=None):
+    """Async _reply_with_text: generates the LLM reply and sends it as text. Returns (reply, language)."""
+    plain = False
+    if LANGUAGE_ID or ANSWER_FORMAT == "plain":
+        with timer.stage("langid"):
+            identified = _identify_prompt_language(prompt, language)
+        plain = ANSWER_FORMAT == "plain" and identified is not None
+        language = identified or language
+
+    kwargs: Dict[str, Any] = {"language": language} if language else {}
+    if plain:
+        kwargs["plain"] = True
+    if CONVERSATION_MEMORY:
+        with timer.stage("history"):
+            kwargs["history"] = await run_blocking(conversation_store.get_messages, user_id)
+
+    use_cache = RESPONSE_CACHE and not kwargs.get("history")
+    if use_cache:
+        with timer.stage("response_cache"):
+            # Semantic lookups make an embeddings call on the sync client
+            cached = await _cache_call(response_cache.get, prompt, language, plain, offload=RESPONSE_CACHE_SEMANTIC)
+        if cached is not None:
+            with timer.stage("send_text"):
+                await send_message(token, chat_id, text=cached["answer"])
+            timer.mark("first_text")
+            return cached["answer"], cached.get("language") or language or default_language
+
+    if REPLY_MODE == "stream":
+        detected = {}
+
+        async def deltas():
+            async for lang, delta in generate_response_stream_async(prompt, **kwargs):
+                detected["language"] = lang
+                yield delta
+
+        with timer.stage("llm_and_send_text"):
+            reply = await send_streaming_message(token, chat_id, deltas(), timer=timer)
+        result = {"language": detected.get("language"), "answer": reply}
+        reply_language = detected.get("language") or language or default_language
+    else:
+        with timer.stage("llm"):
+            result = await generate_response_async(prompt, **kwargs)
+        reply = result.get("answer")
+        with timer.stage("send_text"):
+            await send_message(token, chat_id, text=reply)
+        timer.mark("first_text")
+        reply_language = result.get("language", language or default_language)
+
+    if LANGUAGE_ID and reply:
+        validated = validate_language(reply_language, reply)
+        if validated in LANGUAGE_MAP:
+            reply_language = result["language"] = validated
+
+    if use_cache:
+        await _cache_call(response_cache.put, prompt, result, language, plain, offload=RESPONSE_CACHE_SEMANTIC)
+    return reply, reply_language
+
+async def _reply_with_audio(token, chat_id, reply, google_lang_code, google_voice_code, timer,
+                            audio_format=VOICE_REPLY_FORMAT):
+    """Async _reply_with_audio: sends the reply as speech according to TTS_MODE, via the TTS cache."""
+    fmt = REPLY_AUDIO_FORMATS[audio_format]
+    started = time.perf_counter()
+    cache_key = tts_cache_key(reply, google_lang_code, google_voice_code, audio_format=audio_format)
+    file_id = await _cache_call(tts_cache.get_file_id, cache_key, offload=_TTS_CACHE_BLOCKS)
+    if file_id is not None:
+        with timer.stage("send_audio"):
+            result = await send_message(token, chat_id, audio_file_id=file_id, audio_format=audio_format)
+        if result is not None:
+            timer.mark("first_audio")
+            _observe_voice_reply(audio_format, "file_id", started)
+            return
+        await _cache_call(tts_cache.forget_file_id, cache_key, offload=_TTS_CACHE_BLOCKS)
+
+    audio_content = await _cache_call(tts_cache.get, cache_key, fmt["ext"], offload=_TTS_CACHE_BLOCKS)
+    if audio_content is None and TTS_MODE == "chunked_stream":
+        chunks = []
+        with timer.stage("tts_and_send_audio"):
+            index = 0
+            async for chunk in iter_speech_chunks_with_google_async(
+                reply, language_code=google_lang_code, voice_code=google_voice_code, audio_format=audio_format
+            ):
+                await send_message(token, chat_id, audio_bytes=chunk, audio_format=audio_format)
+                chunks.append(chunk)
+                if index == 0:
+                    timer.mark("first_audio")
+                index += 1
+        _observe_voice_reply(audio_format, "tts", started, size=sum(len(chunk) for chunk in chunks))
+        if fmt["joinable"]:
+            await _cache_call(tts_cache.put, cache_key, b"".join(chunks), fmt["ext"], offload=_TTS_CACHE_BLOCKS)
+        return
+
+    source = "cache"
+    if audio_content is None:
+        source = "tts"
+        with timer.stage("tts"):
+            if TTS_MODE == "chunked" and fmt["joinable"]:
+                audio_content = b"".join([chunk async for chunk in iter_speech_chunks_with_google_async(
+                    reply, language_code=google_lang_code, voice_code=google_voice_code, audio_format=audio_format
+                )])
+            else:
+                audio_content = await synthesize_speech_bytes_with_google_async(
+                    reply, language_code=google_lang_code, voice_code=google_voice_code, audio_format=audio_format
+                )
+        await _cache_call(tts_cache.put, cache_key, audio_content, fmt["ext"], offload=_TTS_CACHE_BLOCKS)
+
+    with timer.stage("send_audio"):
+        result = await send_message(token, chat_id, audio_bytes=audio_content, audio_format=audio_format)
+    timer.mark("first_audio")
+    _observe_voice_reply(audio_format, source, started, size=len(audio_content))
+    file_id = _sent_audio_file_id(result)
+    if file_id is not None:
+        await _cache_call(tts_cache.put_file_id, cache_key, file_id, len(audio_content), offload=_TTS_CACHE_BLOCKS)
+
+async def _timed_blocking(timer, name, fn, *args, **kwargs):
+    with timer.stage(name):
+        return await run_blocking(fn, *args, **kwargs)
+
+def _remember_turn(interaction, timer):
+    if CONVERSATION_MEMORY:
+        with timer.stage("history_update"):
+            conversation_store.append_turn(interaction["user_id"], interaction["question"], interaction["reply"])
+
+async def _handle_update(token, chat_id, user_id, content_type, content, timestamp, timer, voice=None):
+    """
+    Same shape as the sync "concurrent" pipeline: only transcribe, LLM, send and TTS
+    are on the reply path; the GCS upload and Firestore writes run alongside and are
+    awaited before returning. Returns the reply-path time in ms.
+    """
+    interaction = _new_interaction(user_id, content, content_type, timestamp)
+    background = []
+    audio = None
+
+    try:
+        if content_type == "text":
+            reply, language = await _reply_with_text(token, chat_id, content, timer, default_language="english",
+                                                     user_id=interaction["user_id"])
+            interaction["reply"] = reply
+            interaction["lang"] = language
+            if TRACE_IN_LOGS:
+                interaction["timings"] = dict(timer.stages)
+            background.append(asyncio.ensure_future(
+                _timed_blocking(timer, "firestore", handle_new_interaction, interaction, timestamp=timestamp)
+            ))
+
+        elif content_type == "audio":
+            audio_filename = f"voice_{user_id}_{timestamp.strftime('%Y%m%d%H%M%S')}.ogg"
+            with timer.stage("download"):
+                audio = await download_telegram_audio(token, content, filename=audio_filename)
+            upload = asyncio.ensure_future(_timed_blocking(timer, "gcs_upload", upload_to_gcs, audio, user_id))
+            background.append(upload)
+
+            with timer.stage("transcribe"):
+                transcript, language = await transcribe_audio_with_openai_async(audio, **(voice or {}))
+            reply, language = await _reply_with_text(token, chat_id, transcript, timer, language=language,
+                                                     user_id=interaction["user_id"])
+            interaction["lang"] = language
+            interaction["question"] = transcript
+            interaction["reply"] = reply
+
+            async def record_interaction():
+                # The log entry references the GCS URI, so wait for the upload first
+                interaction["audio_file"] = await upload
+                if TRACE_IN_LOGS:
+                    interaction["timings"] = dict(timer.stages)
+                await _timed_blocking(timer, "firestore", handle_new_interaction, interaction, timestamp=timestamp)
+
+            background.append(asyncio.ensure_future(record_interaction()))
+
+            google_lang_code, google_voice_code = get_google_language_code(language)
+            if google_lang_code is not None:
+                await _reply_with_audio(token, chat_id, reply, google_lang_code, google_voice_code, timer)
+
+        if interaction["reply"]:
+            background.append(asyncio.ensure_future(run_blocking(_remember_turn, dict(interaction), timer)))
+
+        reply_ms = timer.total_ms()
+        # Raises the first background failure, like future.result() in the sync pipeline
+        await asyncio.gather(*background)
+        return reply_ms
+    finally:
+        if background:
+            # On failure, let the upload finish reading the buffer before releasing it
+            await asyncio.gather(*background, return_exceptions=True)
+        if audio is not None:
+            audio.close()
+
+async def handle_update_async(token, update):
+    """Asyncio counterpart of telegram.handle_update (stage timings are logged with mode=async)."""
+    chat_id, user_id, content_type, content = recv_message(update)
+    if not chat_id or not content_type:
+        return
+
+    # The persistent claim is a Firestore write; the in-memory one is not worth a thread hop
+    update_id = update.get("update_id")
+    if update_id is not None:
+        claimed = await _cache_call(update_dedup.claim, update_id, offload=DEDUP_PERSISTENT)
+        if not claimed:
+            logging.info(f"[dedup] Skipping redelivered update {update_id} ({update_dedup.stats()})")
+            return
+
+    timestamp = datetime.now(ZoneInfo("Asia/Kolkata"))
+    timer = StageTimer()
+    try:
+        with send_budget(), tracing.trace("interaction", mode="async", type=content_type):
+            try:
+                reply_ms = await _handle_update(token, chat_id, user_id, content_type, content, timestamp, timer,
+                                                voice=voice_info(update))
+            except AudioTooLargeError as e:
+                logging.warning(f"[pipeline] Voice note in update {update_id} rejected: {e}")
+                tracing.metrics.increment("voice.too_large", mode="async")
+                await send_message(token, chat_id, text=VOICE_TOO_LONG_MESSAGE)
+                return
+    except BaseException as exc:
+        # Once part of the reply is out, a redelivery would send it again: acknowledge instead
+        if timer.replied and isinstance(exc, Exception):
+            logging.exception(f"[pipeline] Update {update_id} failed after replying; not retrying")
+            return
+        if update_id is not None and not timer.replied:
+            await _cache_call(update_dedup.release, update_id, offload=DEDUP_PERSISTENT)
+        raise
+    timer.log("async", content_type, reply_ms=reply_ms)
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils.config import get_config
+from cal.firestore import append_conversation_turns, compact_conversation, get_conversation
+
+CONVERSATION_CACHE_USERS = int(get_config("CONVERSATION_CACHE_USERS", 500))
+# Another instance may have extended the conversation; re-read from Firestore after this long
+CONVERSATION_CACHE_TTL = float(get_config("CONVERSATION_CACHE_TTL", 300))
+CONVERSATION_TOKEN_BUDGET = int(get_config("CONVERSATION_TOKEN_BUDGET", 1200))
+CONVERSATION_KEEP_TURNS = int(get_config("CONVERSATION_KEEP_TURNS", 4))  # user+assistant pairs kept verbatim
+
+Message = Dict[str, str]  # {"role": ..., "content": ...}
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate without a tokenizer: roughly 4 ASCII characters per token,
+    while Indic and other non-Latin scripts come out near one token per 1-2 characters.
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + int((len(text) - ascii_chars) / 1.5) + 1
+
+def _messages_tokens(messages: List[Message]) -> int:
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+# -----------------------------
+# 🧠 CONVERSATION STORE
+# -----------------------------
+class ConversationStore:
+    """
+    Per-user conversation history with a bounded prompt footprint.
+
+    Hot users are served from an in-process LRU; Firestore (or the local mock) is the
+    backing store. Each history holds a rolling `summary` plus the most recent
+    `turns`. When the turns exceed `token_budget`, the oldest ones are folded into
+    the summary by `summarizer(summary, messages) -> str`, keeping the last
+    `keep_turns` exchanges verbatim. Without a summarizer, old turns are dropped.
+
+    A new exchange is appended in a Firestore transaction straight away; folding
+    (an LLM call) runs afterwards on a background thread, so it never delays the
+    write or the reply. Until it lands, get_messages trims the oldest turns.
+    """
+    def __init__(self, summarizer: Optional[Callable[[str, List[Message]], str]] = None,
+                 max_users: int = CONVERSATION_CACHE_USERS, ttl: float = CONVERSATION_CACHE_TTL,
+                 token_budget: int = CONVERSATION_TOKEN_BUDGET, keep_turns: int = CONVERSATION_KEEP_TURNS):
+        self._summarizer = summarizer
+        self._max_users = max_users
+        self._ttl = ttl
+        self._token_budget = token_budget
+        self._keep_messages = keep_turns * 2
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._compacting = set()
+        self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation")
+
+    def _load(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            record = self._cache.get(user_id)
+            if record is not None and time.monotonic() - record["_loaded_at"] < self._ttl:
+                self._cache.move_to_end(user_id)
+                return record
+        try:
+            stored = get_conversation(user_id)
+        except Exception as e:
+            logging.warning(f"[conversation] Could not load history for {user_id}: {e}")
+            stored = {}
+        return self._remember(user_id, stored)
+
+    def _remember(self, user_id: str, stored: Dict[str, Any]) -> Dict[str, Any]:
+        record = {
+            "summary": stored.get("summary", ""),
+            "turns": list(stored.get("turns", [])),
+            "_loaded_at": time.monotonic(),
+        }
+        with self._lock:
+            self._cache[user_id] = record
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self._max_users:
+                self._cache.popitem(last=False)
+        return record
+
+    def get_messages(self, user_id: Optional[str]) -> List[Message]:
+        """Returns the prior context to place between the system prompt and the new message."""
+        if not user_id:
+            return []
+        record = self._load(user_id)
+        messages: List[Message] = []
+        if record["summary"]:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {record['summary']}"})
+        turns = record["turns"]
+        # Folding may still be running (or have failed); keep the prompt within budget anyway
+        while len(turns) > 2 and _messages_tokens(turns) > self._token_budget:
+            turns = turns[2:]
+        messages.extend(turns)
+        return messages
+
+    def append_turn(self, user_id: Optional[str], question: str, reply: str):
+        """Records one exchange, then folds older turns in the background if over the token budget."""
+        if not user_id or not question or not reply:
+            return
+        turns = [
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": reply},
+        ]
+        try:
+            stored = append_conversation_turns(user_id, turns)
+        except Exception as e:
+            logging.warning(f"[conversation] Could not persist history for {user_id}: {e}")
+            return
+        self._remember(user_id, stored)
+        if self._over_budget(stored["turns"]):
+            with self._lock:
+                if user_id in self._compacting:
+                    return
+                self._compacting.add(user_id)
+            # Not traced: it outlives the interaction that queued it
+            self._compactor.submit(self._compact, user_id)
+
+    def _over_budget(self, turns: List[Message]) -> bool:
+        return _messages_tokens(turns) > self._token_budget and len(turns) > self._keep_messages
+
+    def _compact(self, user_id: str):
+        """Folds everything but the last keep_turns exchanges into the summary."""
+        try:
+            # Re-read: turns appended while this was queued are folded too
+            stored = get_conversation(user_id)
+            turns = list(stored.get("turns", []))
+            if not self._over_budget(turns):
+                return
+            cut = len(turns) - self._keep_messages
+            # Even the recent turns can exceed the budget with very long messages
+            while len(turns) - cut > 2 and _messages_tokens(turns[cut:]) > self._token_budget:
+                cut += 2
+            old_turns = turns[:cut]
+            summary = stored.get("summary", "")
+            if self._summarizer is not None:
+                try:
+                    summary = self._summarizer(summary, old_turns)
+                except Exception as e:
+                    logging.warning(f"[conversation] Summarization failed for {user_id}, dropping old turns: {e}")
+            compacted = compact_conversation(user_id, stored.get("summary", ""), old_turns, summary)
+            if compacted is None:
+                logging.info(f"[conversation] History for {user_id} changed while summarizing; left for the next turn")
+            else:
+                self._remember(user_id, compacted)
+        except Exception as e:
+            logging.warning(f"[conversation] Could not compact history for {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._compacting.discard(user_id)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Waits for the compactions queued so far."""
+        self._compactor.submit(lambda: None).result(timeout)
@@ -1,33 +1,145 @@
-import json
-from google.cloud import texttospeech
-from google.oauth2 import service_account
-from cal.secrets import get_secret
-
-def synthesize_speech_with_google(text, output_path="reply.mp3", language_code="en-IN", voice_code=None):
-    creds = get_secret("GOOGLE_APPLICATION_CREDENTIALS")
-    if isinstance(creds, str):
-        service_account_info = json.loads(creds)
-    else:
-        service_account_info = creds
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List
 
-    try:
-        credentials_object = service_account.Credentials.from_service_account_info(
-            service_account_info
+from app.utils import tracing
+from app.utils.config import get_config
+from cal.clients import get_async_tts_client, get_tts_client, TTS_TIMEOUT
+
+TTS_MAX_WORKERS = int(get_config("TTS_MAX_WORKERS", 4))
+TTS_MIN_CHUNK_CHARS = int(get_config("TTS_MIN_CHUNK_CHARS", 60))
+TTS_MAX_CHUNK_CHARS = 1500  # Comfortably below Google's 5000-byte input limit for 3-byte Indic characters
+# Sample rate requested for OGG_OPUS output; 24 kHz is wideband speech and Opus sizes its bitrate to it
+GOOGLE_OPUS_SAMPLE_RATE_HZ = int(get_config("GOOGLE_OPUS_SAMPLE_RATE_HZ", 24000))
+_tts_executor = ThreadPoolExecutor(max_workers=TTS_MAX_WORKERS, thread_name_prefix="tts")
+
+# Sentence terminators: Latin . ! ? (only when followed by whitespace, so "3.5" stays whole),
+# the danda/double danda used by Devanagari, Bengali and Gurmukhi, the Urdu full stop and
+# question mark, and the CJK full-width terminators. Line breaks also end a sentence.
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|(?<=[।॥۔؟。！？])\s*|\n+")
+
+def split_sentences(text: str, min_chars: int = TTS_MIN_CHUNK_CHARS, max_chars: int = TTS_MAX_CHUNK_CHARS) -> List[str]:
+    """
+    Splits text into sentence chunks for TTS. Short sentences are merged until a
+    chunk has at least `min_chars` characters, so a reply does not turn into many
+    tiny API calls. A sentence longer than `max_chars` is split at word boundaries.
+    """
+    chunks: List[str] = []
+    current = ""
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        current = f"{current} {sentence}".strip() if current else sentence
+        if len(current) >= min_chars:
+            chunks.append(current)
+            current = ""
+    if current:
+        if chunks and len(current) < min_chars and len(chunks[-1]) + len(current) < max_chars:
+            chunks[-1] = f"{chunks[-1]} {current}"
+        else:
+            chunks.append(current)
+    return chunks
+
+def _audio_config(texttospeech, audio_format: str):
+    """AudioConfig for a REPLY_AUDIO_FORMATS key ("mp3" or "ogg_opus")."""
+    if audio_format == "ogg_opus":
+        return texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.OGG_OPUS,
+            sample_rate_hertz=GOOGLE_OPUS_SAMPLE_RATE_HZ
         )
-    except Exception as e:
-        # This catch is helpful for debugging bad JSON structure
-        raise ValueError(f"Failed to create Google Credentials object. Check JSON key format: {e}")
-    
-    client = texttospeech.TextToSpeechClient(credentials=credentials_object)
+    return texttospeech.AudioConfig(
+        audio_encoding=texttospeech.AudioEncoding.MP3
+    )
+
+def synthesize_speech_bytes_with_google(text, language_code="en-IN", voice_code=None, audio_format="mp3") -> bytes:
+    """Synthesizes text and returns the audio bytes (MP3, or Ogg Opus with audio_format="ogg_opus")."""
+    from google.cloud import texttospeech
+    client = get_tts_client()
     synthesis_input = texttospeech.SynthesisInput(text=text)
     voice = texttospeech.VoiceSelectionParams(
         language_code=language_code,
         name=voice_code or f"{language_code}-Standard-B"
     )
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3
-    )
-    response = client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
+    audio_config = _audio_config(texttospeech, audio_format)
+    with tracing.span("google.tts", model=voice.name, format=audio_format, input_chars=len(text)) as span:
+        response = client.synthesize_speech(
+            input=synthesis_input, voice=voice, audio_config=audio_config, timeout=TTS_TIMEOUT
+        )
+        span.set("response_bytes", len(response.audio_content))
+    return response.audio_content
+
+def synthesize_speech_with_google(text, output_path="reply.mp3", language_code="en-IN", voice_code=None, audio_format="mp3"):
+    audio_content = synthesize_speech_bytes_with_google(text, language_code=language_code, voice_code=voice_code,
+                                                        audio_format=audio_format)
     with open(output_path, "wb") as out:
-        out.write(response.audio_content)
-    return output_path
\ No newline at end of file
+        out.write(audio_content)
+    return output_path
+
+def iter_speech_chunks_with_google(text, language_code="en-IN", voice_code=None, audio_format="mp3") -> Iterator[bytes]:
+    """
+    Synthesizes every sentence chunk in parallel on a bounded pool and yields the
+    audio bytes in reading order. The first chunk is yielded as soon as it is ready,
+    while later chunks are still being synthesized.
+    """
+    futures = [
+        tracing.submit(_tts_executor, synthesize_speech_bytes_with_google, chunk, language_code, voice_code, audio_format)
+        for chunk in split_sentences(text)
+    ]
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        # Abandoned early (e.g. a failed send): don't synthesize chunks nobody will send
+        for future in futures:
+            future.cancel()
+
+# -----------------------------
+# ⚡ ASYNCIO VARIANTS (used by app.channels.telegram_async)
+# -----------------------------
+async def synthesize_speech_bytes_with_google_async(text, language_code="en-IN", voice_code=None, audio_format="mp3") -> bytes:
+    """synthesize_speech_bytes_with_google on the TextToSpeechAsyncClient."""
+    from google.cloud import texttospeech
+    client = get_async_tts_client()
+    synthesis_input = texttospeech.SynthesisInput(text=text)
+    voice = texttospeech.VoiceSelectionParams(
+        language_code=language_code,
+        name=voice_code or f"{language_code}-Standard-B"
+    )
+    audio_config = _audio_config(texttospeech, audio_format)
+    with tracing.span("google.tts", model=voice.name, format=audio_format, input_chars=len(text)) as span:
+        response = await client.synthesize_speech(
+            input=synthesis_input, voice=voice, audio_config=audio_config, timeout=TTS_TIMEOUT
+        )
+        span.set("response_bytes", len(response.audio_content))
+    return response.audio_content
+
+async def iter_speech_chunks_with_google_async(text, language_code="en-IN", voice_code=None,
+                                              audio_format="mp3") -> AsyncIterator[bytes]:
+    """
+    iter_speech_chunks_with_google as tasks on the event loop: at most TTS_MAX_WORKERS
+    chunks of this reply are synthesized at once, and they are yielded in reading order.
+    """
+    semaphore = asyncio.Semaphore(TTS_MAX_WORKERS)
+
+    async def synthesize(chunk):
+        async with semaphore:
+            return await synthesize_speech_bytes_with_google_async(chunk, language_code, voice_code, audio_format)
+
+    tasks = [asyncio.ensure_future(synthesize(chunk)) for chunk in split_sentences(text)]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        # Abandoned early (e.g. a failed send): don't leave synthesis running
+        for task in tasks:
+            task.cancel()
@@ -1,22 +1,45 @@
-from dotenv import load_dotenv
-from openai import OpenAI
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import re
 import shelve
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 
-from cal.secrets import get_secret
+from app.utils import tracing
+from app.utils.config import get_config
+from app.utils.ogg import OggError, split_opus
+from cal.clients import get_async_openai_client, get_openai_client
 
 
-OPENAI_API_KEY = get_secret("OPENAI_API_KEY")
 OPENAI_ASSISTANT_ID = ""
-client = OpenAI(api_key=OPENAI_API_KEY)
+# "stream" consumes run events as they happen; "poll" polls runs.retrieve with adaptive backoff
+ASSISTANT_RUN_MODE = get_config("ASSISTANT_RUN_MODE", "stream")
+ASSISTANT_RUN_TIMEOUT = float(get_config("ASSISTANT_RUN_TIMEOUT", 45))
+ASSISTANT_MAX_CONCURRENT_RUNS = int(get_config("ASSISTANT_MAX_CONCURRENT_RUNS", 4))
+TERMINAL_RUN_STATES = {"completed", "failed", "cancelled", "expired", "incomplete", "requires_action"}
+
+_assistant_executor = ThreadPoolExecutor(max_workers=ASSISTANT_MAX_CONCURRENT_RUNS, thread_name_prefix="assistant")
+_assistants = {}
+_threads_cache = {}
+# The shelf is not safe for concurrent use; cache hits don't take this lock
+_threads_lock = threading.Lock()
+# One lock per assistant ID, so a slow retrieve only holds up callers wanting the same one
+_assistant_locks = {}
+_assistant_locks_guard = threading.Lock()
+
+
+class AssistantRunError(RuntimeError):
+    """Raised when an Assistants run ends in any state other than completed."""
 
 
 def upload_file(path):
     # Upload a file with an "assistants" purpose
-    file = client.files.create(
+    file = get_openai_client().files.create(
         file=open("../../data/airbnb-faq.pdf", "rb"), purpose="assistants"
     )
 
@@ -25,7 +48,7 @@ def create_assistant(file):
     """
     You currently cannot set the temperature for Assistant via the API.
     """
-    assistant = client.beta.assistants.create(
+    assistant = get_openai_client().beta.assistants.create(
         name="WhatsApp AirBnb Assistant",
         instructions="You're a helpful WhatsApp assistant that can assist guests that are staying in our Paris AirBnb. Use your knowledge base to best respond to customer queries. If you don't know the answer, say simply that you cannot help with question and advice to contact the host directly. Be friendly and funny.",
         tools=[{"type": "retrieval"}],
@@ -35,42 +58,134 @@ def create_assistant(file):
     return assistant
 
 
-# Use context manager to ensure the shelf file is closed properly
+# Use context manager to ensure the shelf file is closed properly.
+# Thread ids are cached in memory so the shelf is only opened on a miss or a write.
 def check_if_thread_exists(wa_id):
-    with shelve.open("threads_db") as threads_shelf:
-        return threads_shelf.get(wa_id, None)
+    thread_id = _threads_cache.get(wa_id)
+    if thread_id is not None:
+        return thread_id
+    with _threads_lock:
+        with shelve.open("threads_db") as threads_shelf:
+            thread_id = threads_shelf.get(wa_id, None)
+        if thread_id is not None:
+            _threads_cache[wa_id] = thread_id
+        return thread_id
 
 
 def store_thread(wa_id, thread_id):
-    with shelve.open("threads_db", writeback=True) as threads_shelf:
-        threads_shelf[wa_id] = thread_id
+    with _threads_lock:
+        with shelve.open("threads_db", writeback=True) as threads_shelf:
+            threads_shelf[wa_id] = thread_id
+        _threads_cache[wa_id] = thread_id
+
 
+def get_assistant(assistant_id=None):
+    """Retrieves the Assistant once per process and reuses it for every run."""
+    assistant_id = assistant_id or OPENAI_ASSISTANT_ID
+    assistant = _assistants.get(assistant_id)
+    if assistant is not None:
+        return assistant
+    with _assistant_locks_guard:
+        lock = _assistant_locks.setdefault(assistant_id, threading.Lock())
+    with lock:
+        if assistant_id not in _assistants:
+            _assistants[assistant_id] = get_openai_client().beta.assistants.retrieve(assistant_id)
+        return _assistants[assistant_id]
+
+
+def _cancel_run(thread_id, run_id):
+    try:
+        get_openai_client().beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as e:
+        logging.warning(f"[assistant] Could not cancel run {run_id}: {e}")
 
-def run_assistant(thread, name):
-    # Retrieve the Assistant
-    assistant = client.beta.assistants.retrieve(OPENAI_ASSISTANT_ID)
 
-    # Run the assistant
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant.id,
-        # instructions=f"You are having a conversation with {name}",
+def _poll_run(thread_id, run, deadline):
+    """Polls with adaptive backoff (0.1s growing to 2s) until the run reaches a terminal state."""
+    client = get_openai_client()
+    delay = 0.1
+    while run.status not in TERMINAL_RUN_STATES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            _cancel_run(thread_id, run.id)
+            raise TimeoutError(f"Assistant run {run.id} did not finish within {ASSISTANT_RUN_TIMEOUT}s")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 1.6, 2.0)
+        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+    return run
+
+
+def _stream_run(thread_id, assistant_id, deadline):
+    """Creates the run with stream=True and returns the run object from its terminal event."""
+    client = get_openai_client()
+    stream = client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        stream=True,
+        timeout=ASSISTANT_RUN_TIMEOUT,
     )
+    run = None
+    # Close the stream when leaving early (terminal event or timeout) so its connection goes back to the pool
+    with stream:
+        for event in stream:
+            if event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step"):
+                run = event.data
+                if run.status in TERMINAL_RUN_STATES:
+                    break
+            if time.monotonic() > deadline:
+                if run is not None:
+                    _cancel_run(thread_id, run.id)
+                raise TimeoutError(f"Assistant run did not finish within {ASSISTANT_RUN_TIMEOUT}s")
+    if run is None:
+        raise AssistantRunError("Assistant run stream ended without any run events")
+    return run
+
+
+def run_assistant(thread, name, timeout=ASSISTANT_RUN_TIMEOUT):
+    client = get_openai_client()
+    # Retrieve the Assistant (cached)
+    assistant = get_assistant()
+    deadline = time.monotonic() + timeout
+
+    # Run the assistant and wait for a terminal state
+    if ASSISTANT_RUN_MODE == "stream":
+        run = _stream_run(thread.id, assistant.id, deadline)
+    else:
+        run = client.beta.threads.runs.create(
+            thread_id=thread.id,
+            assistant_id=assistant.id,
+            # instructions=f"You are having a conversation with {name}",
+        )
+        run = _poll_run(thread.id, run, deadline)
 
-    # Wait for completion
-    # https://platform.openai.com/docs/assistants/how-it-works/runs-and-run-steps#:~:text=under%20failed_at.-,Polling%20for%20updates,-In%20order%20to
-    while run.status != "completed":
-        # Be nice to the API
-        time.sleep(0.5)
-        run = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+    if run.status == "requires_action":
+        # No tools with client-side functions are configured, so this cannot be satisfied
+        _cancel_run(thread.id, run.id)
+    if run.status != "completed":
+        raise AssistantRunError(f"Assistant run {run.id} ended with status {run.status}: {getattr(run, 'last_error', None)}")
 
-    # Retrieve the Messages
-    messages = client.beta.threads.messages.list(thread_id=thread.id)
+    # Retrieve the newest Message
+    messages = client.beta.threads.messages.list(thread_id=thread.id, order="desc", limit=1)
     new_message = messages.data[0].content[0].text.value
     logging.info(f"Generated message: {new_message}")
     return new_message
 
 
+def run_assistants_concurrently(threads: List[Tuple[object, str]]) -> List[object]:
+    """
+    Runs the assistant on several (thread, name) pairs at once, bounded by
+    ASSISTANT_MAX_CONCURRENT_RUNS. Returns, in order, each reply or the exception it raised.
+    """
+    futures = [_assistant_executor.submit(run_assistant, thread, name) for thread, name in threads]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
 # def generate_response(message_body, wa_id, name):
 #     # Check if there is already a thread_id for the wa_id
 #     thread_id = check_if_thread_exists(wa_id)
@@ -99,30 +214,71 @@ def run_assistant(thread, name):
 
 #     return new_message
 
-def generate_response(prompt, language="hi"):
-
-    system_prompt = (
-        f"You are a helpful multilingual assistant. "
-        f"First, detect the language of the user prompt. "
-        f"Return the detected language name in English, all lowercase "
-        f"(for example: 'hindi', 'english', 'bengali', 'marathi', 'tamil', 'telugu'). "
-        f"Then, provide a short and direct response (maximum 250 words) in the same language. "
-        f"Return your output in JSON format with two keys: "
-        f"`language` for the detected language, "
-        f"and `answer` for your actual response."
-        f"Your response should be easily understandable and hence avoid using words that are extremely complicated and found only in literature. "
-        f"Do not acknowledge this word limit or any other instructions in your reply."
-    ) 
-
-    response = client.chat.completions.create(
-        model="gpt-4.1-nano",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7
-    )
+CHAT_MODEL = "gpt-4.1-nano"
+
+JSON_SYSTEM_PROMPT = (
+    f"You are a helpful multilingual assistant. "
+    f"First, detect the language of the user prompt. "
+    f"Return the detected language name in English, all lowercase "
+    f"(for example: 'hindi', 'english', 'bengali', 'marathi', 'tamil', 'telugu'). "
+    f"Then, provide a short and direct response (maximum 250 words) in the same language. "
+    f"Return your output in JSON format with two keys: "
+    f"`language` for the detected language, "
+    f"and `answer` for your actual response."
+    f"Your response should be easily understandable and hence avoid using words that are extremely complicated and found only in literature. "
+    f"Do not acknowledge this word limit or any other instructions in your reply."
+)
+
+STREAM_SYSTEM_PROMPT = (
+    f"You are a helpful multilingual assistant. "
+    f"First, detect the language of the user prompt. "
+    f"On the first line, write only the detected language name in English, all lowercase "
+    f"(for example: 'hindi', 'english', 'bengali', 'marathi', 'tamil', 'telugu'). "
+    f"Then, starting on the next line, provide a short and direct response (maximum 250 words) in the same language. "
+    f"Do not use JSON or any other formatting around the answer. "
+    f"Your response should be easily understandable and hence avoid using words that are extremely complicated and found only in literature. "
+    f"Do not acknowledge this word limit or any other instructions in your reply."
+)
+
+# Used when the language was already identified locally (app.utils.langid) or by
+# Whisper: no detection step and no JSON wrapper, so there is nothing to parse.
+PLAIN_SYSTEM_PROMPT = (
+    f"You are a helpful multilingual assistant. "
+    f"Provide a short and direct response (maximum 250 words) in {{language}}. "
+    f"Reply with the answer text only, without JSON or any other formatting around it. "
+    f"Your response should be easily understandable and hence avoid using words that are extremely complicated and found only in literature. "
+    f"Do not acknowledge this word limit or any other instructions in your reply."
+)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+def prompt_fingerprint():
+    """Identifies the model and prompts in use; cached replies from another fingerprint are stale."""
+    material = "\x1f".join([CHAT_MODEL, JSON_SYSTEM_PROMPT, STREAM_SYSTEM_PROMPT, PLAIN_SYSTEM_PROMPT])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def generate_response(prompt, language="hi", history=None, plain=False):
+    """
+    Returns {"language", "answer"}. With plain=True, `language` must be a language
+    name (e.g. "hindi"); the model answers in it directly and the reply is used as is.
+    """
+    system_prompt = PLAIN_SYSTEM_PROMPT.format(language=language) if plain else JSON_SYSTEM_PROMPT
+
+    with tracing.span("openai.chat", model=CHAT_MODEL):
+        response = get_openai_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                *(history or []),
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7
+        )
+        tracing.record_openai_usage(response)
     content = response.choices[0].message.content
+    if plain:
+        return {"language": language, "answer": content.strip()}
     try:
         result = json.loads(content)
     except json.JSONDecodeError:
@@ -131,21 +287,401 @@ def generate_response(prompt, language="hi"):
     return result
 
 
-def transcribe_audio_with_openai(audio_path):
-    with open(audio_path, "rb") as audio_file:
-        transcript = client.audio.transcriptions.create(
+# Streaming replies use a plain-text contract instead of JSON: the first line holds
+# only the language name, everything after it is the answer. That lets the answer
+# be shown as soon as the first line is complete.
+STREAM_LANGUAGE_LINE = re.compile(r"^\W*([A-Za-z]+)\W*$")
+STREAM_TAG_MAX_CHARS = 40
+
+def _language_tag(line: str) -> Optional[str]:
+    """
+    The language a tag line names, or None if the line is answer text. Only names
+    from telegram.LANGUAGE_MAP (mirrored by WHISPER_LANGUAGE_CODES) count, so a
+    one-word opener such as "Sure!" or "Namaste!" stays in the answer.
+    """
+    match = STREAM_LANGUAGE_LINE.match(line)
+    if match and match.group(1).lower() in WHISPER_LANGUAGE_CODES:
+        return match.group(1).lower()
+    return None
+
+def generate_response_stream(prompt, language="hi", history=None, plain=False) -> Iterator[Tuple[Optional[str], str]]:
+    """
+    Streams a reply as (language, answer_delta) pairs. The language is parsed from
+    the leading tag line and repeated on every pair; it is None if the model
+    skipped the tag, in which case all of the output is treated as the answer.
+    With plain=True there is no tag line and `language` is repeated instead.
+    """
+    system_prompt = PLAIN_SYSTEM_PROMPT.format(language=language) if plain else STREAM_SYSTEM_PROMPT
+
+    # The span lasts until the stream is drained, so it is not made current across the yields
+    span = tracing.start_span("openai.chat_stream", model=CHAT_MODEL)
+    try:
+        with tracing.activate(span):
+            stream = get_openai_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    *(history or []),
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                stream=True,
+                # The last chunk then carries the token usage (and no choices)
+                stream_options={"include_usage": True}
+            )
+        yield from _parse_stream(stream, span, language, plain)
+    except Exception as e:
+        tracing.end_span(span, e)
+        raise
+    finally:
+        tracing.end_span(span)
+
+
+class _StreamReplyParser:
+    """Turns streamed chat chunks into (language, answer_delta) pairs; shared by the sync and async streams."""
+    def __init__(self, span, language, plain):
+        self._span = span
+        self._language = language if plain else None
+        self._header = ""
+        self._header_done = plain
+
+    def feed(self, chunk) -> List[Tuple[Optional[str], str]]:
+        if getattr(chunk, "usage", None) is not None:
+            with tracing.activate(self._span):
+                tracing.record_openai_usage(chunk)
+        if not chunk.choices:
+            return []
+        delta = chunk.choices[0].delta.content or ""
+        if not delta:
+            return []
+        if self._header_done:
+            return [(self._language, delta)]
+
+        self._header += delta
+        if "\n" in self._header:
+            first_line, rest = self._header.split("\n", 1)
+            tag = _language_tag(first_line)
+            if tag:
+                self._language = tag
+                rest = rest.lstrip("\n")
+            else:
+                rest = self._header
+            self._header_done = True
+            return [(self._language, rest)] if rest else []
+        if len(self._header) > STREAM_TAG_MAX_CHARS:
+            # No tag line: stop waiting for one and pass the text through
+            self._header_done = True
+            return [(self._language, self._header)]
+        return []
+
+    def finish(self) -> List[Tuple[Optional[str], str]]:
+        if self._header_done or not self._header:
+            return []
+        # The whole reply fit on one line (or was only a tag)
+        tag = _language_tag(self._header)
+        if tag:
+            self._language = tag
+            return []
+        return [(self._language, self._header)]
+
+
+def _parse_stream(stream, span, language, plain) -> Iterator[Tuple[Optional[str], str]]:
+    parser = _StreamReplyParser(span, language, plain)
+    for chunk in stream:
+        yield from parser.feed(chunk)
+    yield from parser.finish()
+
+
+def embed_text(text):
+    """Returns the embedding vector for text (used for near-duplicate matching in the response cache)."""
+    with tracing.span("openai.embeddings", model=EMBEDDING_MODEL, request_bytes=len(text.encode("utf-8"))):
+        response = get_openai_client().embeddings.create(model=EMBEDDING_MODEL, input=text)
+        tracing.record_openai_usage(response)
+    return response.data[0].embedding
+
+
+def summarize_conversation(summary, messages):
+    """Folds older conversation turns into a short running summary for the conversation store."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    with tracing.span("openai.summarize", model="gpt-4.1-nano"):
+        response = get_openai_client().chat.completions.create(
+            model="gpt-4.1-nano",
+            messages=[
+                {"role": "system", "content": (
+                    "Update the running summary of a conversation between a user and an assistant. "
+                    "Keep facts about the user, their questions and the answers given. "
+                    "Write at most 80 words, in English, as plain text."
+                )},
+                {"role": "user", "content": f"Current summary: {summary or '(none)'}\n\nNew turns:\n{transcript}"}
+            ],
+            temperature=0.2
+        )
+        tracing.record_openai_usage(response)
+    return response.choices[0].message.content.strip()
+
+
+# -----------------------------
+# 🎧 WHISPER TRANSCRIPTION
+# -----------------------------
+# Long voice notes (by the duration/file_size Telegram reports) are cut into overlapping
+# Ogg segments that are transcribed in parallel, so latency stays near one segment's
+# rather than growing with the note, and no request nears Whisper's 25 MB cap.
+TRANSCRIBE_CHUNKING = bool(get_config("TRANSCRIBE_CHUNKING", False))
+TRANSCRIBE_CHUNK_MIN_SECONDS = float(get_config("TRANSCRIBE_CHUNK_MIN_SECONDS", 45))
+TRANSCRIBE_CHUNK_MIN_BYTES = int(get_config("TRANSCRIBE_CHUNK_MIN_BYTES", 512 * 1024))
+TRANSCRIBE_SEGMENT_SECONDS = float(get_config("TRANSCRIBE_SEGMENT_SECONDS", 30))
+TRANSCRIBE_OVERLAP_SECONDS = float(get_config("TRANSCRIBE_OVERLAP_SECONDS", 2))
+# Segments of one note in flight at once, and Whisper requests in flight across all notes
+TRANSCRIBE_MAX_WORKERS = int(get_config("TRANSCRIBE_MAX_WORKERS", 4))
+TRANSCRIBE_POOL_WORKERS = int(get_config("TRANSCRIBE_POOL_WORKERS", 16))
+# Words a segment can repeat from the end of the previous one (speech runs ~3 words/s)
+TRANSCRIBE_OVERLAP_MAX_WORDS = int(TRANSCRIBE_OVERLAP_SECONDS * 5) + 2
+
+_whisper_executor = ThreadPoolExecutor(max_workers=TRANSCRIBE_POOL_WORKERS, thread_name_prefix="whisper")
+
+# Whisper reports the language by name but takes an ISO-639-1 hint
+WHISPER_LANGUAGE_CODES = {
+    "hindi": "hi", "bengali": "bn", "marathi": "mr", "tamil": "ta", "telugu": "te", "gujarati": "gu",
+    "kannada": "kn", "malayalam": "ml", "punjabi": "pa", "urdu": "ur", "english": "en", "spanish": "es",
+    "french": "fr", "german": "de", "portuguese": "pt", "russian": "ru", "japanese": "ja", "chinese": "zh",
+    "arabic": "ar",
+}
+
+def transcribe_audio_with_openai(audio, duration=None, file_size=None):
+    """
+    Transcribes an AudioBuffer (or a file path) with Whisper. Returns (text, language).
+    duration and file_size are what Telegram reports for the voice note; above the
+    TRANSCRIBE_CHUNK_MIN_* thresholds the note is transcribed in parallel segments.
+    """
+    if isinstance(audio, str):
+        with open(audio, "rb") as audio_file:
+            return _transcribe(audio_file, os.path.getsize(audio))
+    segments = _voice_segments(audio, duration, file_size)
+    if segments is not None:
+        return _transcribe_segments(audio, segments)
+    with audio.open() as audio_file:
+        # The SDK infers the format from the filename, so pass it alongside the stream
+        return _transcribe((audio.filename, audio_file, audio.content_type), audio.size)
+
+def _transcribe(file, size, language=None):
+    hint = {"language": language} if language else {}
+    with tracing.span("openai.whisper", model="whisper-1", request_bytes=size) as span:
+        transcript = get_openai_client().audio.transcriptions.create(
             model="whisper-1",
-            file=audio_file,
-            response_format="verbose_json"
+            file=file,
+            response_format="verbose_json",
+            **hint
         )
+        # Whisper is billed per second of audio rather than per token
+        span.set("audio_seconds", getattr(transcript, "duration", None))
     return transcript.text, transcript.language
 
-def synthesize_speech_with_openai(text, voice="alloy", output_path="reply.mp3"):
-    response = client.audio.speech.create(
-        model="tts-1",
-        voice=voice,
-        input=text
-    )
+def _voice_segments(audio, duration, file_size) -> Optional[List[Tuple[str, bytes]]]:
+    """(filename, Ogg bytes) for each segment of a long voice note, or None to send it whole."""
+    if not TRANSCRIBE_CHUNKING:
+        return None
+    if (duration or 0) < TRANSCRIBE_CHUNK_MIN_SECONDS and (file_size or 0) < TRANSCRIBE_CHUNK_MIN_BYTES:
+        return None
+    try:
+        segments = split_opus(audio.read(), TRANSCRIBE_SEGMENT_SECONDS, TRANSCRIBE_OVERLAP_SECONDS)
+    except OggError as e:
+        logging.warning(f"[whisper] Sending {audio.filename} whole, it cannot be split: {e}")
+        return None
+    if len(segments) < 2:
+        return None
+    stem = os.path.splitext(audio.filename)[0]
+    return [(f"{stem}_part{index}.ogg", data) for index, (_, data) in enumerate(segments)]
+
+def _transcribe_each(segments, language=None) -> List[Tuple[str, str]]:
+    """Transcribes (filename, data) segments on the shared pool, TRANSCRIBE_MAX_WORKERS at a time."""
+    results = [None] * len(segments)
+    pending = {}
+    queue = list(enumerate(segments))
+    while queue or pending:
+        while queue and len(pending) < TRANSCRIBE_MAX_WORKERS:
+            index, (name, data) = queue.pop(0)
+            future = tracing.submit(_whisper_executor, _transcribe, (name, data, "audio/ogg"), len(data), language)
+            pending[future] = index
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+    return results
+
+def _transcribe_segments(audio, segments):
+    with tracing.span("openai.whisper_chunked", segments=len(segments), request_bytes=audio.size) as span:
+        results = _transcribe_each(segments)
+        language, retry = _segment_language(results)
+        span.set("retried", len(retry))
+        # Misdetected segments are redone with the note's language as a hint
+        if retry:
+            redone = _transcribe_each([segments[index] for index in retry], WHISPER_LANGUAGE_CODES[language])
+            for index, result in zip(retry, redone):
+                results[index] = result
+    return stitch_transcripts([text for text, _ in results]), language
+
+def _segment_language(results) -> Tuple[str, List[int]]:
+    """
+    One language for the whole note: the majority over segments, weighted by how much
+    text each produced. Also returns the segments to redo with that language as a hint:
+    only those heard as a language we don't support (a misdetection). A segment in
+    another supported language is the speaker switching languages and is kept.
+    """
+    votes = {}
+    for text, language in results:
+        votes[language] = votes.get(language, 0) + len(text or "") + 1
+    winner = max(votes, key=votes.get)
+    if winner not in WHISPER_LANGUAGE_CODES:
+        return winner, []
+    return winner, [index for index, (_, language) in enumerate(results) if language not in WHISPER_LANGUAGE_CODES]
+
+def _word_key(word: str) -> str:
+    return re.sub(r"\W+", "", word.lower())
+
+def stitch_transcripts(texts: List[str], max_overlap_words: int = TRANSCRIBE_OVERLAP_MAX_WORDS) -> str:
+    """
+    Joins the transcripts of overlapping segments in order. Where a segment opens with
+    the words the previous one ended on, the repeat is dropped; a cut may also leave a
+    half word at either edge, so up to two leading words and one trailing word may be
+    skipped around the match. At least two words must agree, otherwise both are kept.
+    """
+    words: List[str] = []
+    for text in texts:
+        following = (text or "").split()
+        tail = [_word_key(w) for w in words[-max_overlap_words:]]
+        head = [_word_key(w) for w in following[:max_overlap_words + 2]]
+        best = None  # (matched words, dropped trailing words, skipped leading words)
+        for dropped in (0, 1):
+            end = len(tail) - dropped
+            for skipped in (0, 1, 2):
+                for size in range(min(end, len(head) - skipped), 1, -1):
+                    if head[skipped:skipped + size] == tail[end - size:end]:
+                        if best is None or size > best[0]:
+                            best = (size, dropped, skipped)
+                        break
+        if best is None:
+            words.extend(following)
+        else:
+            size, dropped, skipped = best
+            words = words[:len(words) - dropped] + following[skipped + size:]
+    return " ".join(words)
+
+# REPLY_AUDIO_FORMATS key -> OpenAI TTS response_format ("opus" is Opus in an Ogg container)
+OPENAI_TTS_FORMATS = {"mp3": "mp3", "ogg_opus": "opus"}
+
+def synthesize_speech_with_openai(text, voice="alloy", output_path="reply.mp3", audio_format="mp3"):
+    """
+    Synthesizes text with OpenAI TTS as MP3, or Ogg Opus with audio_format="ogg_opus".
+    Writes output_path, or returns the audio bytes if it is None.
+    """
+    with tracing.span("openai.tts", model="tts-1", format=audio_format, input_chars=len(text)) as span:
+        response = get_openai_client().audio.speech.create(
+            model="tts-1",
+            voice=voice,
+            input=text,
+            response_format=OPENAI_TTS_FORMATS[audio_format]
+        )
+        span.set("response_bytes", len(response.content))
+    if output_path is None:
+        return response.content
     with open(output_path, "wb") as f:
         f.write(response.content)
-    return output_path
\ No newline at end of file
+    return output_path
+
+
+# -----------------------------
+# ⚡ ASYNCIO VARIANTS (used by app.channels.telegram_async)
+# -----------------------------
+async def generate_response_async(prompt, language="hi", history=None, plain=False):
+    """generate_response on the AsyncOpenAI client."""
+    system_prompt = PLAIN_SYSTEM_PROMPT.format(language=language) if plain else JSON_SYSTEM_PROMPT
+
+    with tracing.span("openai.chat", model=CHAT_MODEL):
+        response = await get_async_openai_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                *(history or []),
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7
+        )
+        tracing.record_openai_usage(response)
+    content = response.choices[0].message.content
+    if plain:
+        return {"language": language, "answer": content.strip()}
+    try:
+        result = json.loads(content)
+    except json.JSONDecodeError:
+        result = {"language": None, "answer": content}
+
+    return result
+
+
+async def generate_response_stream_async(prompt, language="hi", history=None, plain=False) -> AsyncIterator[Tuple[Optional[str], str]]:
+    """generate_response_stream on the AsyncOpenAI client; an async generator of (language, answer_delta)."""
+    system_prompt = PLAIN_SYSTEM_PROMPT.format(language=language) if plain else STREAM_SYSTEM_PROMPT
+
+    span = tracing.start_span("openai.chat_stream", model=CHAT_MODEL)
+    try:
+        with tracing.activate(span):
+            stream = await get_async_openai_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    *(history or []),
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+        parser = _StreamReplyParser(span, language, plain)
+        async for chunk in stream:
+            for pair in parser.feed(chunk):
+                yield pair
+        for pair in parser.finish():
+            yield pair
+    except Exception as e:
+        tracing.end_span(span, e)
+        raise
+    finally:
+        tracing.end_span(span)
+
+
+async def transcribe_audio_with_openai_async(audio, duration=None, file_size=None):
+    """Transcribes an AudioBuffer with Whisper on the AsyncOpenAI client. Returns (text, language)."""
+    segments = _voice_segments(audio, duration, file_size)
+    if segments is not None:
+        return await _transcribe_segments_async(audio, segments)
+    with audio.open() as audio_file:
+        return await _transcribe_async((audio.filename, audio_file, audio.content_type), audio.size)
+
+async def _transcribe_async(file, size, language=None):
+    hint = {"language": language} if language else {}
+    with tracing.span("openai.whisper", model="whisper-1", request_bytes=size) as span:
+        transcript = await get_async_openai_client().audio.transcriptions.create(
+            model="whisper-1",
+            file=file,
+            response_format="verbose_json",
+            **hint
+        )
+        span.set("audio_seconds", getattr(transcript, "duration", None))
+    return transcript.text, transcript.language
+
+async def _transcribe_segments_async(audio, segments):
+    slots = asyncio.Semaphore(TRANSCRIBE_MAX_WORKERS)
+
+    async def transcribe(name, data, language=None):
+        async with slots:
+            return await _transcribe_async((name, data, "audio/ogg"), len(data), language)
+
+    with tracing.span("openai.whisper_chunked", segments=len(segments), request_bytes=audio.size) as span:
+        results = list(await asyncio.gather(*(transcribe(name, data) for name, data in segments)))
+        language, retry = _segment_language(results)
+        span.set("retried", len(retry))
+        redone = await asyncio.gather(*(
+            transcribe(*segments[index], WHISPER_LANGUAGE_CODES[language]) for index in retry
+        ))
+        for index, result in zip(retry, redone):
+            results[index] = result
+    return stitch_transcripts([text for text, _ in results]), language
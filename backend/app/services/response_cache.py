@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils.config import get_config
+
+# Semantic matching is optional; exact matching works without NumPy. It is imported on
+# first use so instances that never match near-duplicates don't pay for it at startup.
+np = None
+
+def _load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+    return np
+
+RESPONSE_CACHE_TTL = float(get_config("RESPONSE_CACHE_TTL", 24 * 3600))
+RESPONSE_CACHE_MAX_PER_LANGUAGE = int(get_config("RESPONSE_CACHE_MAX_PER_LANGUAGE", 500))
+RESPONSE_CACHE_SIMILARITY = float(get_config("RESPONSE_CACHE_SIMILARITY", 0.95))
+
+# Embeddings computed by a missed get(), kept for the put() that follows it
+_MISS_EMBEDDINGS = 256
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_question(text: str) -> str:
+    """Unicode NFC, collapsed whitespace and case-folding, so trivially different questions share a key."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip().casefold()
+
+def _scope(language: Optional[str], plain: bool) -> str:
+    """Requested language and answer format: a reply is only reused for the same pair."""
+    return f"{language or 'auto'}:{'plain' if plain else 'json'}"
+
+def _question_key(scope: str, normalized: str) -> str:
+    return hashlib.sha256(f"{scope}\n{normalized}".encode("utf-8")).hexdigest()
+
+# -----------------------------
+# 🗂️ RESPONSE CACHE
+# -----------------------------
+class ResponseCache:
+    """
+    Caches LLM replies for repeated questions.
+
+    Replies are keyed by the requested language and answer format (plain or JSON)
+    as well as the question, so a hit never answers in another language or shape.
+    Exact matches use the normalized question text. When an `embed_fn` is given
+    and NumPy is available, near-duplicates are matched too: each language and
+    format keeps a matrix of unit-length embeddings searched with a single
+    vectorized dot product (cosine similarity) against `similarity`. Entries
+    expire after `ttl` seconds, each language and format holds at most
+    `max_per_language` entries (LRU), and entries written under a different
+    `fingerprint` (model or prompt) are ignored.
+    """
+    def __init__(self, fingerprint: str, ttl: float = RESPONSE_CACHE_TTL,
+                 max_per_language: int = RESPONSE_CACHE_MAX_PER_LANGUAGE,
+                 embed_fn: Optional[Callable[[str], List[float]]] = None,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY):
+        self._fingerprint = fingerprint
+        self._ttl = ttl
+        self._max_per_language = max_per_language
+        self._embed_fn = embed_fn if embed_fn is not None and _load_numpy() is not None else None
+        self._similarity = similarity
+        self._scopes: Dict[str, "OrderedDict[str, Dict[str, Any]]"] = {}
+        self._key_scope: Dict[str, str] = {}
+        self._matrices: Dict[str, Any] = {}  # scope -> (keys, matrix), rebuilt lazily
+        self._miss_embeddings: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+
+    def set_fingerprint(self, fingerprint: str):
+        """Switches to a new model/prompt fingerprint, dropping every cached reply."""
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._scopes.clear()
+                self._key_scope.clear()
+                self._matrices.clear()
+
+    def _embed(self, normalized: str):
+        vector = np.asarray(self._embed_fn(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _live(self, entry: Dict[str, Any]) -> bool:
+        return entry["fingerprint"] == self._fingerprint and entry["expires_at"] > time.time()
+
+    def _drop(self, scope: str, key: str):
+        self._scopes[scope].pop(key, None)
+        self._key_scope.pop(key, None)
+        self._matrices.pop(scope, None)
+
+    def get(self, question: str, language: Optional[str] = None, plain: bool = False) -> Optional[Dict[str, Any]]:
+        """Returns the cached {"language", "answer"} result for this language and format, or None on a miss."""
+        normalized = normalize_question(question)
+        scope = _scope(language, plain)
+        key = _question_key(scope, normalized)
+        with self._lock:
+            if key in self._key_scope:
+                entry = self._scopes[scope].get(key)
+                if entry is not None and self._live(entry):
+                    self._scopes[scope].move_to_end(key)
+                    self._metrics["exact_hits"] += 1
+                    return entry["result"]
+                self._drop(scope, key)
+
+        if self._embed_fn is not None:
+            try:
+                vector = self._embed(normalized)
+            except Exception as e:
+                logging.warning(f"[response_cache] Embedding failed, skipping semantic lookup: {e}")
+                vector = None
+            if vector is not None:
+                result = self._semantic_get(vector, scope)
+                if result is not None:
+                    return result
+                # A miss is normally followed by put() for the same question; don't embed it twice
+                with self._lock:
+                    self._miss_embeddings[key] = vector
+                    while len(self._miss_embeddings) > _MISS_EMBEDDINGS:
+                        self._miss_embeddings.popitem(last=False)
+
+        with self._lock:
+            self._metrics["misses"] += 1
+        return None
+
+    def _semantic_get(self, vector, scope: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if scope not in self._scopes:
+                return None
+            keys, matrix = self._matrix(scope)
+            if matrix is None:
+                return None
+            scores = matrix @ vector
+            index = int(np.argmax(scores))
+            if scores[index] < self._similarity:
+                return None
+            key = keys[index]
+            entry = self._scopes[scope][key]
+            if not self._live(entry):
+                self._drop(scope, key)
+                return None
+            self._scopes[scope].move_to_end(key)
+            self._metrics["semantic_hits"] += 1
+            return entry["result"]
+
+    def _matrix(self, scope: str):
+        """Stacks the scope's embeddings into one matrix; cached until the entries change."""
+        if scope not in self._matrices:
+            entries = [(key, e["embedding"]) for key, e in self._scopes[scope].items() if e.get("embedding") is not None]
+            if entries:
+                keys = [key for key, _ in entries]
+                self._matrices[scope] = (keys, np.vstack([emb for _, emb in entries]))
+            else:
+                self._matrices[scope] = ([], None)
+        return self._matrices[scope]
+
+    def put(self, question: str, result: Dict[str, Any], language: Optional[str] = None, plain: bool = False):
+        """Stores a reply for the language and format it was requested in (the same arguments as get())."""
+        if not result.get("answer"):
+            return
+        normalized = normalize_question(question)
+        scope = _scope(language, plain)
+        key = _question_key(scope, normalized)
+        with self._lock:
+            embedding = self._miss_embeddings.pop(key, None)
+        if embedding is None and self._embed_fn is not None:
+            try:
+                embedding = self._embed(normalized)
+            except Exception as e:
+                logging.warning(f"[response_cache] Embedding failed, caching for exact match only: {e}")
+        with self._lock:
+            if key in self._key_scope:
+                self._drop(scope, key)
+            bucket = self._scopes.setdefault(scope, OrderedDict())
+            bucket[key] = {
+                "result": {"language": result.get("language"), "answer": result["answer"]},
+                "embedding": embedding,
+                "expires_at": time.time() + self._ttl,
+                "fingerprint": self._fingerprint,
+            }
+            self._key_scope[key] = scope
+            while len(bucket) > self._max_per_language:
+                evicted, _ = bucket.popitem(last=False)
+                self._key_scope.pop(evicted, None)
+                self._metrics["evictions"] += 1
+            self._matrices.pop(scope, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["entries"] = {scope: len(bucket) for scope, bucket in self._scopes.items()}
+        lookups = metrics["exact_hits"] + metrics["semantic_hits"] + metrics["misses"]
+        metrics["hit_rate"] = round((metrics["exact_hits"] + metrics["semantic_hits"]) / lookups, 3) if lookups else 0.0
+        return metrics
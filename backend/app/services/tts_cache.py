@@ -0,0 +1,210 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.utils.config import get_config
+from cal.storage import upload_bytes_to_gcs, download_bytes_from_gcs
+
+TTS_CACHE_MEMORY_BYTES = int(get_config("TTS_CACHE_MEMORY_BYTES", 16 * 1024 * 1024))
+# Telegram file_ids remembered in memory (LRU); each entry is ~150 bytes
+TTS_CACHE_FILE_IDS = int(get_config("TTS_CACHE_FILE_IDS", 10000))
+# "none" disables the cache; "memory" keeps only the in-memory tiers; "disk"
+# (TTS_CACHE_DIR) or "gcs" (tts_cache/ in the audio bucket) add a persistent tier.
+# On Cloud Functions /tmp is RAM-backed, so "disk" there costs instance memory.
+TTS_CACHE_BACKEND = get_config("TTS_CACHE_BACKEND", "none")
+TTS_CACHE_DIR = get_config("TTS_CACHE_DIR", "/tmp/tts_cache")
+TTS_CACHE_GCS_PREFIX = "tts_cache"
+
+_WHITESPACE = re.compile(r"\s+")
+
+def tts_cache_key(text: str, language_code: str, voice_name: Optional[str], audio_format: str = "mp3") -> str:
+    """Content address for synthesized speech: hash of normalized text, language, voice and format."""
+    normalized = _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+    material = "\x1f".join([normalized, language_code or "", voice_name or "", audio_format])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+# -----------------------------
+# 💾 PERSISTENT TIERS
+# -----------------------------
+class DiskStore:
+    """Stores audio as <key>.<ext> and Telegram file_ids as <key>.file_id under a directory."""
+    def __init__(self, directory: str):
+        self._dir = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self._dir, name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, name: str, data: bytes):
+        path = os.path.join(self._dir, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+class GCSStore:
+    """Stores cache objects under tts_cache/ in the audio bucket."""
+    def get(self, name: str) -> Optional[bytes]:
+        return download_bytes_from_gcs(f"{TTS_CACHE_GCS_PREFIX}/{name}")
+
+    def put(self, name: str, data: bytes):
+        upload_bytes_to_gcs(f"{TTS_CACHE_GCS_PREFIX}/{name}", data)
+
+# -----------------------------
+# 🔊 TTS CACHE
+# -----------------------------
+class TTSCache:
+    """
+    Two-tier cache for synthesized speech. A byte-bounded in-memory LRU sits in front
+    of an optional persistent store. Telegram file_ids of audio that has already been
+    uploaded are remembered too (up to max_file_ids, least recently used first out),
+    so a repeated reply can be re-sent by file_id. A disabled cache stores nothing.
+    """
+    def __init__(self, max_memory_bytes: int = TTS_CACHE_MEMORY_BYTES, store=None,
+                 max_file_ids: int = TTS_CACHE_FILE_IDS, enabled: bool = True):
+        self._max_memory_bytes = max_memory_bytes
+        self._max_file_ids = max_file_ids
+        self._store = store
+        self._enabled = enabled
+        self._audio: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._file_ids: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "file_id_hits": 0,
+            "bytes_saved": 0,  # Synthesis output and uploads avoided thanks to the cache
+        }
+
+    def _remember(self, key: str, audio: bytes):
+        if not self._enabled or len(audio) > self._max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._audio:
+                self._memory_bytes -= len(self._audio.pop(key))
+            self._audio[key] = audio
+            self._memory_bytes += len(audio)
+            while self._memory_bytes > self._max_memory_bytes:
+                _, evicted = self._audio.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _remember_file_id(self, key: str, entry: Tuple[str, int]):
+        with self._lock:
+            self._file_ids[key] = entry
+            self._file_ids.move_to_end(key)
+            while len(self._file_ids) > self._max_file_ids:
+                self._file_ids.popitem(last=False)
+
+    def get(self, key: str, ext: str = "mp3") -> Optional[bytes]:
+        if not self._enabled:
+            return None
+        with self._lock:
+            audio = self._audio.get(key)
+            if audio is not None:
+                self._audio.move_to_end(key)
+                self._metrics["memory_hits"] += 1
+                self._metrics["bytes_saved"] += len(audio)
+                return audio
+
+        if self._store is not None:
+            try:
+                audio = self._store.get(f"{key}.{ext}")
+            except Exception as e:
+                logging.warning(f"[tts_cache] Persistent read failed for {key}: {e}")
+                audio = None
+            if audio is not None:
+                self._remember(key, audio)
+                with self._lock:
+                    self._metrics["persistent_hits"] += 1
+                    self._metrics["bytes_saved"] += len(audio)
+                return audio
+
+        with self._lock:
+            self._metrics["misses"] += 1
+        return None
+
+    def put(self, key: str, audio: bytes, ext: str = "mp3"):
+        if not self._enabled:
+            return
+        self._remember(key, audio)
+        if self._store is not None:
+            try:
+                self._store.put(f"{key}.{ext}", audio)
+            except Exception as e:
+                logging.warning(f"[tts_cache] Persistent write failed for {key}: {e}")
+
+    def get_file_id(self, key: str) -> Optional[str]:
+        """Returns the Telegram file_id for audio already uploaded with this key, if known."""
+        if not self._enabled:
+            return None
+        with self._lock:
+            entry = self._file_ids.get(key)
+            if entry is not None:
+                self._file_ids.move_to_end(key)
+        if entry is None and self._store is not None:
+            try:
+                stored = self._store.get(f"{key}.file_id")
+            except Exception as e:
+                logging.warning(f"[tts_cache] Persistent file_id read failed for {key}: {e}")
+                stored = None
+            if stored:
+                file_id, _, size = stored.decode("utf-8").partition(" ")
+                entry = (file_id, int(size or 0))
+                self._remember_file_id(key, entry)
+        if entry is None:
+            return None
+        with self._lock:
+            self._metrics["file_id_hits"] += 1
+            self._metrics["bytes_saved"] += entry[1]
+        return entry[0]
+
+    def put_file_id(self, key: str, file_id: str, size: int = 0):
+        """Remembers the file_id Telegram assigned to uploaded audio of `size` bytes."""
+        if not self._enabled:
+            return
+        self._remember_file_id(key, (file_id, size))
+        if self._store is not None:
+            try:
+                self._store.put(f"{key}.file_id", f"{file_id} {size}".encode("utf-8"))
+            except Exception as e:
+                logging.warning(f"[tts_cache] Persistent file_id write failed for {key}: {e}")
+
+    def forget_file_id(self, key: str):
+        """Drops a file_id Telegram rejected so the next send uploads the bytes again."""
+        with self._lock:
+            self._file_ids.pop(key, None)
+        if self._store is not None:
+            try:
+                self._store.put(f"{key}.file_id", b"")
+            except Exception as e:
+                logging.warning(f"[tts_cache] Persistent file_id reset failed for {key}: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["memory_entries"] = len(self._audio)
+            metrics["memory_bytes"] = self._memory_bytes
+            metrics["file_ids"] = len(self._file_ids)
+        lookups = metrics["memory_hits"] + metrics["persistent_hits"] + metrics["misses"]
+        metrics["hit_rate"] = round((metrics["memory_hits"] + metrics["persistent_hits"]) / lookups, 3) if lookups else 0.0
+        return metrics
+
+def _build_store():
+    if TTS_CACHE_BACKEND == "disk":
+        return DiskStore(TTS_CACHE_DIR)
+    if TTS_CACHE_BACKEND == "gcs":
+        return GCSStore()
+    return None
+
+tts_cache = TTSCache(store=_build_store(), enabled=TTS_CACHE_BACKEND != "none")
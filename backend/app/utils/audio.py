@@ -0,0 +1,157 @@
+import io
+import os
+import tempfile
+from typing import BinaryIO, Iterable, Optional, Union
+
+from app.utils.config import get_config
+
+AUDIO_MEMORY_LIMIT_BYTES = int(get_config("AUDIO_MEMORY_LIMIT_BYTES", 8 * 1024 * 1024))
+AUDIO_MAX_BYTES = int(get_config("AUDIO_MAX_BYTES", 20 * 1024 * 1024))  # Bot API getFile download limit
+# Opt-in: payloads above AUDIO_MEMORY_LIMIT_BYTES go to a temp file instead of being rejected
+AUDIO_SPILL_TO_DISK = bool(get_config("AUDIO_SPILL_TO_DISK", False))
+
+class AudioTooLargeError(ValueError):
+    """Raised when a download exceeds the configured size limits."""
+
+# -----------------------------
+# 🔈 REPLY AUDIO FORMATS
+# -----------------------------
+# How a spoken reply is encoded and sent. "mp3" goes out with sendAudio and shows as
+# a music track; "ogg_opus" goes out with sendVoice and shows as a voice note, and is
+# smaller for speech. MP3 is a plain sequence of frames, so chunks synthesized
+# separately can be joined byte-wise; each Ogg chunk is a complete stream of its own.
+REPLY_AUDIO_FORMATS = {
+    "mp3":      {"ext": "mp3", "content_type": "audio/mpeg", "method": "sendAudio", "field": "audio", "joinable": True},
+    "ogg_opus": {"ext": "ogg", "content_type": "audio/ogg", "method": "sendVoice", "field": "voice", "joinable": False},
+}
+
+# -----------------------------
+# 🎙️ IN-MEMORY AUDIO BUFFER
+# -----------------------------
+class _MemoryReader(io.RawIOBase):
+    """Read-only, seekable file over in-memory data; unlike io.BytesIO it never copies a bytearray."""
+    def __init__(self, data):
+        super().__init__()
+        self._view = memoryview(data).toreadonly()
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos += len(chunk)
+        return chunk
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(base + offset, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+class AudioBuffer:
+    """
+    Audio payload held in memory (the download's own buffer, shared and never copied;
+    treat it as read-only), or in a temp file when spilling is enabled and the payload
+    is over the memory threshold. Every consumer calls open() to get its own
+    independent reader, so Whisper and the GCS upload can read the same buffer
+    concurrently.
+    """
+    def __init__(self, filename: str, data: Optional[Union[bytes, bytearray]] = None, path: Optional[str] = None,
+                 content_type: str = "audio/ogg"):
+        self.filename = filename
+        self.content_type = content_type
+        self._data = data
+        self._path = path
+
+    @property
+    def size(self) -> int:
+        if self._data is not None:
+            return len(self._data)
+        return os.path.getsize(self._path)
+
+    @property
+    def in_memory(self) -> bool:
+        return self._data is not None
+
+    def open(self) -> BinaryIO:
+        if self._data is not None:
+            return _MemoryReader(self._data)
+        return open(self._path, "rb")
+
+    def read(self) -> Union[bytes, bytearray]:
+        if self._data is not None:
+            return self._data
+        with open(self._path, "rb") as f:
+            return f.read()
+
+    def close(self):
+        """Releases the payload; removes the temp file if one was used."""
+        self._data = None
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except FileNotFoundError:
+                pass
+            self._path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def buffer_from_chunks(filename: str, chunks: Iterable[bytes], content_type: str = "audio/ogg",
+                       memory_limit: int = AUDIO_MEMORY_LIMIT_BYTES, max_bytes: int = AUDIO_MAX_BYTES,
+                       spill_to_disk: bool = AUDIO_SPILL_TO_DISK) -> AudioBuffer:
+    """
+    Collects a streamed download into an AudioBuffer, enforcing the size bounds.
+    Stays in memory up to `memory_limit`; beyond that it either spills to a temp
+    file (when `spill_to_disk` is set) or raises AudioTooLargeError.
+    """
+    memory = bytearray()
+    spill_file = None
+    total = 0
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            total += len(chunk)
+            if total > max_bytes:
+                raise AudioTooLargeError(f"Audio exceeds {max_bytes} bytes")
+            if spill_file is None and total > memory_limit:
+                if not spill_to_disk:
+                    raise AudioTooLargeError(f"Audio exceeds in-memory limit of {memory_limit} bytes")
+                spill_file = tempfile.NamedTemporaryFile(prefix="audio_", suffix=os.path.splitext(filename)[1], delete=False)
+                spill_file.write(memory)
+                memory = bytearray()
+            if spill_file is not None:
+                spill_file.write(chunk)
+            else:
+                memory.extend(chunk)
+    except BaseException:
+        if spill_file is not None:
+            spill_file.close()
+            os.remove(spill_file.name)
+        raise
+
+    if spill_file is not None:
+        spill_file.close()
+        return AudioBuffer(filename, path=spill_file.name, content_type=content_type)
+    return AudioBuffer(filename, data=memory, content_type=content_type)
@@ -0,0 +1,79 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from app.utils.config import get_config
+
+DEDUP_CACHE_SIZE = int(get_config("DEDUP_CACHE_SIZE", 10000))
+# Opt-in: also records claims in Firestore so redeliveries routed to another instance
+# (or arriving after a restart) are caught. Costs one Firestore create per update.
+DEDUP_PERSISTENT = bool(get_config("DEDUP_PERSISTENT", False))
+
+# -----------------------------
+# 🔁 UPDATE DEDUPLICATION
+# -----------------------------
+class UpdateDeduplicator:
+    """
+    Remembers which Telegram update_ids have been claimed for processing.
+    A bounded in-memory LRU answers redeliveries to the same instance without a
+    network call; an optional persistent claim function covers the rest.
+    """
+    def __init__(self, max_size: int = DEDUP_CACHE_SIZE,
+                 persistent_claim: Optional[Callable[[int], bool]] = None,
+                 persistent_release: Optional[Callable[[int], None]] = None):
+        self._max_size = max_size
+        self._seen: "OrderedDict[int, bool]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._persistent_claim = persistent_claim
+        self._persistent_release = persistent_release
+        self.hits = 0              # Redeliveries caught by the in-memory LRU
+        self.persistent_hits = 0   # Redeliveries caught by the persistent store
+        self.misses = 0            # First-time updates that went on to be processed
+
+    def claim(self, update_id: int) -> bool:
+        """Returns True if the caller should process this update, False if it is a duplicate."""
+        with self._lock:
+            if update_id in self._seen:
+                self._seen.move_to_end(update_id)
+                self.hits += 1
+                return False
+            self._remember(update_id)
+
+        if self._persistent_claim is not None:
+            try:
+                if not self._persistent_claim(update_id):
+                    with self._lock:
+                        self.persistent_hits += 1
+                    return False
+            except Exception as e:
+                # Fail open: a store outage must not stop the bot from replying
+                logging.warning(f"[dedup] Persistent claim failed for update {update_id}: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return True
+
+    def release(self, update_id: int):
+        """Forgets a claim after a processing failure so a redelivery is retried."""
+        with self._lock:
+            self._seen.pop(update_id, None)
+        if self._persistent_release is not None:
+            try:
+                self._persistent_release(update_id)
+            except Exception as e:
+                logging.warning(f"[dedup] Persistent release failed for update {update_id}: {e}")
+
+    def _remember(self, update_id: int):
+        self._seen[update_id] = True
+        if len(self._seen) > self._max_size:
+            self._seen.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "cached": len(self._seen),
+            }
@@ -1,7 +1,19 @@
 import os
-from dotenv import load_dotenv
+from pathlib import Path
 
-load_dotenv(override=True)
+def _find_dotenv():
+    """The nearest .env in this directory or a parent (the file is not deployed)."""
+    for directory in Path(__file__).resolve().parents:
+        candidate = directory / ".env"
+        if candidate.is_file():
+            return candidate
+    return None
+
+# python-dotenv is only imported when there is a .env file to load
+_dotenv_path = _find_dotenv()
+if _dotenv_path is not None:
+    from dotenv import load_dotenv
+    load_dotenv(_dotenv_path, override=True)
 
 def is_local():
     ENV = os.getenv("ENVIRONMENT", "CLOUD")
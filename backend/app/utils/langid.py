@@ -0,0 +1,219 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# -----------------------------
+# 🔤 SCRIPT DETECTION
+# -----------------------------
+# Unicode blocks for the scripts of the languages in telegram.LANGUAGE_MAP
+SCRIPT_RANGES: List[Tuple[int, int, str]] = [
+    (0x0041, 0x024F, "latin"),
+    (0x0400, 0x04FF, "cyrillic"),
+    (0x0600, 0x06FF, "arabic"),
+    (0x0750, 0x077F, "arabic"),
+    (0x0900, 0x097F, "devanagari"),
+    (0x0980, 0x09FF, "bengali"),
+    (0x0A00, 0x0A7F, "gurmukhi"),
+    (0x0A80, 0x0AFF, "gujarati"),
+    (0x0B80, 0x0BFF, "tamil"),
+    (0x0C00, 0x0C7F, "telugu"),
+    (0x0C80, 0x0CFF, "kannada"),
+    (0x0D00, 0x0D7F, "malayalam"),
+    (0x3040, 0x30FF, "kana"),
+    (0x4E00, 0x9FFF, "han"),
+    (0xFB50, 0xFDFF, "arabic"),
+    (0xFE70, 0xFEFF, "arabic"),
+]
+
+# Scripts used by exactly one supported language decide it on their own
+SCRIPT_LANGUAGE = {
+    "bengali": "bengali",
+    "gurmukhi": "punjabi",
+    "gujarati": "gujarati",
+    "tamil": "tamil",
+    "telugu": "telugu",
+    "kannada": "kannada",
+    "malayalam": "malayalam",
+    "cyrillic": "russian",
+    "kana": "japanese",
+    "han": "chinese",
+}
+
+# Shared scripts are resolved with the character n-gram model below
+SCRIPT_CANDIDATES = {
+    "devanagari": ["hindi", "marathi"],
+    "arabic": ["urdu", "arabic"],
+    "latin": ["english", "spanish", "french", "german", "portuguese", "hinglish"],
+}
+
+# Each supported language's script, to tell a claim in the wrong script from a near miss
+LANGUAGE_SCRIPT = {language: script for script, language in SCRIPT_LANGUAGE.items()}
+LANGUAGE_SCRIPT.update({language: script for script, languages in SCRIPT_CANDIDATES.items() for language in languages})
+
+def _script_of(ch: str) -> Optional[str]:
+    code = ord(ch)
+    for start, end, script in SCRIPT_RANGES:
+        if start <= code <= end:
+            if script == "latin" and not ch.isalpha():
+                return None
+            return script
+    return None
+
+def script_counts(text: str) -> Counter:
+    """Counts letters per script, ignoring digits, punctuation and whitespace."""
+    counts: Counter = Counter()
+    for ch in text:
+        script = _script_of(ch)
+        if script is not None:
+            counts[script] += 1
+    return counts
+
+# -----------------------------
+# 📊 CHARACTER TRIGRAM MODEL
+# -----------------------------
+# Compact seed text per language: everyday words and function words, which are the
+# most frequent (and most distinctive) trigrams in short chat messages.
+SEED_TEXT: Dict[str, str] = {
+    "hindi": "मैं आप से क्या पूछ सकता हूँ यह बहुत अच्छा है मुझे नहीं पता आपका नाम क्या है "
+             "मौसम कैसा है किसान के लिए योजना क्या हैं हम कहाँ जा रहे हैं उसने कहा कि वह आएगा "
+             "मेरे पास समय नहीं है इसके बारे में बताइए धन्यवाद भाई कृपया मदद कीजिए "
+             "नमस्ते आप कैसे हैं मैं ठीक हूँ मेरा नाम राम है और मैं गाँव में रहता हूँ हमारे घर में चार लोग हैं "
+             "मेरी माँ खाना बनाती है और पिताजी खेत में काम करते हैं बच्चे रोज़ सुबह पढ़ने जाते हैं "
+             "कल रात बहुत तेज़ बारिश हुई थी इसलिए सड़क पर पानी भर गया क्या आप मुझे बता सकते हैं कि अस्पताल कितनी दूर है "
+             "मुझे सिर में दर्द हो रहा है और बुखार भी है दवाई कब लेनी चाहिए धान की खेती के लिए कितना पानी चाहिए "
+             "इस साल फसल अच्छी नहीं हुई क्योंकि बारिश कम हुई सरकार की नई योजना के बारे में जानकारी दीजिए "
+             "मुझे पैसे भेजने हैं लेकिन मोबाइल में नेटवर्क नहीं है वह कल शहर जाएगा और परसों वापस आएगा "
+             "हम लोग शाम को चाय पीते हैं और बातें करते हैं यह किताब किसकी है उन्होंने कहा था कि काम जल्दी हो जाएगा "
+             "तुम क्यों नहीं आए मैं तुम्हारा इंतज़ार कर रहा था बाज़ार में सब्ज़ी बहुत महंगी हो गई है "
+             "आलू और प्याज़ का भाव क्या है मेरी बहन की शादी अगले महीने है हमें ट्रेन का टिकट चाहिए "
+             "बस कितने बजे आती है मुझे समझ नहीं आया फिर से बताइए आपने बहुत मदद की "
+             "गाय को चारा देना है और दूध निकालना है पानी गरम करके पीना चाहिए बच्चों को टीका कब लगवाना चाहिए "
+             "मैंने अभी तक खाना नहीं खाया है उसको नौकरी मिल गई है यहाँ से स्टेशन कैसे जाएँ "
+             "मेरे पास फ़ोन नहीं था इसलिए मैं बात नहीं कर सका",
+    "marathi": "मी तुम्हाला काय विचारू शकतो हे खूप छान आहे मला माहित नाही तुमचे नाव काय आहे "
+               "हवामान कसे आहे शेतकऱ्यांसाठी योजना कोणत्या आहेत आपण कुठे जात आहोत तो म्हणाला की तो येईल "
+               "माझ्याकडे वेळ नाही याबद्दल सांगा धन्यवाद कृपया मदत करा आमच्या गावात पाऊस झाला "
+               "नमस्कार तुम्ही कसे आहात मी बरा आहे माझे नाव राम आहे आणि मी गावात राहतो आमच्या घरात चार माणसे आहेत "
+               "माझी आई स्वयंपाक करते आणि वडील शेतात काम करतात मुले रोज सकाळी शिकायला जातात "
+               "काल रात्री खूप जोरात पाऊस पडला म्हणून रस्त्यावर पाणी साचले तुम्ही मला सांगू शकता का की दवाखाना किती लांब आहे "
+               "माझे डोके दुखत आहे आणि तापही आहे औषध केव्हा घ्यायचे भाताच्या शेतीसाठी किती पाणी लागते "
+               "या वर्षी पीक चांगले आले नाही कारण पाऊस कमी झाला सरकारच्या नवीन योजनेबद्दल माहिती द्या "
+               "मला पैसे पाठवायचे आहेत पण मोबाईलला नेटवर्क नाही तो उद्या शहरात जाईल आणि परवा परत येईल "
+               "आम्ही संध्याकाळी चहा पितो आणि गप्पा मारतो हे पुस्तक कोणाचे आहे त्यांनी सांगितले होते की काम लवकर होईल "
+               "तू का आला नाहीस मी तुझी वाट पाहत होतो बाजारात भाजी खूप महाग झाली आहे "
+               "बटाटे आणि कांद्याचा भाव काय आहे माझ्या बहिणीचे लग्न पुढच्या महिन्यात आहे आम्हाला रेल्वेचे तिकीट हवे आहे "
+               "बस किती वाजता येते मला समजले नाही पुन्हा सांगा तुम्ही खूप मदत केली "
+               "गाईला चारा द्यायचा आहे आणि दूध काढायचे आहे पाणी उकळून प्यायला पाहिजे मुलांना लस केव्हा द्यायची "
+               "मी अजून जेवलो नाही त्याला नोकरी मिळाली आहे इथून स्टेशनला कसे जायचे "
+               "माझ्याकडे फोन नव्हता म्हणून मी बोलू शकलो नाही",
+    "urdu": "میں آپ سے کیا پوچھ سکتا ہوں یہ بہت اچھا ہے مجھے نہیں پتا آپ کا نام کیا ہے "
+            "موسم کیسا ہے کسانوں کے لیے کون سی اسکیمیں ہیں ہم کہاں جا رہے ہیں اس نے کہا کہ وہ آئے گا "
+            "میرے پاس وقت نہیں ہے اس کے بارے میں بتائیں شکریہ براہ کرم مدد کریں",
+    "arabic": "ماذا يمكنني أن أسألك هذا جيد جدا لا أعرف ما اسمك كيف حال الطقس اليوم "
+              "ما هي البرامج المتاحة للمزارعين إلى أين نحن ذاهبون قال إنه سيأتي "
+              "ليس لدي وقت أخبرني عن ذلك شكرا لك من فضلك ساعدني في هذا الأمر",
+    "english": "what can i ask you this is very good i do not know what is your name "
+               "how is the weather today which schemes are there for farmers where are we going "
+               "he said that he will come i do not have time please tell me about it thank you for the help",
+    "spanish": "qué te puedo preguntar esto es muy bueno no sé cuál es tu nombre "
+               "cómo está el tiempo hoy qué programas hay para los agricultores adónde vamos "
+               "dijo que vendría no tengo tiempo por favor cuéntame sobre eso gracias por la ayuda",
+    "french": "que puis-je vous demander c'est très bien je ne sais pas quel est votre nom "
+              "quel temps fait-il aujourd'hui quels sont les programmes pour les agriculteurs où allons-nous "
+              "il a dit qu'il viendrait je n'ai pas le temps dites-moi merci pour votre aide",
+    "german": "was kann ich dich fragen das ist sehr gut ich weiß nicht wie ist dein name "
+              "wie ist das wetter heute welche programme gibt es für die bauern wohin gehen wir "
+              "er sagte dass er kommen wird ich habe keine zeit bitte erzähl mir davon danke für die hilfe",
+    "portuguese": "o que posso te perguntar isso é muito bom não sei qual é o seu nome "
+                  "como está o tempo hoje quais são os programas para os agricultores para onde vamos "
+                  "ele disse que viria não tenho tempo por favor me fale sobre isso obrigado pela ajuda",
+    # Romanized Hindi is common in chat; it is identified so it is not mistaken for
+    # English, but it is not in LANGUAGE_MAP, so callers treat it as unidentified.
+    "hinglish": "main aap se kya puch sakta hoon yeh bahut accha hai mujhe nahi pata aapka naam kya hai "
+                "mausam kaisa hai kisan ke liye yojana kya hain hum kahan ja rahe hain usne kaha ki woh aayega "
+                "mere paas samay nahi hai iske baare mein bataiye dhanyavaad bhai kripya madad kijiye namaste kaise ho",
+}
+
+_NON_LETTERS = re.compile(r"[^\w\s']+|\d+")
+
+def _trigrams(text: str) -> List[str]:
+    words = _NON_LETTERS.sub(" ", text.lower()).split()
+    grams = []
+    for word in words:
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def _build_profile(text: str) -> Tuple[Dict[str, float], float]:
+    counts = Counter(_trigrams(text))
+    total = sum(counts.values())
+    vocab = len(counts) + 1
+    # Add-one smoothed log-probabilities; unseen trigrams get the floor value
+    profile = {gram: math.log((count + 1) / (total + vocab)) for gram, count in counts.items()}
+    return profile, math.log(1 / (total + vocab))
+
+PROFILES = {language: _build_profile(text) for language, text in SEED_TEXT.items()}
+
+def _ngram_scores(text: str, candidates: List[str]) -> List[Tuple[str, float]]:
+    grams = _trigrams(text)
+    scores = []
+    for language in candidates:
+        profile, floor = PROFILES[language]
+        scores.append((language, sum(profile.get(gram, floor) for gram in grams) / max(len(grams), 1)))
+    return sorted(scores, key=lambda item: item[1], reverse=True)
+
+# -----------------------------
+# 🌐 LANGUAGE IDENTIFICATION
+# -----------------------------
+def identify_language(text: str) -> Tuple[Optional[str], float]:
+    """
+    Identifies the language of text in-process, with no network call.
+    Returns (language name as used in LANGUAGE_MAP, or "hinglish"; confidence in [0, 1])
+    or (None, 0.0) when the text has no letters.
+    """
+    counts = script_counts(text or "")
+    letters = sum(counts.values())
+    if not letters:
+        return None, 0.0
+
+    # Any kana means Japanese, even when most characters are kanji
+    if counts.get("kana"):
+        counts["kana"] += counts.pop("han", 0)
+    script, script_letters = counts.most_common(1)[0]
+    script_share = script_letters / letters
+
+    if script in SCRIPT_LANGUAGE:
+        return SCRIPT_LANGUAGE[script], round(script_share, 3)
+
+    ranked = _ngram_scores(text, SCRIPT_CANDIDATES[script])
+    if len(ranked) == 1 or script_letters < 8:
+        # Too little text to tell related languages apart reliably
+        return ranked[0][0], round(0.4 * script_share, 3)
+    (best, best_score), (_, second_score) = ranked[0], ranked[1]
+    # Average log-probabilities differ by ~0.1-1.0 nats per trigram between languages;
+    # a lead under ~0.12 nats is a near tie and stays below the 0.5 default threshold
+    margin = 1 - math.exp(-(best_score - second_score) * 6)
+    return best, round(script_share * margin, 3)
+
+def detect_language(text: str, min_confidence: float = 0.5) -> Optional[str]:
+    """Returns the identified language, or None when the identification is not confident."""
+    language, confidence = identify_language(text)
+    return language if confidence >= min_confidence else None
+
+def validate_language(claimed: Optional[str], text: str, min_confidence: float = 0.7) -> Optional[str]:
+    """
+    Checks an externally claimed language (e.g. from the LLM) against the text itself.
+    Keeps the claim unless the local identifier confidently puts the text in another
+    script. Related languages sharing a script (Hindi/Marathi, Urdu/Arabic) are where
+    the trigram model is weakest, so a claim in the text's own script always stands.
+    """
+    detected, confidence = identify_language(text)
+    if detected is None:
+        return claimed
+    if claimed is None:
+        return detected
+    claimed = claimed.lower()
+    if LANGUAGE_SCRIPT.get(claimed) == LANGUAGE_SCRIPT.get(detected):
+        return claimed
+    return detected if confidence >= min_confidence else claimed
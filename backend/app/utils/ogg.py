@@ -0,0 +1,178 @@
+import struct
+import zlib
+from typing import List, NamedTuple, Tuple
+
+# -----------------------------
+# 📦 OGG PAGES
+# -----------------------------
+# Ogg framing (RFC 3533): each page is a 27-byte header, a lacing table of segment
+# sizes and the body. Packets longer than 255 bytes span several lacing values, and
+# a lacing value of 255 at the end of a page means the packet continues on the next.
+_HEADER = struct.Struct("<4sBBqIIIB")
+CONTINUED, BOS, EOS = 0x01, 0x02, 0x04
+OPUS_RATE = 48000  # Opus granule positions always count 48 kHz samples
+
+class OggError(ValueError):
+    """Raised for data that is not a well-formed Ogg Opus stream."""
+
+class OggPage(NamedTuple):
+    header_type: int
+    granule: int
+    serial: int
+    sequence: int
+    lacing: bytes
+    body: bytes
+
+    @property
+    def ends_packet(self) -> bool:
+        """True if the last packet on the page finishes on it."""
+        return bool(self.lacing) and self.lacing[-1] < 255
+
+# The Ogg CRC is the non-reflected CRC-32 (polynomial 0x04C11DB7, zero init, no final
+# XOR). Bit-reversing every byte and the result turns it into the reflected CRC zlib
+# implements, so pages are checksummed in C rather than a per-byte Python loop.
+_REVERSE_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+def ogg_crc(data: bytes) -> int:
+    reflected = zlib.crc32(data.translate(_REVERSE_BITS), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int(f"{reflected:032b}"[::-1], 2)
+
+def parse_pages(data: bytes) -> List[OggPage]:
+    """Splits an Ogg stream into pages, checking capture patterns and CRCs."""
+    pages = []
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < _HEADER.size:
+            raise OggError(f"Truncated page header at byte {offset}")
+        capture, version, header_type, granule, serial, sequence, crc, count = _HEADER.unpack_from(data, offset)
+        if capture != b"OggS" or version != 0:
+            raise OggError(f"No Ogg page at byte {offset}")
+        lacing_start = offset + _HEADER.size
+        lacing = data[lacing_start:lacing_start + count]
+        body_start = lacing_start + count
+        end = body_start + sum(lacing)
+        if len(lacing) != count or end > len(data):
+            raise OggError(f"Truncated page at byte {offset}")
+        raw = bytearray(data[offset:end])
+        raw[22:26] = b"\0\0\0\0"
+        if ogg_crc(bytes(raw)) != crc:
+            raise OggError(f"Bad CRC on page {sequence}")
+        pages.append(OggPage(header_type, granule, serial, sequence, lacing, data[body_start:end]))
+        offset = end
+    return pages
+
+def write_page(page: OggPage) -> bytes:
+    header = _HEADER.pack(b"OggS", 0, page.header_type, page.granule, page.serial, page.sequence, 0, len(page.lacing))
+    raw = header + page.lacing + page.body
+    return raw[:22] + struct.pack("<I", ogg_crc(raw)) + raw[26:]
+
+def lacing_for(packet_sizes: List[int]) -> bytes:
+    """Lacing table for whole packets of the given sizes."""
+    values = bytearray()
+    for size in packet_sizes:
+        values.extend([255] * (size // 255))
+        values.append(size % 255)
+    return bytes(values)
+
+# -----------------------------
+# ✂️ OPUS SEGMENTS
+# -----------------------------
+def _opus_layout(pages: List[OggPage]) -> Tuple[List[OggPage], List[OggPage], int]:
+    """(header pages, audio pages, pre-skip) of an Ogg Opus stream."""
+    if not pages or not pages[0].body.startswith(b"OpusHead") or len(pages[0].body) < 19:
+        raise OggError("Not an Ogg Opus stream")
+    pre_skip = struct.unpack_from("<H", pages[0].body, 10)[0]
+    # OpusHead is alone on the first page; OpusTags may span pages, and audio starts on a fresh page
+    index = 1
+    while index < len(pages) and not pages[index].ends_packet:
+        index += 1
+    return pages[:index + 1], pages[index + 1:], pre_skip
+
+def opus_duration(data: bytes) -> float:
+    """Playback length of an Ogg Opus stream in seconds, from its last granule position."""
+    _, audio, pre_skip = _opus_layout(parse_pages(data))
+    granules = [page.granule for page in audio if page.granule >= 0]
+    return max(granules[-1] - pre_skip, 0) / OPUS_RATE if granules else 0.0
+
+def split_opus(data: bytes, segment_seconds: float, overlap_seconds: float) -> List[Tuple[float, bytes]]:
+    """
+    Cuts an Ogg Opus stream at page boundaries into segments of about segment_seconds
+    that overlap their neighbours by at least overlap_seconds. Each segment is a
+    complete stream: the original header pages, then its audio pages renumbered, with
+    granule positions rebased to zero and EOS on the last page. Returns
+    (start_seconds, ogg bytes) pairs in order; a short stream comes back whole.
+    """
+    headers, audio, pre_skip = _opus_layout(parse_pages(data))
+    # Start and end time of every audio page; pages ending no packet carry granule -1
+    spans = []
+    previous = 0
+    for page in audio:
+        end = page.granule if page.granule >= 0 else previous
+        spans.append((max(previous - pre_skip, 0) / OPUS_RATE, max(end - pre_skip, 0) / OPUS_RATE))
+        previous = end
+    total = spans[-1][1] if spans else 0.0
+    if total <= segment_seconds:
+        return [(0.0, data)]
+
+    step = segment_seconds - overlap_seconds
+    windows = []
+    start = 0.0
+    while start + segment_seconds < total:
+        windows.append((start, start + segment_seconds))
+        start += step
+    # Fold a short tail into the previous window rather than sending a sliver
+    if total - start < overlap_seconds * 2:
+        windows[-1] = (windows[-1][0], total)
+    else:
+        windows.append((start, total))
+
+    segments = []
+    for window_start, window_end in windows:
+        first = next(i for i, (s, e) in enumerate(spans) if e > window_start)
+        # A segment must start on a fresh packet and end on a finished one
+        while first > 0 and audio[first].header_type & CONTINUED:
+            first -= 1
+        last = max(i for i, (s, e) in enumerate(spans) if s < window_end)
+        while last < len(audio) - 1 and not audio[last].ends_packet:
+            last += 1
+        segments.append((spans[first][0], _rebuild(headers, audio, first, last)))
+    return segments
+
+def _rebuild(headers: List[OggPage], audio: List[OggPage], first: int, last: int) -> bytes:
+    base = _granule_before(audio, first)
+    out = [write_page(page) for page in headers]
+    sequence = headers[-1].sequence + 1
+    for index in range(first, last + 1):
+        page = audio[index]
+        header_type = page.header_type & ~EOS | (EOS if index == last else 0)
+        granule = page.granule - base if page.granule >= 0 else -1
+        out.append(write_page(page._replace(header_type=header_type, granule=granule, sequence=sequence)))
+        sequence += 1
+    return b"".join(out)
+
+def _granule_before(audio: List[OggPage], index: int) -> int:
+    """Samples decoded before audio page `index`, i.e. the last granule set ahead of it."""
+    for page in reversed(audio[:index]):
+        if page.granule >= 0:
+            return page.granule
+    return 0
+
+def opus_stream(serial: int, packets_per_page: List[List[bytes]], samples_per_packet: int = 960,
+                pre_skip: int = 312) -> bytes:
+    """
+    Builds an Ogg Opus stream from already-encoded packets grouped into pages
+    (960 samples is a 20 ms Opus frame). Used to assemble synthetic voice notes.
+    """
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, OPUS_RATE, 0, 0)
+    tags = b"OpusTags" + struct.pack("<I", 0) + struct.pack("<I", 0)
+    pages = [
+        OggPage(BOS, 0, serial, 0, lacing_for([len(head)]), head),
+        OggPage(0, 0, serial, 1, lacing_for([len(tags)]), tags),
+    ]
+    granule = 0
+    for index, packets in enumerate(packets_per_page):
+        granule += samples_per_packet * len(packets)
+        header_type = EOS if index == len(packets_per_page) - 1 else 0
+        pages.append(OggPage(header_type, granule, serial, index + 2,
+                             lacing_for([len(p) for p in packets]), b"".join(packets)))
+    return b"".join(write_page(page) for page in pages)
@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import requests
+from urllib3.exceptions import ProtocolError
+
+from app.utils import tracing
+from app.utils.config import get_config
+
+# Paces outbound Bot API sends and retries the ones Telegram rejects for load.
+# Off, every send is a single attempt as soon as it is made.
+TELEGRAM_SEND_SCHEDULER = bool(get_config("TELEGRAM_SEND_SCHEDULER", True))
+# Telegram allows about one message per second per chat (short bursts are tolerated)
+# and about 30 per second across all chats
+TELEGRAM_CHAT_RATE = float(get_config("TELEGRAM_CHAT_RATE", 1.0))
+TELEGRAM_CHAT_BURST = int(get_config("TELEGRAM_CHAT_BURST", 3))
+TELEGRAM_GLOBAL_RATE = float(get_config("TELEGRAM_GLOBAL_RATE", 30.0))
+TELEGRAM_GLOBAL_BURST = int(get_config("TELEGRAM_GLOBAL_BURST", 30))
+TELEGRAM_SEND_MAX_ATTEMPTS = int(get_config("TELEGRAM_SEND_MAX_ATTEMPTS", 4))
+# A 429 asking to wait longer than this is not retried (the webhook would time out first)
+TELEGRAM_MAX_RETRY_AFTER = float(get_config("TELEGRAM_MAX_RETRY_AFTER", 30))
+TELEGRAM_RETRY_BASE_DELAY = 0.5
+TELEGRAM_CHAT_BUCKETS = 10000
+# Seconds from the start of an interaction after which a failed send is not retried;
+# retry waits are capped so they never outlast the function's 60 s timeout
+TELEGRAM_SEND_BUDGET = float(get_config("TELEGRAM_SEND_BUDGET", 50))
+
+# Methods that are safe to repeat: a second edit or chat action changes nothing
+IDEMPOTENT_METHODS = ("editMessageText", "sendChatAction", "getFile")
+
+_NETWORK_ERRORS: Tuple[type, ...] = (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)
+
+def _network_errors() -> Tuple[type, ...]:
+    """Transport failures worth retrying; includes httpx's when the asyncio pipeline has loaded it."""
+    global _NETWORK_ERRORS
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and httpx.TransportError not in _NETWORK_ERRORS:
+        _NETWORK_ERRORS = _NETWORK_ERRORS + (httpx.TransportError,)
+    return _NETWORK_ERRORS
+
+def _connect_failure(error: BaseException) -> bool:
+    """
+    True if the request failed while connecting, so Telegram cannot have received it.
+    A read timeout or a dropped connection may come after the message was delivered,
+    and retrying a send then would post it twice.
+    """
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and not isinstance(error, requests.Timeout):
+        # requests also raises ConnectionError for a connection aborted mid-response
+        reason = error.args[0] if error.args else None
+        return not isinstance(reason, ProtocolError)
+    return isinstance(error, ConnectionRefusedError)
+
+# Monotonic deadline of the current interaction's sends (None: no budget)
+_send_deadline: ContextVar[Optional[float]] = ContextVar("telegram_send_deadline", default=None)
+
+@contextmanager
+def send_budget(seconds: float = TELEGRAM_SEND_BUDGET):
+    """Bounds the retry waits of every send made in this context (threads via tracing.submit included)."""
+    token = _send_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _send_deadline.reset(token)
+
+def _budget_left() -> Optional[float]:
+    deadline = _send_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+# -----------------------------
+# 🪣 TOKEN BUCKET
+# -----------------------------
+class TokenBucket:
+    """
+    Rate limiter in reservation form (GCRA): reserve() never refuses, it returns how
+    long the caller must wait for its slot. `burst` sends may go back to back, after
+    which they are spaced 1/rate seconds apart. Thread-safe.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self._interval = 1.0 / rate
+        self._tolerance = self._interval * (max(burst, 1) - 1)
+        self._tat = 0.0  # Theoretical arrival time of the next send
+        self._lock = threading.Lock()
+
+    def reserve(self, at: Optional[float] = None) -> float:
+        """Reserves the earliest slot at or after `at` (default now); returns the wait in seconds."""
+        now = time.monotonic()
+        at = max(at or now, now)
+        with self._lock:
+            start = max(at, self._tat - self._tolerance)
+            self._tat = max(self._tat, at) + self._interval
+        return start - now
+
+    def pause(self, seconds: float):
+        """Holds every later reservation back for `seconds` (e.g. a 429's retry_after)."""
+        with self._lock:
+            self._tat = max(self._tat, time.monotonic() + seconds + self._tolerance)
+
+    def available(self) -> bool:
+        """True if a reservation made now would not have to wait."""
+        with self._lock:
+            return self._tat - self._tolerance <= time.monotonic()
+
+    def idle(self) -> bool:
+        with self._lock:
+            return self._tat <= time.monotonic()
+
+# -----------------------------
+# 📤 SEND SCHEDULER
+# -----------------------------
+class SendScheduler:
+    """
+    Paces Bot API sends through a per-chat and a global token bucket, so bursts are
+    delayed rather than rejected, and retries the sends Telegram rejects for load:
+    a 429 waits for its `retry_after`, a 5xx or a failure to connect backs off
+    exponentially, both with jitter and within the interaction's send_budget. Other
+    network errors are only retried for idempotent methods such as edits. Edits
+    queued for the same message are coalesced: whichever waiter's slot comes first
+    sends the newest text and the others skip. Works for blocking callers (send)
+    and asyncio ones (send_async) sharing the same buckets.
+    """
+    def __init__(self, chat_rate: float = TELEGRAM_CHAT_RATE, chat_burst: int = TELEGRAM_CHAT_BURST,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE, global_burst: int = TELEGRAM_GLOBAL_BURST,
+                 max_attempts: int = TELEGRAM_SEND_MAX_ATTEMPTS, max_retry_after: float = TELEGRAM_MAX_RETRY_AFTER,
+                 enabled: bool = TELEGRAM_SEND_SCHEDULER):
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._max_attempts = max_attempts
+        self._max_retry_after = max_retry_after
+        self._enabled = enabled
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Dict[str, Any]] = {}  # coalesce key -> latest queued call
+        self._waiting = 0
+        self._metrics = {"sent": 0, "failed": 0, "retries": 0, "rate_limited": 0, "coalesced": 0}
+
+    # --- pacing ---
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+                if len(self._chats) > TELEGRAM_CHAT_BUCKETS:
+                    oldest_id, oldest = next(iter(self._chats.items()))
+                    if oldest.idle():
+                        del self._chats[oldest_id]
+            else:
+                self._chats.move_to_end(chat_id)
+            return bucket
+
+    def _reserve(self, chat_id) -> float:
+        chat_wait = self._chat_bucket(chat_id).reserve() if chat_id is not None else 0.0
+        return max(self._global.reserve(time.monotonic() + chat_wait), 0.0)
+
+    def would_wait(self, chat_id) -> bool:
+        """
+        True if a send to `chat_id` made now would be delayed. Streaming replies use it
+        to skip an intermediate edit rather than queue it; the next edit carries the text.
+        """
+        if not self._enabled:
+            return False
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+        return (bucket is not None and not bucket.available()) or not self._global.available()
+
+    def _retry_delay(self, error: BaseException, attempt: int, chat_id, method: str) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None if it should not be retried."""
+        if attempt >= self._max_attempts:
+            return None
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+        if status == 429:
+            try:
+                retry_after = float(((response.json() or {}).get("parameters") or {}).get("retry_after") or 1)
+            except Exception:
+                retry_after = 1.0
+            left = _budget_left()
+            if retry_after > self._max_retry_after or (left is not None and retry_after >= left):
+                return None
+            with self._lock:
+                self._metrics["rate_limited"] += 1
+            # Everything else queued for this chat has to wait as well
+            if chat_id is not None:
+                self._chat_bucket(chat_id).pause(retry_after)
+            return retry_after + random.uniform(0, 0.1 * retry_after + 0.05)
+        if status is not None and status < 500:
+            return None  # A bad request stays bad
+        if status is None:
+            if not isinstance(error, _network_errors()):
+                return None
+            if method not in IDEMPOTENT_METHODS and not _connect_failure(error):
+                return None  # The message may have been delivered
+        # Full jitter: uniform over [0, base * 2^attempt]
+        return random.uniform(0, TELEGRAM_RETRY_BASE_DELAY * 2 ** attempt)
+
+    # --- coalescing ---
+    def _queue_call(self, key, call) -> int:
+        with self._lock:
+            entry = self._pending.setdefault(key, {"version": 0, "sent": 0, "call": None, "result": None, "waiters": 0})
+            entry["version"] += 1
+            entry["call"] = call
+            entry["waiters"] += 1
+            return entry["version"]
+
+    def _take_call(self, key, version) -> Tuple[Optional[Callable], Any, int]:
+        """Returns (call, None, previous) to send the newest queued call, or (None, result, 0) if already sent."""
+        with self._lock:
+            entry = self._pending[key]
+            if entry["sent"] >= version:
+                self._metrics["coalesced"] += 1
+                return None, entry["result"], 0
+            previous, entry["sent"] = entry["sent"], entry["version"]
+            return entry["call"], None, previous
+
+    def _release_call(self, key, taken_from: int):
+        """After a failed attempt: marks the call unsent again, so the next slot sends the newest text."""
+        with self._lock:
+            entry = self._pending[key]
+            entry["sent"] = min(entry["sent"], taken_from)
+
+    def _finish_call(self, key, result=None):
+        with self._lock:
+            entry = self._pending[key]
+            if result is not None:
+                entry["result"] = result
+            entry["waiters"] -= 1
+            if entry["waiters"] == 0:
+                del self._pending[key]
+
+    # --- bookkeeping ---
+    def _enter(self):
+        with self._lock:
+            self._waiting += 1
+
+    def _leave(self, method: str, started: float, waited: float, attempts: int, error: Optional[BaseException]):
+        with self._lock:
+            self._waiting -= 1
+            if attempts:  # Zero when a coalesced edit was carried by another send
+                self._metrics["failed" if error else "sent"] += 1
+            self._metrics["retries"] += max(attempts - 1, 0)
+        tracing.metrics.observe("telegram.send_wait_ms", round(waited * 1000, 1), method=method)
+        tracing.metrics.observe("telegram.send_latency_ms", round((time.monotonic() - started) * 1000, 1), method=method)
+        if error is not None:
+            tracing.metrics.increment("telegram.send_failures", method=method, error=type(error).__name__)
+
+    # --- entry points ---
+    def send(self, chat_id, method: str, call: Callable[[], Any], coalesce_key: Optional[Hashable] = None) -> Any:
+        """
+        Runs `call` (one Bot API request) once its chat and global slots come up,
+        retrying as described above; raises the last error if it never succeeds.
+        """
+        if not self._enabled:
+            return call()
+        version = self._queue_call(coalesce_key, call) if coalesce_key is not None else 0
+        self._enter()
+        started = time.monotonic()
+        waited, attempts, error, result, taken_from = 0.0, 0, None, None, 0
+        try:
+            delay = self._reserve(chat_id)
+            while True:
+                if delay > 0:
+                    time.sleep(delay)
+                    waited += delay
+                if coalesce_key is not None:
+                    call, result, taken_from = self._take_call(coalesce_key, version)
+                    if call is None:
+                        return result
+                attempts += 1
+                try:
+                    result = call()
+                    return result
+                except Exception as e:
+                    delay = self._after_failure(e, method, attempts, chat_id, coalesce_key, taken_from)
+                    if delay is None:
+                        error = e
+                        raise
+        finally:
+            if coalesce_key is not None:
+                self._finish_call(coalesce_key, result)
+            self._leave(method, started, waited, attempts, error)
+
+    async def send_async(self, chat_id, method: str, call: Callable[[], Any],
+                         coalesce_key: Optional[Hashable] = None) -> Any:
+        """send() for coroutine calls: `call` returns an awaitable and waits use asyncio.sleep."""
+        if not self._enabled:
+            return await call()
+        version = self._queue_call(coalesce_key, call) if coalesce_key is not None else 0
+        self._enter()
+        started = time.monotonic()
+        waited, attempts, error, result, taken_from = 0.0, 0, None, None, 0
+        try:
+            delay = self._reserve(chat_id)
+            while True:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    waited += delay
+                if coalesce_key is not None:
+                    call, result, taken_from = self._take_call(coalesce_key, version)
+                    if call is None:
+                        return result
+                attempts += 1
+                try:
+                    result = await call()
+                    return result
+                except Exception as e:
+                    delay = self._after_failure(e, method, attempts, chat_id, coalesce_key, taken_from)
+                    if delay is None:
+                        error = e
+                        raise
+        finally:
+            if coalesce_key is not None:
+                self._finish_call(coalesce_key, result)
+            self._leave(method, started, waited, attempts, error)
+
+    def _after_failure(self, error, method, attempts, chat_id, coalesce_key, taken_from) -> Optional[float]:
+        """Seconds until the next attempt (retry delay and a fresh slot), or None to give up."""
+        retry = self._retry_delay(error, attempts, chat_id, method)
+        if coalesce_key is not None:
+            self._release_call(coalesce_key, taken_from)
+        if retry is None:
+            return None
+        delay = max(retry, self._reserve(chat_id))
+        left = _budget_left()
+        if left is not None and delay >= left:
+            logging.warning(f"[telegram] {method} failed ({error}); no time left in the request to retry")
+            return None
+        logging.warning(f"[telegram] {method} failed ({error}); retry {attempts} in {delay:.2f}s")
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._metrics, "waiting": self._waiting, "chats": len(self._chats), "enabled": self._enabled}
+
+send_scheduler = SendScheduler()
+tracing.metrics.register_provider("telegram_sends", send_scheduler.stats)
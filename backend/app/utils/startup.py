@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from app.utils import tracing
+from app.utils.config import get_config
+
+# "lazy" builds every client and fetches every secret on first use; "prefetch" also
+# loads STARTUP_SECRETS in one parallel batch while the instance starts; "warm"
+# additionally imports the heavy SDKs and builds their clients on a background thread
+STARTUP_MODE = get_config("STARTUP_MODE", "lazy")
+STARTUP_SECRETS: List[str] = get_config("STARTUP_SECRETS", [
+    "TELEGRAM_BOT_TOKEN", "WEBHOOK_SECRET", "OPENAI_API_KEY", "GOOGLE_APPLICATION_CREDENTIALS",
+])
+
+_started = False
+_lock = threading.Lock()
+warm_up_done = threading.Event()
+
+def _warm_up_steps() -> List[Tuple[str, Callable[[], object]]]:
+    from app.utils.env import is_local
+    from cal import clients
+    from cal.firestore import get_firestore_client
+    steps = [
+        ("http", clients.get_http_session),
+        ("openai", clients.get_openai_client),
+        ("firestore", get_firestore_client),
+        ("tts", clients.get_tts_client),
+    ]
+    if not is_local():
+        steps.append(("storage", clients.get_storage_client))
+    return steps
+
+def warm_up():
+    """Imports the SDKs and builds their clients so the first request finds them ready. Never raises."""
+    try:
+        for name, build in _warm_up_steps():
+            try:
+                with tracing.span(f"startup.warm.{name}"):
+                    build()
+            except Exception as e:
+                logging.warning(f"[startup] Warm-up of {name} failed; it will be built on first use: {e}")
+    finally:
+        warm_up_done.set()
+
+def start(import_started: Optional[float] = None, mode: Optional[str] = None):
+    """
+    Runs the configured startup work once per process. `import_started` is a
+    perf_counter() taken before the entry point's imports, to log their cost.
+    """
+    global _started
+    mode = mode or STARTUP_MODE
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    parts = [f"mode={mode}"]
+    if import_started is not None:
+        import_ms = round((time.perf_counter() - import_started) * 1000, 1)
+        tracing.metrics.observe("startup.import_ms", import_ms)
+        parts.append(f"imports={import_ms}ms")
+
+    if mode in ("prefetch", "warm"):
+        from cal.secrets import prefetch_secrets
+        t0 = time.perf_counter()
+        with tracing.span("startup.prefetch_secrets"):
+            fetched = prefetch_secrets(STARTUP_SECRETS)
+        parts.append(f"secrets={round((time.perf_counter() - t0) * 1000, 1)}ms ({sum(fetched.values())}/{len(fetched)} fetched)")
+
+    if mode == "warm":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    else:
+        warm_up_done.set()
+    logging.info(f"[startup] {' '.join(parts)}")
@@ -0,0 +1,323 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.utils.config import get_config
+
+TRACING_ENABLED = bool(get_config("TRACING_ENABLED", True))
+# Seconds between "[metrics]" log lines with the full snapshot; 0 disables the logger
+METRICS_LOG_INTERVAL = float(get_config("METRICS_LOG_INTERVAL", 0))
+
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000)
+SIZE_BUCKETS_BYTES = tuple(256 * 4 ** i for i in range(9))  # 256 B .. 16 MB
+# Span attributes summed into usage counters: the units the providers bill by
+BILLED_SUFFIXES = ("_tokens", "_seconds", "_chars")
+
+# -----------------------------
+# 📊 HISTOGRAMS AND COUNTERS
+# -----------------------------
+class Histogram:
+    """
+    Fixed-bucket histogram: constant memory however many values are observed.
+    Percentiles are interpolated within the bucket that holds them.
+    """
+    def __init__(self, bounds: Tuple[float, ...] = DURATION_BUCKETS_MS):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = self.count * q / 100
+        seen = 0
+        for index, bucket_count in enumerate(self._counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self._bounds[index - 1] if index > 0 else self.min
+                upper = self._bounds[index] if index < len(self._bounds) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return round(lower + (upper - lower) * (rank - seen) / bucket_count, 1)
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 1) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f"{key}={value}" for key, value in sorted(labels.items()) if value is not None)
+    return f"{name}{{{rendered}}}"
+
+class MetricsRegistry:
+    """
+    Process-wide histograms and counters, keyed by name plus labels, e.g.
+    span.duration_ms{span=openai.chat}. Stats providers (caches, dedup, clients)
+    are polled when a snapshot is taken.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Counter = Counter()
+        self._providers: Dict[str, Callable[[], Any]] = {}
+
+    def observe(self, name: str, value: float, bounds: Tuple[float, ...] = DURATION_BUCKETS_MS, **labels):
+        key = _metric_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(bounds)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        with self._lock:
+            self._counters[_metric_key(name, labels)] += amount
+
+    def register_provider(self, name: str, provider: Callable[[], Any]):
+        """Adds a stats() callable whose result is included in every snapshot."""
+        with self._lock:
+            self._providers[name] = provider
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = {key: histogram.snapshot() for key, histogram in sorted(self._histograms.items())}
+            counters = dict(sorted(self._counters.items()))
+            providers = dict(self._providers)
+        stats = {}
+        for name, provider in providers.items():
+            try:
+                stats[name] = provider()
+            except Exception as e:
+                stats[name] = {"error": str(e)}
+        return {"histograms": histograms, "counters": counters, "stats": stats}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+metrics = MetricsRegistry()
+
+# -----------------------------
+# 🧵 SPANS AND TRACES
+# -----------------------------
+class Span:
+    """
+    One timed operation. Numeric attributes ending in _bytes feed size histograms,
+    those ending in a BILLED_SUFFIXES entry feed usage counters, and `attempts`
+    (counted by the HTTP hook) feeds the retry counter.
+    """
+    __slots__ = ("name", "attributes", "duration_ms", "error", "_t0", "_trace")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], trace: Optional["Trace"] = None):
+        self.name = name
+        self.attributes = attributes
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._t0 = time.perf_counter()
+        self._trace = trace
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        entry = {"name": self.name, "ms": self.duration_ms, **self.attributes}
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+class _NullSpan(Span):
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+_NULL_SPAN = _NullSpan("null", {})
+
+class Trace:
+    """The finished spans of one interaction, collected across threads."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> Dict[str, float]:
+        """Total milliseconds per span name (a name can occur several times, e.g. TTS chunks)."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span.name] = round(totals.get(span.name, 0.0) + (span.duration_ms or 0.0), 1)
+        return totals
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+def _record(span: Span):
+    metrics.observe("span.duration_ms", span.duration_ms, span=span.name)
+    if span.error:
+        metrics.increment("span.errors", span=span.name, error=span.error)
+    for key, value in span.attributes.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            continue
+        if key.endswith("_bytes"):
+            metrics.observe(f"span.{key}", value, bounds=SIZE_BUCKETS_BYTES, span=span.name)
+        elif key.endswith(BILLED_SUFFIXES):
+            metrics.increment(f"usage.{key}", value, model=span.attributes.get("model") or span.name)
+    attempts = span.attributes.get("attempts", 0)
+    if attempts > 1:
+        span.attributes["retries"] = attempts - 1
+        metrics.increment("span.retries", attempts - 1, span=span.name)
+
+def start_span(name: str, **attributes) -> Span:
+    """
+    Starts a span without making it the current one; finish it with end_span(). For
+    work that outlives a single block, e.g. a streamed response consumed by the caller.
+    """
+    if not TRACING_ENABLED:
+        return _NULL_SPAN
+    return Span(name, attributes, trace=_current_trace.get())
+
+def end_span(span: Span, error: Optional[BaseException] = None):
+    if span is _NULL_SPAN or span.duration_ms is not None:
+        return
+    span.duration_ms = round((time.perf_counter() - span._t0) * 1000, 1)
+    if error is not None:
+        span.error = type(error).__name__
+    _record(span)
+    if span._trace is not None:
+        span._trace.add(span)
+
+@contextmanager
+def activate(span: Span) -> Iterator[Span]:
+    """Makes a started span the current one for the block (so attributes and HTTP attempts land on it)."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Times the block as a span of the current trace and records it in the metrics."""
+    current = start_span(name, **attributes)
+    error = None
+    try:
+        with activate(current):
+            yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        end_span(current, error)
+
+def traced(name: str) -> Callable:
+    """Decorator form of span()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def trace(name: str = "interaction", **attributes) -> Iterator[Trace]:
+    """Starts a new trace for one interaction; spans opened inside it (in any thread started via submit()) join it."""
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        with span(name, **attributes):
+            yield current
+    finally:
+        _current_trace.reset(token)
+
+def current_span() -> Span:
+    return _current_span.get() or _NULL_SPAN
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def set_attribute(key: str, value: Any):
+    """Sets an attribute on the innermost open span (no-op outside a span)."""
+    current_span().set(key, value)
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that carries the current trace and span into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def record_openai_usage(response):
+    """Copies token usage from an OpenAI response (or final stream chunk) onto the current span."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    current = current_span()
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, key, None)
+        if value is not None:
+            current.set(key, value)
+
+def count_attempt(request):
+    """httpx request hook: counts HTTP attempts (first try plus SDK retries) on the current span."""
+    current_span().add("attempts")
+
+async def count_attempt_async(request):
+    """count_attempt for httpx.AsyncClient, whose event hooks must be coroutines."""
+    count_attempt(request)
+
+# -----------------------------
+# 📣 EXPOSURE
+# -----------------------------
+def metrics_json() -> str:
+    return json.dumps(metrics.snapshot(), default=str, ensure_ascii=False)
+
+_logger_thread: Optional[threading.Thread] = None
+_logger_lock = threading.Lock()
+
+def start_metrics_logger(interval: float = METRICS_LOG_INTERVAL):
+    """Logs the metrics snapshot as one structured line every `interval` seconds (idempotent)."""
+    global _logger_thread
+    if interval <= 0:
+        return
+    with _logger_lock:
+        if _logger_thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                logging.info(f"[metrics] {metrics_json()}")
+
+        _logger_thread = threading.Thread(target=run, name="metrics-logger", daemon=True)
+        _logger_thread.start()
@@ -0,0 +1,43 @@
+import hmac
+import logging
+from typing import Optional
+
+from app.utils import startup, tracing, work_queue
+from app.utils.config import get_config
+from cal.firestore import start_log_buffer
+from cal.secrets import get_secret, refresh_soon
+
+# Telegram sends the secret token in this header
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# "inline" processes the update before responding; "queue" acknowledges at once and
+# hands the update to background workers
+WEBHOOK_MODE = get_config("WEBHOOK_MODE", "inline")
+_queue_refusal = work_queue.queue_mode_refusal() if WEBHOOK_MODE == "queue" else None
+if _queue_refusal:
+    logging.error(f'[startup] WEBHOOK_MODE "queue" refused ({_queue_refusal}); processing updates inline')
+    WEBHOOK_MODE = "inline"
+
+def start_instance(import_started: float, on_sigterm: bool = True):
+    """
+    Instance startup shared by the entry points: the STARTUP_MODE work, the metrics
+    logger and, in "buffered" log mode, the log buffer. Call it once at import time.
+    """
+    startup.start(import_started=import_started)
+    # Every METRICS_LOG_INTERVAL seconds (if set) the metrics snapshot is logged as one "[metrics]" line
+    tracing.start_metrics_logger()
+    start_log_buffer(on_sigterm=on_sigterm)
+
+def has_webhook_secret(received_secret: Optional[str]) -> bool:
+    """
+    Checks the secret token Telegram sent against WEBHOOK_SECRET. Both secrets are
+    served from the in-memory cache (prefetched at startup, refreshed in the
+    background), so this never waits on Secret Manager once the instance is up.
+    """
+    received_secret = received_secret or ""
+    expected_secret = get_secret("WEBHOOK_SECRET") or ""
+    if expected_secret and hmac.compare_digest(received_secret.encode("utf-8"), expected_secret.encode("utf-8")):
+        return True
+    # The secret may have been rotated since it was cached; pick up the new one soon
+    refresh_soon("WEBHOOK_SECRET")
+    return False
@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils import tracing
+from app.utils.config import get_config
+
+# "memory" keeps updates in-process; "file" spools them to QUEUE_DIR so they survive a restart.
+# QUEUE_DIR must be on persistent storage (not /tmp, which is in memory on Cloud Functions)
+QUEUE_BACKEND = get_config("QUEUE_BACKEND", "memory")
+QUEUE_DIR = get_config("QUEUE_DIR", "")
+QUEUE_WORKERS = int(get_config("QUEUE_WORKERS", 4))
+QUEUE_MAX_ATTEMPTS = int(get_config("QUEUE_MAX_ATTEMPTS", 3))
+# A failed update is retried after QUEUE_RETRY_BASE_DELAY * 2^(attempt - 1) seconds (with jitter)
+QUEUE_RETRY_BASE_DELAY = float(get_config("QUEUE_RETRY_BASE_DELAY", 2.0))
+# File backend: a claimed update not acked within this many seconds is assumed lost
+# with its worker and handed out again (keep it well above the longest interaction)
+QUEUE_LEASE_SECONDS = float(get_config("QUEUE_LEASE_SECONDS", 300))
+# Set only where the instance keeps its CPU after responding (e.g. Cloud Run with CPU
+# always allocated). Cloud Functions does not, so its workers would stall.
+CPU_ALWAYS_ALLOCATED = bool(get_config("CPU_ALWAYS_ALLOCATED", False))
+
+def queue_mode_refusal() -> Optional[str]:
+    """Why WEBHOOK_MODE "queue" is unsafe with this configuration, or None if it is safe."""
+    if not CPU_ALWAYS_ALLOCATED:
+        return "CPU_ALWAYS_ALLOCATED is off"
+    if QUEUE_BACKEND != "file" or not QUEUE_DIR:
+        return 'it needs QUEUE_BACKEND "file" with QUEUE_DIR on persistent storage'
+    return None
+
+def retry_delay(attempts: int) -> float:
+    """Backoff before retry number `attempts` (1 for the first retry), with up to 50% jitter."""
+    delay = QUEUE_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    return delay * random.uniform(0.5, 1.0)
+
+# -----------------------------
+# 📥 QUEUE BACKENDS
+# -----------------------------
+# Both backends share the same small interface so a test can swap in its own:
+#   put(update), get(timeout) -> item | None, ack(item), nack(item), depth()
+# An item is a dict envelope: {"id": ..., "update": ..., "attempts": ...}
+# nack() makes the item available again only after retry_delay(attempts).
+
+class InProcessQueue:
+    """Thread-safe in-memory queue. Fast, but updates are lost if the instance dies."""
+    def __init__(self):
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._delayed = 0
+        self._lock = threading.Lock()
+
+    def put(self, update: Dict[str, Any]):
+        self._queue.put({"id": uuid.uuid4().hex, "update": update, "attempts": 0})
+
+    def get(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def ack(self, item: Dict[str, Any]):
+        self._queue.task_done()
+
+    def nack(self, item: Dict[str, Any]):
+        item["attempts"] += 1
+        self._queue.task_done()
+        with self._lock:
+            self._delayed += 1
+        timer = threading.Timer(retry_delay(item["attempts"]), self._requeue, (item,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, item: Dict[str, Any]):
+        self._queue.put(item)
+        with self._lock:
+            self._delayed -= 1
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._queue.qsize() + self._delayed
+
+
+class FileQueue:
+    """
+    Durable queue backed by a spool directory: one JSON file per update.
+    Items are claimed with an atomic rename from pending/ to inflight/, so several
+    workers (or processes) can drain the same directory. A claim is a lease: an
+    inflight/ file older than `lease_seconds` (its worker died or hung) is moved
+    back to pending/, so items other live workers hold are left alone.
+    """
+    def __init__(self, directory: str, lease_seconds: float = QUEUE_LEASE_SECONDS):
+        self._pending = Path(directory) / "pending"
+        self._inflight = Path(directory) / "inflight"
+        self._pending.mkdir(parents=True, exist_ok=True)
+        self._inflight.mkdir(parents=True, exist_ok=True)
+        self._not_empty = threading.Condition()
+        self._lease_seconds = lease_seconds
+        self._next_recovery = 0.0
+        self._recover_expired()
+
+    def _recover_expired(self):
+        """Returns items whose lease ran out to pending/; runs at most every quarter lease."""
+        now = time.monotonic()
+        if now < self._next_recovery:
+            return
+        self._next_recovery = now + self._lease_seconds / 4
+        expired_before = time.time() - self._lease_seconds
+        for path in self._inflight.iterdir():
+            try:
+                if path.stat().st_mtime < expired_before:
+                    os.replace(path, self._pending / path.name)
+                    logging.warning(f"[work_queue] Lease expired on {path.name}, requeued")
+            except FileNotFoundError:
+                pass  # Acked (or recovered by another process) meanwhile
+
+    def _write(self, item: Dict[str, Any], due_ns: Optional[int] = None):
+        # Name sorts by due time (enqueue time, or when a retry's backoff ends), so the
+        # oldest ready update is drained first and later ones are not handed out early
+        due_ns = due_ns if due_ns is not None else item["enqueued_at"]
+        name = f"{due_ns:020d}_{item['id']}_{item['attempts']}.json"
+        tmp_path = self._pending / f".{name}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(item, f)
+        os.replace(tmp_path, self._pending / name)
+        with self._not_empty:
+            self._not_empty.notify()
+
+    def put(self, update: Dict[str, Any]):
+        self._write({"id": uuid.uuid4().hex, "update": update, "attempts": 0, "enqueued_at": time.time_ns()})
+
+    def _pending_files(self) -> List[Path]:
+        return sorted(p for p in self._pending.iterdir() if not p.name.startswith("."))
+
+    def get(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            self._recover_expired()
+            now_ns = time.time_ns()
+            for path in self._pending_files():
+                if int(path.name.split("_", 1)[0]) > now_ns:
+                    break  # Still backing off, as is everything after it
+                claimed = self._inflight / path.name
+                try:
+                    os.replace(path, claimed)
+                except FileNotFoundError:
+                    continue  # Another worker claimed it first
+                os.utime(claimed)  # The rename keeps the old mtime; the lease starts now
+                with open(claimed) as f:
+                    item = json.load(f)
+                item["_path"] = str(claimed)
+                return item
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._not_empty:
+                self._not_empty.wait(min(remaining, 0.5))
+
+    def ack(self, item: Dict[str, Any]):
+        try:
+            os.remove(item["_path"])
+        except FileNotFoundError:
+            pass
+
+    def nack(self, item: Dict[str, Any]):
+        path = item.pop("_path")
+        item["attempts"] += 1
+        self._write(item, due_ns=time.time_ns() + int(retry_delay(item["attempts"]) * 1e9))
+        os.remove(path)
+
+    def depth(self) -> int:
+        return len(self._pending_files())
+
+# -----------------------------
+# 👷 WORKER POOL
+# -----------------------------
+class WorkerPool:
+    """
+    Drains a queue with a fixed number of daemon worker threads. A handler that
+    raises is retried (up to max_attempts, with backoff), so it must only raise
+    when retrying is safe: telegram.handle_update raises only before any part of
+    the reply was sent, and its dedup claim stops a redelivered update that did
+    reply from replying again.
+    """
+    def __init__(self, work_queue, handler: Callable[[Dict[str, Any]], None], num_workers: int = QUEUE_WORKERS,
+                 max_attempts: int = QUEUE_MAX_ATTEMPTS):
+        self._queue = work_queue
+        self._handler = handler
+        self._num_workers = num_workers
+        self._max_attempts = max_attempts
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for i in range(self._num_workers):
+            thread = threading.Thread(target=self._run, name=f"update-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"[work_queue] Started {self._num_workers} workers")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self._queue.get(timeout=1.0)
+            if item is None:
+                continue
+            try:
+                self._handler(item["update"])
+                self._queue.ack(item)
+            except Exception as e:
+                tracing.metrics.increment("work_queue.failures")
+                if item["attempts"] + 1 >= self._max_attempts:
+                    logging.error(f"[work_queue] Dropping update {item['id']} after {item['attempts'] + 1} attempts: {e}")
+                    self._queue.ack(item)
+                    tracing.metrics.increment("work_queue.dropped")
+                else:
+                    logging.warning(f"[work_queue] Update {item['id']} failed, requeueing: {e}")
+                    self._queue.nack(item)
+
+# -----------------------------
+# 🔧 PROCESS-WIDE QUEUE
+# -----------------------------
+_work_queue = None
+_worker_pool: Optional[WorkerPool] = None
+_lock = threading.Lock()
+
+def get_work_queue():
+    """Returns the process-wide queue, creating it from QUEUE_BACKEND on first use."""
+    global _work_queue
+    with _lock:
+        if _work_queue is None:
+            if QUEUE_BACKEND == "file" and not QUEUE_DIR:
+                raise ValueError('QUEUE_BACKEND "file" needs QUEUE_DIR')
+            _work_queue = FileQueue(QUEUE_DIR) if QUEUE_BACKEND == "file" else InProcessQueue()
+        return _work_queue
+
+def set_work_queue(work_queue):
+    """Replaces the process-wide queue (e.g. with a test double). Call before start_workers."""
+    global _work_queue
+    with _lock:
+        _work_queue = work_queue
+
+def start_workers(handler: Callable[[Dict[str, Any]], None], num_workers: Optional[int] = None) -> WorkerPool:
+    """Starts the worker pool once per process; later calls return the running pool."""
+    global _worker_pool
+    work_queue = get_work_queue()
+    with _lock:
+        if _worker_pool is None:
+            _worker_pool = WorkerPool(work_queue, handler, num_workers=num_workers or QUEUE_WORKERS)
+            _worker_pool.start()
+            tracing.metrics.register_provider("work_queue_depth", work_queue.depth)
+        return _worker_pool
+
+def enqueue(update: Dict[str, Any]):
+    get_work_queue().put(update)
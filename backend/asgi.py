@@ -0,0 +1,138 @@
+"""
+ASGI entry point: the webhook on the asyncio pipeline (app.channels.telegram_async),
+for a container such as Cloud Run. main.py remains the Cloud Functions entry point.
+
+    pip install -r requirements.asgi.txt
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+Routes: POST / (Telegram webhook) and GET /metrics, both behind the webhook secret.
+"""
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from app.channels.telegram_async import handle_update_async, run_blocking
+from app.utils import tracing, webhook
+from app.utils.config import get_config
+from cal.clients import close_async_clients
+from cal.firestore import flush_log_buffer
+from cal.secrets import get_secret, secret_cache
+
+logging.basicConfig(level=logging.INFO)
+# The server handles SIGTERM itself; the log buffer is flushed on lifespan shutdown
+webhook.start_instance(_IMPORT_STARTED, on_sigterm=False)
+
+# Interactions processed at once by this instance; further updates wait for a slot
+ASYNC_MAX_CONCURRENCY = int(get_config("ASYNC_MAX_CONCURRENCY", 32))
+
+_slots = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+_state = {"in_flight": 0, "waiting": 0, "peak_in_flight": 0}
+# Queue-mode tasks, referenced until they finish so they are not garbage collected
+_tasks: set = set()
+
+def get_stats() -> Dict[str, int]:
+    return {**_state, "max_concurrency": ASYNC_MAX_CONCURRENCY}
+
+tracing.metrics.register_provider("asgi", get_stats)
+
+async def _secret(key: str) -> Any:
+    """Cached secrets are read inline; a first fetch (Secret Manager) runs on the worker pool."""
+    if secret_cache.cached(key):
+        return get_secret(key)
+    return await run_blocking(get_secret, key)
+
+async def _process(token: str, update: Dict[str, Any]):
+    _state["waiting"] += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _state["waiting"] -= 1
+    _state["in_flight"] += 1
+    _state["peak_in_flight"] = max(_state["peak_in_flight"], _state["in_flight"])
+    try:
+        await handle_update_async(token, update)
+    finally:
+        _state["in_flight"] -= 1
+        _slots.release()
+        await run_blocking(flush_log_buffer)
+
+def _log_task_failure(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"[asgi] Queued update failed: {task.exception()!r}")
+
+async def _has_webhook_secret(received_secret: Optional[str]) -> bool:
+    await _secret("WEBHOOK_SECRET")
+    return webhook.has_webhook_secret(received_secret)
+
+async def telegram_webhook(received_secret: Optional[str], body: bytes):
+    if not await _has_webhook_secret(received_secret):
+        logging.warning("[SECURITY] Unauthorized webhook call blocked.")
+        return 403, "Unauthorized"
+    token = await _secret("TELEGRAM_BOT_TOKEN")
+
+    update = json.loads(body or b"{}")
+    if webhook.WEBHOOK_MODE == "queue":
+        # Acknowledge at once; the interaction continues as a task on this loop
+        task = asyncio.ensure_future(_process(token, update))
+        _tasks.add(task)
+        task.add_done_callback(_log_task_failure)
+        return 200, json.dumps({"ok": True})
+
+    await _process(token, update)
+    return 200, json.dumps({"ok": True})
+
+async def metrics(received_secret: Optional[str]):
+    if not await _has_webhook_secret(received_secret):
+        return 403, "Unauthorized"
+    return 200, tracing.metrics_json()
+
+# -----------------------------
+# 🌐 ASGI PLUMBING
+# -----------------------------
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def _respond(send, status: int, body: str):
+    content_type = b"application/json" if status == 200 else b"text/plain; charset=utf-8"
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+    await send({"type": "http.response.body", "body": body.encode("utf-8")})
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _tasks:
+                await asyncio.gather(*_tasks, return_exceptions=True)
+            await close_async_clients()
+            await run_blocking(flush_log_buffer)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    headers = dict(scope.get("headers", []))
+    received_secret = headers.get(webhook.SECRET_HEADER.lower().encode("latin-1"), b"").decode("latin-1")
+    route = (scope["method"], scope["path"])
+    if route == ("POST", "/"):
+        status, body = await telegram_webhook(received_secret, await _read_body(receive))
+    elif route == ("GET", "/metrics"):
+        status, body = await metrics(received_secret)
+    else:
+        status, body = 404, "Not Found"
+    await _respond(send, status, body)
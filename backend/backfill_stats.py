@@ -0,0 +1,332 @@
+"""
+Recomputes public_stats from the logs collection, one parallel partition per week.
+Only whole weeks before --until are rewritten; progress is checkpointed so an
+interrupted run resumes. Run from backend/ (ENV=local uses the local mock):
+
+    python backfill_stats.py --dry-run
+    ENV=local python backfill_stats.py --until 20260105 --workers 2
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from cal.firestore import (
+    DASHBOARD_READ_MODEL,
+    _build_language_distribution,
+    _dashboard_counters,
+    get_firestore_client,
+    get_week_start_date_str,
+    rebuild_dashboard,
+    transactional,
+)
+
+DOCUMENT_ID = "__name__"  # FieldPath.document_id()
+LOG_FIELDS = ["user_id", "lang", "modal"]
+MAX_BATCH_WRITES = 500  # Firestore's limit per batch commit
+CHECKPOINT_INTERVAL = 5.0  # seconds between checkpoint saves while weeks are being tallied
+
+# -----------------------------
+# 🧮 WEEK TALLIES
+# -----------------------------
+class WeekTally:
+    """Counters for one week of logs, plus the cursor (last log ID) they cover."""
+    def __init__(self, week: str, state: Optional[Dict[str, Any]] = None):
+        state = state or {}
+        self.week = week
+        self.cursor: Optional[str] = state.get("cursor")
+        self.done: bool = state.get("done", False)
+        self.interactions: int = state.get("interactions", 0)
+        self.voice: int = state.get("voice", 0)
+        self.lang_counts: Dict[str, Dict[str, int]] = state.get("lang_counts", {})
+        self.users: Set[str] = set(state.get("users", []))
+
+    def add(self, doc_id: str, data: Dict[str, Any]):
+        # Same counting as record_interaction_stats
+        voice = 1 if data.get("modal") == "audio" else 0
+        lang = data.get("lang") or "unknown"
+        self.interactions += 1
+        self.voice += voice
+        counts = self.lang_counts.setdefault(lang, {"interactions": 0, "voice": 0})
+        counts["interactions"] += 1
+        counts["voice"] += voice
+        self.users.add(str(data.get("user_id") or doc_id.partition("_")[2]))
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "cursor": self.cursor, "done": self.done, "interactions": self.interactions, "voice": self.voice,
+            "lang_counts": self.lang_counts, "users": sorted(self.users),
+        }
+
+# -----------------------------
+# 💾 CHECKPOINT
+# -----------------------------
+class Checkpoint:
+    """
+    Every week's tally and cursor, saved atomically (via a temp file) to a JSON file
+    at most every CHECKPOINT_INTERVAL seconds and whenever a week finishes.
+    """
+    def __init__(self, path: str, until: str, restart: bool = False):
+        self.path = path
+        self.until = until
+        self.weeks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        if restart or not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("until") != until:
+            raise SystemExit(f"{path} is for --until {saved.get('until')}; pass that, or --restart to start over")
+        self.weeks = saved.get("weeks", {})
+
+    def tally(self, week: str) -> WeekTally:
+        with self._lock:
+            return WeekTally(week, self.weeks.get(week))
+
+    def update(self, tally: WeekTally, force: bool = False):
+        with self._lock:
+            self.weeks[tally.week] = tally.state()
+            if force or time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL:
+                self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"until": self.until, "weeks": self.weeks}, f)
+        os.replace(tmp_path, self.path)
+        self._saved_at = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# -----------------------------
+# 📥 STREAMING THE LOGS
+# -----------------------------
+def _next_week(week: str) -> str:
+    return (datetime.strptime(week, "%Y%m%d") + timedelta(days=7)).strftime("%Y%m%d")
+
+def find_weeks(db, until: str) -> List[str]:
+    """Week start dates (YYYYMMDD) from the oldest log up to, not including, `until`."""
+    first = list(db.collection("logs").order_by(DOCUMENT_ID).limit(1).select([]).stream())
+    if not first or not first[0].id[:8].isdigit():
+        return []
+    weeks = []
+    week = get_week_start_date_str(datetime.strptime(first[0].id[:8], "%Y%m%d"))
+    while week < until:
+        weeks.append(week)
+        week = _next_week(week)
+    return weeks
+
+def tally_week(db, checkpoint: Checkpoint, week: str, page_size: int) -> WeekTally:
+    """Streams one week of logs page by page, from the checkpointed cursor if there is one."""
+    tally = checkpoint.tally(week)
+    if tally.done:
+        return tally
+    logs = db.collection("logs")
+    # Log IDs start with the interaction time, so a week is a range of document IDs
+    query = logs.where(DOCUMENT_ID, "<", logs.document(_next_week(week)))
+    if tally.cursor:
+        query = query.where(DOCUMENT_ID, ">", logs.document(tally.cursor))
+    else:
+        query = query.where(DOCUMENT_ID, ">=", logs.document(week))
+    query = query.order_by(DOCUMENT_ID).select(LOG_FIELDS).limit(page_size)
+
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        for snapshot in page:
+            tally.add(snapshot.id, snapshot.to_dict() or {})
+        if page:
+            last = page[-1]
+            tally.cursor = last.id
+            checkpoint.update(tally)
+        if len(page) < page_size:
+            break
+    tally.done = True
+    checkpoint.update(tally, force=True)
+    logging.info(f"[backfill] week_{week}: {tally.interactions} interactions from {len(tally.users)} users")
+    return tally
+
+# -----------------------------
+# 📤 WRITING THE STATS
+# -----------------------------
+def _stats_document(counters: Dict[str, Any], week: Optional[str] = None) -> Dict[str, Any]:
+    """A complete public_stats document for the counters; lang_counts already holds every count."""
+    from google.cloud.firestore import SERVER_TIMESTAMP
+    document = {
+        "interactions": counters["interactions"],
+        "voice": counters["voice"],
+        "active_users": counters["active_users"],
+        "lang_counts": counters["lang_counts"],
+        "language_distribution": _build_language_distribution([], counters["lang_counts"]),
+        # An empty base keeps the periodic roll-up from counting the distribution twice
+        "language_distribution_base": [],
+        "backfilled_at": SERVER_TIMESTAMP,
+    }
+    if week is not None:
+        document["week_start_date"] = week
+    return document
+
+def _add_counters(total: Dict[str, Any], counters: Dict[str, Any]):
+    total["interactions"] += counters["interactions"]
+    total["voice"] += counters["voice"]
+    total["active_users"] += counters["active_users"]
+    for lang, counts in counters["lang_counts"].items():
+        entry = total["lang_counts"].setdefault(lang, {"interactions": 0, "voice": 0})
+        entry["interactions"] += counts["interactions"]
+        entry["voice"] += counts["voice"]
+
+def first_weeks(tallies: List[WeekTally]) -> Dict[str, str]:
+    """The week of each user's first logged interaction."""
+    first: Dict[str, str] = {}
+    for tally in sorted(tallies, key=lambda t: t.week, reverse=True):
+        first.update(dict.fromkeys(tally.users, tally.week))
+    return first
+
+def live_users(db, until: str, page_size: int) -> Set[str]:
+    """Distinct users with a log from `until` on (IDs only; the user is the part after "_")."""
+    logs = db.collection("logs")
+    query = logs.where(DOCUMENT_ID, ">=", logs.document(until)).order_by(DOCUMENT_ID).select([]).limit(page_size)
+    users: Set[str] = set()
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        users.update(snapshot.id.partition("_")[2] for snapshot in page)
+        if len(page) < page_size:
+            return users
+        last = page[-1]
+
+def week_counters(tallies: List[WeekTally]) -> Dict[str, Dict[str, Any]]:
+    """Per-week counters in week order; a user counts towards active_users in their first week only."""
+    seen: Set[str] = set()
+    counters = {}
+    for tally in sorted(tallies, key=lambda t: t.week):
+        if not tally.interactions:
+            continue
+        counters[tally.week] = {
+            "interactions": tally.interactions, "voice": tally.voice,
+            "active_users": len(tally.users - seen), "lang_counts": tally.lang_counts,
+        }
+        seen |= tally.users
+    return counters
+
+def write_weeks(db, counters: Dict[str, Dict[str, Any]], batch_size: int) -> int:
+    """Replaces the week documents in batch commits of up to batch_size writes."""
+    stats = db.collection("public_stats")
+    weeks = sorted(counters)
+    for start in range(0, len(weeks), batch_size):
+        batch = db.batch()
+        for week in weeks[start:start + batch_size]:
+            batch.set(stats.document(f"week_{week}"), _stats_document(counters[week], week))
+        batch.commit()
+    return len(weeks)
+
+def write_users(db, first: Dict[str, str], batch_size: int) -> int:
+    """Records each user's first week in the users collection, in batch commits."""
+    users = db.collection("users")
+    ids = sorted(first)
+    for start in range(0, len(ids), batch_size):
+        batch = db.batch()
+        for user_id in ids[start:start + batch_size]:
+            batch.set(users.document(user_id), {"first_seen_week": first[user_id]})
+        batch.commit()
+    return len(ids)
+
+def write_overall(db, counters: Dict[str, Dict[str, Any]], until: str, active_users: int) -> Dict[str, Any]:
+    """
+    Rewrites overall_summary as the recomputed weeks plus the live week documents
+    (from `until` on), in a transaction so Increments recorded meanwhile are not lost.
+    active_users is the distinct count across all logs: the live week documents only
+    count users the live path saw as new, which misses users from before it did.
+    """
+    stats = db.collection("public_stats")
+
+    def write(transaction):
+        total = {"interactions": 0, "voice": 0, "active_users": 0, "lang_counts": {}}
+        for week in counters.values():
+            _add_counters(total, week)
+        for snapshot in stats.stream(transaction=transaction):
+            if snapshot.id.startswith("week_") and snapshot.id[len("week_"):] >= until:
+                _add_counters(total, _dashboard_counters(snapshot.to_dict() or {}))
+        total["active_users"] = active_users
+        transaction.set(stats.document("overall_summary"), _stats_document(total))
+        return total
+
+    return transactional(write)(db.transaction())
+
+# -----------------------------
+# 🚀 COMMAND
+# -----------------------------
+def backfill(until: str, workers: int = 4, page_size: int = 500, batch_size: int = 400,
+             checkpoint_path: str = "backfill_stats.checkpoint.json", restart: bool = False,
+             dry_run: bool = False, rebuild: bool = DASHBOARD_READ_MODEL) -> Dict[str, Any]:
+    db = get_firestore_client()
+    checkpoint = Checkpoint(checkpoint_path, until, restart=restart)
+    weeks = find_weeks(db, until)
+    logging.info(f"[backfill] Tallying {len(weeks)} weeks before {until} with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as executor:
+        tallies = list(executor.map(lambda week: tally_week(db, checkpoint, week, page_size), weeks))
+
+    counters = week_counters(tallies)
+    first = first_weeks(tallies)
+    all_users = set(first) | live_users(db, until, page_size)
+    result: Dict[str, Any] = {
+        "until": until,
+        "weeks": len(counters),
+        "interactions": sum(c["interactions"] for c in counters.values()),
+        "users": len(first),
+        "all_users": len(all_users),
+    }
+    if dry_run:
+        result["week_counters"] = counters
+        return result
+
+    result["weeks_written"] = write_weeks(db, counters, batch_size)
+    result["users_written"] = write_users(db, first, batch_size)
+    overall = write_overall(db, counters, until, len(all_users))
+    result["overall"] = {key: overall[key] for key in ("interactions", "voice", "active_users")}
+    if rebuild:
+        result["dashboard_weeks"] = rebuild_dashboard()
+    checkpoint.remove()
+    return result
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Recompute public_stats from the logs collection.")
+    parser.add_argument("--until", help="first week (YYYYMMDD, any day of it) left as is; default: the current week")
+    parser.add_argument("--workers", type=int, default=4, help="weeks tallied in parallel")
+    parser.add_argument("--page-size", type=int, default=500, help="logs read per query page")
+    parser.add_argument("--batch-size", type=int, default=400, help=f"week documents per batch commit (max {MAX_BATCH_WRITES})")
+    parser.add_argument("--checkpoint", default="backfill_stats.checkpoint.json", help="progress file for resuming")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="print the recomputed counters without writing")
+    parser.add_argument("--rebuild-dashboard", action=argparse.BooleanOptionalAction, default=DASHBOARD_READ_MODEL,
+                        help="rebuild public_stats/dashboard afterwards (default: on with DASHBOARD_READ_MODEL)")
+    args = parser.parse_args(argv)
+    if not 0 < args.batch_size <= MAX_BATCH_WRITES:
+        parser.error(f"--batch-size must be between 1 and {MAX_BATCH_WRITES}")
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    # A week is only recomputed whole, so --until is rounded down to its Monday
+    from zoneinfo import ZoneInfo
+    until_date = datetime.strptime(args.until, "%Y%m%d") if args.until else datetime.now(ZoneInfo("Asia/Kolkata"))
+    result = backfill(
+        get_week_start_date_str(until_date), workers=args.workers, page_size=args.page_size,
+        batch_size=args.batch_size, checkpoint_path=args.checkpoint, restart=args.restart,
+        dry_run=args.dry_run, rebuild=args.rebuild_dashboard,
+    )
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,551 @@
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+from google.api_core.exceptions import NotFound
+
+from app.utils.langid import detect_language
+from app.utils.ogg import OggError, opus_stream, parse_pages
+from bench.workload import answer_text
+from cal.local_firestore import LocalFirestore, LocalStore
+
+# -----------------------------
+# ⏱️ LATENCY PROFILES
+# -----------------------------
+# Per-operation latency: median_ms (plus per_unit_ms per unit of work: token,
+# character, KB or second of audio), spread (lognormal sigma), error_rate and the
+# HTTP status an error returns (Telegram only). "realistic" is roughly what the
+# production function sees from asia-south1; "zero" removes all waiting so a run
+# measures the pipeline's own CPU and memory overhead.
+PROFILES: Dict[str, Dict[str, Dict[str, float]]] = {
+    "realistic": {
+        "telegram.sendMessage":     {"median_ms": 90, "spread": 0.3},
+        "telegram.editMessageText": {"median_ms": 80, "spread": 0.3},
+        "telegram.sendAudio":       {"median_ms": 150, "spread": 0.3, "per_unit_ms": 2},   # per KB
+        "telegram.sendVoice":       {"median_ms": 150, "spread": 0.3, "per_unit_ms": 2},   # per KB
+        "telegram.getFile":         {"median_ms": 70, "spread": 0.3},
+        "telegram.download":        {"median_ms": 60, "spread": 0.3, "per_unit_ms": 1},    # per KB
+        "openai.chat":              {"median_ms": 450, "spread": 0.4, "per_unit_ms": 8},   # per output token
+        "openai.whisper":           {"median_ms": 400, "spread": 0.4, "per_unit_ms": 60},  # per second of audio
+        "openai.tts":               {"median_ms": 500, "spread": 0.4, "per_unit_ms": 1},   # per character
+        "openai.embeddings":        {"median_ms": 120, "spread": 0.3},
+        "google.tts":               {"median_ms": 200, "spread": 0.3, "per_unit_ms": 1},   # per character
+        "gcs.upload":               {"median_ms": 120, "spread": 0.4, "per_unit_ms": 0.5}, # per KB
+        "gcs.download":             {"median_ms": 60, "spread": 0.4},
+        "firestore.get":            {"median_ms": 25, "spread": 0.4},
+        "firestore.query":          {"median_ms": 40, "spread": 0.4},
+        "firestore.commit":         {"median_ms": 35, "spread": 0.4},
+        "secret_manager.access":    {"median_ms": 80, "spread": 0.3},
+    },
+    "zero": {},
+}
+
+class FakeServiceError(RuntimeError):
+    """Injected failure from a stand-in service."""
+
+class LatencyModel:
+    """Samples lognormal latencies around a median and decides injected failures."""
+    def __init__(self, median_ms: float = 0.0, spread: float = 0.0, per_unit_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500):
+        self.median_ms = median_ms
+        self.spread = spread
+        self.per_unit_ms = per_unit_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def sample_ms(self, rng: random.Random, units: float = 0.0) -> float:
+        base = self.median_ms + self.per_unit_ms * units
+        if base <= 0:
+            return 0.0
+        return base * math.exp(rng.gauss(0.0, self.spread)) if self.spread else base
+
+# -----------------------------
+# 🌍 SHARED STATE OF THE FAKE SERVICES
+# -----------------------------
+class FakeWorld:
+    """
+    State shared by every stand-in: the latency/error models, the voice notes the
+    Telegram fake can serve (with the transcript Whisper should return), and
+    per-operation call/error counters.
+    """
+    def __init__(self, profile: Dict[str, Dict[str, float]], latency_scale: float = 1.0,
+                 error_rate: Optional[float] = None, seed: int = 0):
+        self.models = {op: LatencyModel(**spec) for op, spec in profile.items()}
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.voice_notes: Dict[str, Dict[str, Any]] = {}
+        self._voice_by_digest: Dict[str, Dict[str, Any]] = {}
+        self._voice_by_serial: Dict[int, Dict[str, Any]] = {}
+
+    def _sample(self, op: str, units: float):
+        model = self.models.get(op) or LatencyModel()
+        error_rate = self.error_rate if self.error_rate is not None else model.error_rate
+        with self._lock:
+            self.calls[op] += 1
+            delay_ms = model.sample_ms(self._rng, units) * self.latency_scale
+            failed = self._rng.random() < error_rate
+            if failed:
+                self.errors[op] += 1
+        return delay_ms, model.error_status if failed else None
+
+    def call(self, op: str, units: float = 0.0) -> Optional[int]:
+        """
+        Simulates one call: sleeps for a sampled latency, then returns the error
+        status to respond with (or None on success).
+        """
+        delay_ms, status = self._sample(op, units)
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+        return status
+
+    async def acall(self, op: str, units: float = 0.0) -> Optional[int]:
+        """call() for the asyncio stand-ins: waits with asyncio.sleep instead of blocking the loop."""
+        delay_ms, status = self._sample(op, units)
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        return status
+
+    def check(self, op: str, units: float = 0.0):
+        """Like call(), but raises FakeServiceError for an injected failure (SDK-style clients)."""
+        if self.call(op, units) is not None:
+            raise FakeServiceError(f"Injected failure in {op}")
+
+    async def acheck(self, op: str, units: float = 0.0):
+        if await self.acall(op, units) is not None:
+            raise FakeServiceError(f"Injected failure in {op}")
+
+    def flood(self, method: str) -> int:
+        """Counts a send rejected by the Telegram stand-in's flood control; returns the 429 status."""
+        with self._lock:
+            self.errors[f"telegram.{method}.flood"] += 1
+        return 429
+
+    def add_voice_note(self, file_id: str, text: str, language: str, duration: float) -> Dict[str, Any]:
+        """
+        Registers a voice note as a well-formed Ogg Opus stream of about 2 KB per second
+        (one page per second of 20 ms packets). The packets are filler, except that each
+        page's first packet starts with the page's index, so a segment cut from the
+        note can be traced back to the seconds it covers.
+        """
+        serial = int.from_bytes(hashlib.sha256(file_id.encode()).digest()[:4], "little")
+        seconds = max(int(math.ceil(duration)), 1)
+        pages = [[index.to_bytes(4, "little") + bytes(37)] + [bytes(41)] * 49 for index in range(seconds)]
+        data = opus_stream(serial, pages)
+        note = {"file_id": file_id, "data": data, "text": text, "language": language, "duration": duration}
+        with self._lock:
+            self.voice_notes[file_id] = note
+            self._voice_by_digest[hashlib.sha256(data).hexdigest()] = note
+            self._voice_by_serial[serial] = note
+        return note
+
+    def voice_note_for(self, data: bytes) -> Optional[Dict[str, Any]]:
+        """The note a whole upload or a segment cut from it belongs to, with the transcript of that part."""
+        note = self._voice_by_digest.get(hashlib.sha256(data).hexdigest())
+        if note is not None:
+            return note
+        try:
+            pages = parse_pages(data)
+        except OggError:
+            return None
+        note = self._voice_by_serial.get(pages[0].serial) if pages else None
+        if note is None:
+            return None
+        # Audio pages carry their index in the original note; words are spread evenly over its duration
+        indexes = [int.from_bytes(page.body[:4], "little") for page in pages[2:]]
+        start, end = min(indexes), max(indexes) + 1
+        words = note["text"].split()
+        per_second = len(words) / max(int(math.ceil(note["duration"])), 1)
+        part = words[int(start * per_second):int(math.ceil(end * per_second))]
+        return {**note, "text": " ".join(part), "duration": float(end - start)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+# -----------------------------
+# 📨 TELEGRAM BOT API
+# -----------------------------
+class FakeResponse:
+    """The parts of requests.Response the pipeline uses."""
+    def __init__(self, status_code: int = 200, payload: Optional[Dict[str, Any]] = None, content: bytes = b""):
+        self.status_code = status_code
+        self._payload = payload
+        self.content = content
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error (benchmark stand-in)", response=self)
+
+    def iter_content(self, chunk_size: int = 1) -> Iterator[bytes]:
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def aiter_bytes(self, chunk_size: int = 1):
+        for chunk in self.iter_content(chunk_size):
+            yield chunk
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+def _payload_bytes(files: Optional[Dict[str, Any]]) -> int:
+    size = 0
+    for value in (files or {}).values():
+        content = value[1] if isinstance(value, tuple) else value
+        if isinstance(content, (bytes, bytearray)):
+            size += len(content)
+        elif hasattr(content, "read"):
+            size += len(content.read())
+    return size
+
+class FakeTelegramSession:
+    """Stands in for the requests.Session used for the Bot API (get_http_session)."""
+    def __init__(self, world: FakeWorld, flood_limit: Optional[int] = None):
+        self._world = world
+        self._message_ids = iter(range(1, 1 << 62))
+        self._lock = threading.Lock()
+        self.sent_bytes = Counter()
+        # Like Telegram's flood control: more than flood_limit sends to one chat within a second get a 429
+        self._flood_limit = flood_limit
+        self._chat_sends: Dict[Any, deque] = {}
+
+    def _flooded(self, json, data) -> bool:
+        chat_id = (json or data or {}).get("chat_id")
+        if self._flood_limit is None or chat_id is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            window = self._chat_sends.setdefault(chat_id, deque())
+            while window and now - window[0] >= 1.0:
+                window.popleft()
+            if len(window) >= self._flood_limit:
+                return True
+            window.append(now)
+            return False
+
+    def _error(self, status: int) -> FakeResponse:
+        payload = {"ok": False, "error_code": status, "description": "Injected failure"}
+        if status == 429:
+            payload["parameters"] = {"retry_after": 1}
+        return FakeResponse(status, payload)
+
+    def _begin_post(self, url, files):
+        method = urlparse(url).path.rsplit("/", 1)[-1]
+        size = _payload_bytes(files)
+        with self._lock:
+            self.sent_bytes[method] += size
+            message_id = next(self._message_ids)
+        return method, size, message_id
+
+    def _post_response(self, status, method, size, message_id, json) -> FakeResponse:
+        if status is not None:
+            return self._error(status)
+        result: Dict[str, Any] = {"message_id": message_id}
+        if method in ("sendAudio", "sendVoice"):
+            field = "audio" if method == "sendAudio" else "voice"
+            file_id = (json or {}).get(field) or f"bench_{field}_{message_id}"
+            result[field] = {"file_id": file_id, "file_size": size}
+        return FakeResponse(200, {"ok": True, "result": result})
+
+    def post(self, url, json=None, data=None, files=None, timeout=None, **kwargs) -> FakeResponse:
+        method, size, message_id = self._begin_post(url, files)
+        status = self._world.call(f"telegram.{method}", units=size / 1024)
+        if status is None and self._flooded(json, data):
+            status = self._world.flood(method)
+        return self._post_response(status, method, size, message_id, json)
+
+    def _file_request(self, url):
+        """Returns (operation, units, response factory) for a getFile or file download URL."""
+        parsed = urlparse(url)
+        if "/file/bot" in parsed.path:
+            note = self._world.voice_notes.get(parsed.path.rsplit("/", 1)[-1])
+
+            def download(status):
+                if status is not None or note is None:
+                    return self._error(status or 404)
+                return FakeResponse(200, content=note["data"])
+            return "telegram.download", len(note["data"]) / 1024 if note else 0, download
+
+        file_id = parse_qs(parsed.query).get("file_id", [""])[0]
+
+        def get_file(status):
+            if status is not None:
+                return self._error(status)
+            return FakeResponse(200, {"ok": True, "result": {"file_id": file_id, "file_path": file_id}})
+        return "telegram.getFile", 0, get_file
+
+    def get(self, url, timeout=None, stream=False, **kwargs) -> FakeResponse:
+        op, units, respond = self._file_request(url)
+        return respond(self._world.call(op, units=units))
+
+class FakeAsyncTelegramClient(FakeTelegramSession):
+    """Stands in for the httpx.AsyncClient used by the asyncio pipeline (get_async_http_client)."""
+    async def post(self, url, json=None, data=None, files=None, **kwargs) -> FakeResponse:
+        method, size, message_id = self._begin_post(url, files)
+        status = await self._world.acall(f"telegram.{method}", units=size / 1024)
+        if status is None and self._flooded(json, data):
+            status = self._world.flood(method)
+        return self._post_response(status, method, size, message_id, json)
+
+    async def get(self, url, params=None, **kwargs) -> FakeResponse:
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        op, units, respond = self._file_request(url)
+        return respond(await self._world.acall(op, units=units))
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        yield await self.get(url)
+
+# -----------------------------
+# 🤖 OPENAI
+# -----------------------------
+_PLAIN_LANGUAGE = re.compile(r"\(maximum \d+ words\) in (\w+)\.")
+
+def _chunk(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+class _FakeChatCompletions:
+    def __init__(self, world: FakeWorld, answer_words: int):
+        self._world = world
+        self._answer_words = answer_words
+
+    def _reply(self, messages):
+        system, prompt = messages[0]["content"], messages[-1]["content"]
+        match = _PLAIN_LANGUAGE.search(system)
+        language = match.group(1) if match else (detect_language(prompt) or "english")
+        answer = answer_text(language, self._answer_words)
+        if "in JSON format" in system:
+            content = json.dumps({"language": language, "answer": answer}, ensure_ascii=False)
+        elif "On the first line" in system:
+            content = f"{language}\n{answer}"
+        else:
+            content = answer
+        tokens = max(len(content) // 4, 1)
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"]) for m in messages) // 4,
+                                completion_tokens=tokens, total_tokens=0)
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        return content, tokens, usage
+
+    def _stream_chunks(self, content: str, usage=None):
+        """Yields (delay_s, chunk) pairs for a streamed reply."""
+        model = self._world.models.get("openai.chat")
+        per_token = (model.per_unit_ms if model else 0) * self._world.latency_scale / 1000
+        for start in range(0, len(content), 16):
+            yield per_token * 4, _chunk(content[start:start + 16])  # 16 characters is about 4 tokens
+        if usage is not None:
+            # Like the API with stream_options.include_usage: a last chunk with no choices
+            yield 0, SimpleNamespace(choices=[], usage=usage)
+
+    def create(self, model=None, messages=None, temperature=None, stream=False, **kwargs):
+        content, tokens, usage = self._reply(messages)
+        if not stream:
+            self._world.check("openai.chat", units=tokens)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+        self._world.check("openai.chat")
+        include_usage = (kwargs.get("stream_options") or {}).get("include_usage")
+        return self._stream(content, usage if include_usage else None)
+
+    def _stream(self, content: str, usage=None):
+        for delay, chunk in self._stream_chunks(content, usage):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+class _FakeAsyncChatCompletions(_FakeChatCompletions):
+    async def create(self, model=None, messages=None, temperature=None, stream=False, **kwargs):
+        content, tokens, usage = self._reply(messages)
+        if not stream:
+            await self._world.acheck("openai.chat", units=tokens)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+        await self._world.acheck("openai.chat")
+        include_usage = (kwargs.get("stream_options") or {}).get("include_usage")
+        return self._astream(content, usage if include_usage else None)
+
+    async def _astream(self, content: str, usage=None):
+        for delay, chunk in self._stream_chunks(content, usage):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+class _FakeTranscriptions:
+    def __init__(self, world: FakeWorld):
+        self._world = world
+
+    def _note(self, file):
+        handle = file[1] if isinstance(file, tuple) else file
+        data = handle if isinstance(handle, bytes) else handle.read()
+        return self._world.voice_note_for(data) or {"text": answer_text("english", 12), "language": "english", "duration": len(data) / 2048}
+
+    def create(self, model=None, file=None, response_format=None, **kwargs):
+        note = self._note(file)
+        self._world.check("openai.whisper", units=note["duration"])
+        return SimpleNamespace(text=note["text"], language=note["language"], duration=note["duration"])
+
+class _FakeAsyncTranscriptions(_FakeTranscriptions):
+    async def create(self, model=None, file=None, response_format=None, **kwargs):
+        note = self._note(file)
+        await self._world.acheck("openai.whisper", units=note["duration"])
+        return SimpleNamespace(text=note["text"], language=note["language"], duration=note["duration"])
+
+class _FakeSpeech:
+    def __init__(self, world: FakeWorld):
+        self._world = world
+
+    def create(self, model=None, voice=None, input="", response_format="mp3", **kwargs):
+        self._world.check("openai.tts", units=len(input))
+        return SimpleNamespace(content=_speech_bytes(input, response_format == "opus"))
+
+class _FakeEmbeddings:
+    def __init__(self, world: FakeWorld):
+        self._world = world
+
+    def create(self, model=None, input="", **kwargs):
+        self._world.check("openai.embeddings")
+        digest = hashlib.sha256(input.encode("utf-8")).digest()
+        vector = [byte / 255 - 0.5 for byte in digest * 2]
+        return SimpleNamespace(data=[SimpleNamespace(embedding=vector)])
+
+class FakeOpenAI:
+    """Stands in for the OpenAI client: chat (incl. streaming), Whisper, TTS and embeddings."""
+    def __init__(self, world: FakeWorld, answer_words: int = 60):
+        self.chat = SimpleNamespace(completions=_FakeChatCompletions(world, answer_words))
+        self.audio = SimpleNamespace(transcriptions=_FakeTranscriptions(world), speech=_FakeSpeech(world))
+        self.embeddings = _FakeEmbeddings(world)
+
+class FakeAsyncOpenAI:
+    """Stands in for AsyncOpenAI: the chat (incl. streaming) and Whisper calls the asyncio pipeline makes."""
+    def __init__(self, world: FakeWorld, answer_words: int = 60):
+        self.chat = SimpleNamespace(completions=_FakeAsyncChatCompletions(world, answer_words))
+        self.audio = SimpleNamespace(transcriptions=_FakeAsyncTranscriptions(world))
+
+# -----------------------------
+# 🔊 GOOGLE TTS / ☁️ GCS / 🔐 SECRET MANAGER
+# -----------------------------
+def _speech_bytes(text: str, opus: bool) -> bytes:
+    """
+    Synthesized speech sized by the text: ~200 bytes/char for MP3 (32 kbps) and
+    ~100 bytes/char for Ogg Opus (~16 kbps, where Opus speech stays clear).
+    """
+    if opus:
+        return b"OggS" + bytes(len(text) * 100)
+    return b"\xff\xf3" + bytes(len(text) * 200)
+
+def _is_opus(audio_config) -> bool:
+    return getattr(getattr(audio_config, "audio_encoding", None), "name", None) == "OGG_OPUS"
+
+class FakeTTSClient:
+    """Stands in for texttospeech.TextToSpeechClient; output size scales with the text and encoding."""
+    def __init__(self, world: FakeWorld):
+        self._world = world
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, timeout=None, **kwargs):
+        text = input.text
+        self._world.check("google.tts", units=len(text))
+        return SimpleNamespace(audio_content=_speech_bytes(text, _is_opus(audio_config)))
+
+class FakeAsyncTTSClient(FakeTTSClient):
+    """Stands in for texttospeech.TextToSpeechAsyncClient."""
+    async def synthesize_speech(self, input=None, voice=None, audio_config=None, timeout=None, **kwargs):
+        text = input.text
+        await self._world.acheck("google.tts", units=len(text))
+        return SimpleNamespace(audio_content=_speech_bytes(text, _is_opus(audio_config)))
+
+class _FakeBlob:
+    def __init__(self, world: FakeWorld, objects: Dict[str, bytes], name: str):
+        self._world = world
+        self._objects = objects
+        self.name = name
+
+    def upload_from_file(self, file_obj, size=None, content_type=None, timeout=None, **kwargs):
+        data = file_obj.read()
+        self._world.check("gcs.upload", units=len(data) / 1024)
+        self._objects[self.name] = data
+
+    def upload_from_string(self, data, content_type=None, timeout=None, **kwargs):
+        self.upload_from_file(io.BytesIO(data if isinstance(data, bytes) else data.encode("utf-8")))
+
+    def upload_from_filename(self, filename, timeout=None, **kwargs):
+        with open(filename, "rb") as f:
+            self.upload_from_file(f)
+
+    def download_as_bytes(self, timeout=None, **kwargs) -> bytes:
+        self._world.check("gcs.download")
+        if self.name not in self._objects:
+            raise NotFound(f"No such object: {self.name}")
+        return self._objects[self.name]
+
+class FakeStorageClient:
+    """Stands in for storage.Client; objects are kept in memory per bucket."""
+    def __init__(self, world: FakeWorld):
+        self._world = world
+        self.buckets: Dict[str, Dict[str, bytes]] = {}
+
+    def bucket(self, name: str):
+        objects = self.buckets.setdefault(name, {})
+        return SimpleNamespace(blob=lambda blob_name: _FakeBlob(self._world, objects, blob_name))
+
+class FakeSecretManager:
+    """Stands in for SecretManagerServiceClient with fixed benchmark secrets."""
+    def __init__(self, world: FakeWorld, secrets: Dict[str, str]):
+        self._world = world
+        self._secrets = secrets
+
+    def access_secret_version(self, request=None, timeout=None, **kwargs):
+        key = request["name"].split("/secrets/")[1].split("/")[0]
+        self._world.check("secret_manager.access")
+        if key not in self._secrets:
+            raise NotFound(f"Secret {key} not found")
+        return SimpleNamespace(payload=SimpleNamespace(data=self._secrets[key].encode("utf-8")))
+
+BENCH_SECRETS = {
+    "TELEGRAM_BOT_TOKEN": "bench-token",
+    "WEBHOOK_SECRET": "bench-secret",
+    "OPENAI_API_KEY": "bench-openai-key",
+    "GOOGLE_APPLICATION_CREDENTIALS": "{}",
+}
+
+def install_fakes(world: FakeWorld, answer_words: int = 60, flood_limit: Optional[int] = None) -> Dict[str, Any]:
+    """Registers every stand-in in the client registry (cal.clients) and returns them."""
+    from cal.clients import set_client
+    fakes = {
+        "http": FakeTelegramSession(world, flood_limit=flood_limit),
+        "openai": FakeOpenAI(world, answer_words=answer_words),
+        "tts": FakeTTSClient(world),
+        "secret_manager": FakeSecretManager(world, BENCH_SECRETS),
+        "storage": FakeStorageClient(world),
+        "firestore": LocalFirestore(store=LocalStore(request_hook=lambda kind: world.check(f"firestore.{kind}"))),
+        "async_http": FakeAsyncTelegramClient(world, flood_limit=flood_limit),
+        "async_openai": FakeAsyncOpenAI(world, answer_words=answer_words),
+        "async_tts": FakeAsyncTTSClient(world),
+    }
+    for name, client in fakes.items():
+        set_client(name, client)
+    return fakes
@@ -0,0 +1,413 @@
+"""
+Offline load test for the webhook pipeline.
+
+Every external service is replaced by an in-process stand-in (bench/fakes.py), so
+runs are free, repeatable and need no credentials. Run from backend/:
+
+    python -m bench.run --updates 300 --concurrency 8 --out bench_results.json
+    python -m bench.run --set PIPELINE_MODE=concurrent --compare bench_results.json
+    python -m bench.run --asgi --concurrency 48 --set ASYNC_MAX_CONCURRENCY=48
+
+--set overrides config.json keys for the run; --compare exits with status 1 when a
+headline metric regressed by more than --tolerance against an earlier result file.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Loads .env; the variables it sets are overridden below so the run never goes "local"
+import app.utils.env  # noqa: F401
+
+# -----------------------------
+# 📈 STATISTICS
+# -----------------------------
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in [0, 100]); None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return round(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower), 1)
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": round(sum(values) / len(values), 1) if values else None,
+        "max": round(max(values), 1) if values else None,
+    }
+
+class StageCollector:
+    """Receives the per-stage breakdown of every finished interaction from StageTimer.log."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+
+    def record(self, content_type: str, stages: Dict[str, float], total_ms: float, reply_ms: Optional[float]):
+        with self._lock:
+            self.records.append({"type": content_type, "stages": dict(stages), "total_ms": total_ms,
+                                 "reply_ms": reply_ms if reply_ms is not None else total_ms})
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self.records)
+
+    def stage_summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            by_stage: Dict[str, List[float]] = {}
+            for record in self.records:
+                for name, ms in record["stages"].items():
+                    by_stage.setdefault(name, []).append(ms)
+        return {name: summarize(values) for name, values in sorted(by_stage.items())}
+
+def _hook_stage_timer(telegram, collector: StageCollector):
+    original_log = telegram.StageTimer.log
+
+    def log(self, mode, content_type, reply_ms=None):
+        collector.record(content_type, self.stages, self.total_ms(), reply_ms)
+        original_log(self, mode, content_type, reply_ms=reply_ms)
+
+    telegram.StageTimer.log = log
+
+# -----------------------------
+# 🏃 DRIVER
+# -----------------------------
+class _Request:
+    """The parts of a Flask request telegram_webhook reads."""
+    def __init__(self, update: Dict[str, Any], secret: str):
+        self.headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+        self._update = update
+
+    def get_json(self):
+        return self._update
+
+async def _asgi_post(app, update: Dict[str, Any], secret: str) -> int:
+    """Sends one webhook POST through the ASGI app in-process; returns the response status."""
+    body = json.dumps(update).encode("utf-8")
+    scope = {"type": "http", "method": "POST", "path": "/",
+             "headers": [(b"x-telegram-bot-api-secret-token", secret.encode("utf-8"))]}
+    response = {}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+
+    await app(scope, receive, send)
+    return response.get("status")
+
+async def _drive_asgi(app, stream, concurrency: int, started: float, post) -> None:
+    """Replays the stream against the ASGI app on one event loop, `concurrency` requests at a time."""
+    events: asyncio.Queue = asyncio.Queue()
+    replies: asyncio.Queue = asyncio.Queue()
+    lifespan = asyncio.ensure_future(app({"type": "lifespan"}, events.get, replies.put))
+    await events.put({"type": "lifespan.startup"})
+    await replies.get()
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        async with limit:
+            await post(item)
+
+    tasks = []
+    for item in stream:
+        if item["at"] is not None:
+            delay = started + item["at"] - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(item)))
+    await asyncio.gather(*tasks)
+    # Shutdown waits for queue-mode tasks, then closes the asyncio clients
+    await events.put({"type": "lifespan.shutdown"})
+    await replies.get()
+    await lifespan
+
+def _parse_overrides(pairs: List[str]) -> Dict[str, Any]:
+    overrides = {}
+    for pair in pairs:
+        key, _, raw = pair.partition("=")
+        try:
+            overrides[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            overrides[key] = raw  # Bare strings, e.g. PIPELINE_MODE=concurrent
+    return overrides
+
+def _parse_languages(spec: Optional[str]) -> Optional[Dict[str, float]]:
+    if not spec:
+        return None
+    weights = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def _prepare(args) -> Dict[str, Any]:
+    """Points the app at the stand-ins; must run before main/telegram are imported."""
+    os.environ["ENVIRONMENT"] = "BENCH"
+    os.environ.pop("ENV", None)
+    from app.utils.config import _load_config
+    overrides = _parse_overrides(args.set)
+    if args.telegram_flood_limit is None:
+        # The Telegram stand-in has no rate limits to honour, and time in a run is compressed
+        # (--latency-scale), so pacing would only measure itself; opt in with --set
+        overrides.setdefault("TELEGRAM_SEND_SCHEDULER", False)
+    _load_config().update(overrides)
+    return overrides
+
+def run(args) -> Dict[str, Any]:
+    overrides = _prepare(args)
+
+    from bench.fakes import PROFILES, FakeWorld, install_fakes, BENCH_SECRETS
+    from bench.workload import generate_updates, load_updates
+
+    if args.profile_file:
+        with open(args.profile_file, encoding="utf-8") as f:
+            profile = json.load(f)
+    else:
+        profile = PROFILES[args.profile]
+    world = FakeWorld(profile, latency_scale=args.latency_scale, error_rate=args.error_rate, seed=args.seed)
+    install_fakes(world, answer_words=args.answer_words, flood_limit=args.telegram_flood_limit)
+
+    if args.replay:
+        stream = load_updates(world, args.replay, rate=args.rate, seed=args.seed)
+    else:
+        stream = generate_updates(
+            world, args.updates, voice_ratio=args.voice_ratio, languages=_parse_languages(args.languages),
+            users=args.users, repeat_ratio=args.repeat_ratio, rate=args.rate, burst_size=args.burst_size,
+            burst_interval=args.burst_interval, voice_seconds=args.voice_seconds, seed=args.seed,
+        )
+
+    import main
+    from app.channels import telegram
+    from app.utils import tracing
+    collector = StageCollector()
+    _hook_stage_timer(telegram, collector)
+
+    latencies: Dict[str, List[float]] = {"all": [], "text": [], "audio": []}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def record(update, elapsed_ms, error):
+        kind = "audio" if "voice" in (update.get("message") or {}) else "text"
+        with lock:
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                latencies["all"].append(elapsed_ms)
+                latencies[kind].append(elapsed_ms)
+
+    def send(item):
+        t0 = time.perf_counter()
+        try:
+            body, status = main.telegram_webhook(_Request(item["update"], BENCH_SECRETS["WEBHOOK_SECRET"]))
+            error = None if status == 200 else f"HTTP {status}"
+        except Exception as e:
+            error = type(e).__name__
+        record(item["update"], (time.perf_counter() - t0) * 1000, error)
+
+    async def send_async(item):
+        t0 = time.perf_counter()
+        try:
+            status = await _asgi_post(asgi.app, item["update"], BENCH_SECRETS["WEBHOOK_SECRET"])
+            error = None if status == 200 else f"HTTP {status}"
+        except Exception as e:
+            error = type(e).__name__
+        record(item["update"], (time.perf_counter() - t0) * 1000, error)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    if args.asgi:
+        import asgi
+        asyncio.run(_drive_asgi(asgi.app, stream, args.concurrency, started, send_async))
+    else:
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="bench") as pool:
+            for item in stream:
+                if item["at"] is not None:
+                    delay = started + item["at"] - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                pool.submit(send, item)
+
+    # In queue mode the webhook only acknowledges; wait for the workers to finish
+    accepted = len(latencies["all"])
+    deadline = time.monotonic() + args.drain_timeout
+    while collector.count() < accepted and time.monotonic() < deadline:
+        time.sleep(0.05)
+    duration = time.perf_counter() - started
+    peak_bytes = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    processed = collector.count()
+    with collector._lock:
+        totals = [record["total_ms"] for record in collector.records]
+        reply_paths = [record["reply_ms"] for record in collector.records]
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "argv": sys.argv[1:],
+            "profile": args.profile_file or args.profile,
+            "latency_scale": args.latency_scale,
+            "config_overrides": overrides,
+        },
+        "workload": {
+            "updates": len(stream),
+            "voice": sum(1 for item in stream if "voice" in item["update"].get("message", {})),
+            "concurrency": args.concurrency,
+            "entry_point": "asgi" if args.asgi else "wsgi",
+            "rate": args.rate,
+            "burst_size": args.burst_size,
+        },
+        "results": {
+            "duration_s": round(duration, 3),
+            "processed": processed,
+            "unfinished": accepted - processed,
+            "errors": errors,
+            "throughput_per_s": round(processed / duration, 2) if duration else None,
+            "webhook_latency_ms": summarize(latencies["all"]),
+            "webhook_latency_by_type_ms": {"text": summarize(latencies["text"]), "audio": summarize(latencies["audio"])},
+            "interaction_total_ms": summarize(totals),
+            "reply_path_ms": summarize(reply_paths),
+            "stages_ms": collector.stage_summary(),
+            "peak_traced_memory_mb": round(peak_bytes / 2**20, 2) if peak_bytes is not None else None,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "services": world.stats(),
+            # Per-span histograms and token/byte counters from the app's own tracing layer
+            "tracing": tracing.metrics.snapshot(),
+        },
+    }
+
+# -----------------------------
+# 🔁 REGRESSION CHECK
+# -----------------------------
+# (path into results, True if higher is better)
+HEADLINE_METRICS = [
+    (("webhook_latency_ms", "p50"), False),
+    (("webhook_latency_ms", "p95"), False),
+    (("webhook_latency_ms", "p99"), False),
+    (("reply_path_ms", "p95"), False),
+    (("throughput_per_s",), True),
+    (("peak_traced_memory_mb",), False),
+]
+
+def _lookup(results: Dict[str, Any], path) -> Optional[float]:
+    value: Any = results
+    for key in path:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Prints a metric-by-metric comparison; returns the metrics that regressed beyond tolerance."""
+    regressions = []
+    print(f"{'metric':32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for path, higher_is_better in HEADLINE_METRICS:
+        old, new = _lookup(baseline["results"], path), _lookup(current["results"], path)
+        name = ".".join(path)
+        if old is None or new is None or old == 0:
+            print(f"{name:32} {str(old):>10} {str(new):>10} {'n/a':>8}")
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{name:32} {old:>10} {new:>10} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the Telegram webhook pipeline.")
+    workload = parser.add_argument_group("workload")
+    workload.add_argument("--updates", type=int, default=200, help="number of synthetic updates")
+    workload.add_argument("--replay", help="JSONL file of recorded updates to replay instead")
+    workload.add_argument("--voice-ratio", type=float, default=0.3, help="share of voice notes")
+    workload.add_argument("--voice-seconds", type=float, default=8.0, help="mean voice note length")
+    workload.add_argument("--languages", help="language weights, e.g. hindi=4,english=3,tamil=1")
+    workload.add_argument("--users", type=int, default=50, help="distinct senders")
+    workload.add_argument("--repeat-ratio", type=float, default=0.0, help="share of repeated questions")
+    workload.add_argument("--concurrency", type=int, default=8, help="concurrent webhook calls")
+    workload.add_argument("--rate", type=float, help="open-loop Poisson arrivals per second")
+    workload.add_argument("--burst-size", type=int, default=1, help="updates arriving together")
+    workload.add_argument("--burst-interval", type=float, default=1.0, help="seconds between bursts")
+    services = parser.add_argument_group("stand-in services")
+    services.add_argument("--profile", default="realistic", choices=["realistic", "zero"])
+    services.add_argument("--profile-file", help="JSON latency profile (same shape as fakes.PROFILES)")
+    services.add_argument("--latency-scale", type=float, default=1.0, help="multiplies every latency")
+    services.add_argument("--error-rate", type=float, help="overrides every operation's error rate")
+    services.add_argument("--telegram-flood-limit", type=int,
+                          help="sends per chat per second the Telegram stand-in accepts before answering 429 "
+                               "(also leaves the send scheduler on)")
+    services.add_argument("--answer-words", type=int, default=60, help="length of the fake LLM reply")
+    parser.add_argument("--asgi", action="store_true",
+                        help="drive the asyncio entry point (asgi.app) on one event loop instead of main.telegram_webhook")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="config override")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="skip allocation tracing (it slows Python code down noticeably)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="wait for queued work (queue mode)")
+    parser.add_argument("--out", help="write the results JSON here")
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's INFO logs")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    if args.verbose:
+        report = run(args)
+    else:
+        # The pipeline also print()s per interaction; keep the summary readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = run(args)
+
+    results = report["results"]
+    print(json.dumps({key: results[key] for key in (
+        "duration_s", "processed", "errors", "throughput_per_s", "webhook_latency_ms", "reply_path_ms",
+        "peak_traced_memory_mb",
+    )}, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Saved results to {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
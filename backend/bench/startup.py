@@ -0,0 +1,141 @@
+"""
+Cold-start import profile for the webhook entry point (`python -X importtime`).
+Run from backend/:
+
+    python -m bench.startup --runs 5
+    python -m bench.startup --runs 10 --top 20 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from bench.run import _parse_overrides
+
+# Imported by the first request (or by the "warm" startup mode) rather than by `import main`
+DEFERRED_MODULES = [
+    "openai",
+    "google.cloud.firestore",
+    "google.cloud.texttospeech",
+    "google.cloud.storage",
+    "google.cloud.secretmanager_v1",
+    "flask",
+    "numpy",
+]
+FIRST_PARTY = ("main", "app", "cal")
+MAIN_MARKER = "--- import main ---"
+DEFERRED_MARKER = "--- deferred ---"
+
+_CHILD = f"""
+import importlib, json, os, sys, time
+sys.stderr.write({MAIN_MARKER!r} + "\\n")
+started = time.perf_counter()
+import app.utils.env  # loads .env first, so the overrides below win
+os.environ["ENVIRONMENT"] = "BENCH"
+os.environ.pop("ENV", None)
+from app.utils.config import _load_config
+_load_config().update(json.loads(sys.argv[1]))
+import main
+import_ms = (time.perf_counter() - started) * 1000
+sys.stderr.write({DEFERRED_MARKER!r} + "\\n")
+deferred = {{}}
+for name in json.loads(sys.argv[2]):
+    t0 = time.perf_counter()
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        continue
+    deferred[name] = (time.perf_counter() - t0) * 1000
+print(json.dumps({{"import_ms": import_ms, "deferred_ms": deferred}}))
+"""
+
+def parse_importtime(lines: List[str]) -> List[Dict[str, Any]]:
+    """Parses `-X importtime` lines into [{"module", "self_us", "cumulative_us", "depth"}]."""
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_part, cumulative_part, name = line.split(":", 1)[1].split("|", 2)
+        stripped = name.strip()
+        entries.append({
+            "module": stripped,
+            "self_us": int(self_part),
+            "cumulative_us": int(cumulative_part),
+            "depth": (len(name.rstrip()) - len(stripped) - 1) // 2,
+        })
+    return entries
+
+def profile_once(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD, json.dumps(overrides), json.dumps(DEFERRED_MODULES)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing main failed:\n{result.stderr[-2000:]}")
+    stderr = result.stderr.splitlines()
+    main_start = stderr.index(MAIN_MARKER)
+    deferred_start = stderr.index(DEFERRED_MARKER)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        "import_ms": timings["import_ms"],
+        "deferred_ms": timings["deferred_ms"],
+        "modules": parse_importtime(stderr[main_start + 1:deferred_start]),
+    }
+
+def _by_package(modules: List[Dict[str, Any]]) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for entry in modules:
+        root = entry["module"].split(".")[0]
+        if root == "google":
+            # google.* is several independent distributions; keep them apart
+            root = ".".join(entry["module"].split(".")[:3])
+        totals[root] = totals.get(root, 0) + entry["self_us"] / 1000
+    return totals
+
+def _median_dict(samples: List[Dict[str, float]], top: int) -> Dict[str, float]:
+    keys = {key for sample in samples for key in sample}
+    medians = {key: round(statistics.median(sample.get(key, 0.0) for sample in samples), 1) for key in keys}
+    return dict(sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top])
+
+def profile(runs: int, overrides: Dict[str, Any], top: int = 15) -> Dict[str, Any]:
+    samples = [profile_once(overrides) for _ in range(runs)]
+    return {
+        "runs": runs,
+        "config_overrides": overrides,
+        "import_main_ms": {
+            "median": round(statistics.median(s["import_ms"] for s in samples), 1),
+            "min": round(min(s["import_ms"] for s in samples), 1),
+            "max": round(max(s["import_ms"] for s in samples), 1),
+        },
+        "self_ms_by_package": _median_dict([_by_package(s["modules"]) for s in samples], top),
+        "cumulative_ms_first_party": _median_dict([
+            {e["module"]: e["cumulative_us"] / 1000 for e in s["modules"] if e["module"].split(".")[0] in FIRST_PARTY}
+            for s in samples
+        ], top),
+        "slowest_modules_self_ms": _median_dict([
+            {e["module"]: e["self_us"] / 1000 for e in s["modules"]} for s in samples
+        ], top),
+        "deferred_import_ms": _median_dict([s["deferred_ms"] for s in samples], len(DEFERRED_MODULES)),
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import profile for main.py.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to sample")
+    parser.add_argument("--top", type=int, default=15, help="rows per table")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="config override")
+    parser.add_argument("--out", help="write the profile JSON here")
+    args = parser.parse_args(argv)
+
+    report = profile(args.runs, _parse_overrides(args.set), top=args.top)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved profile to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
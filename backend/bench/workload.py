@@ -0,0 +1,123 @@
+import json
+import random
+from typing import Any, Dict, List, Optional
+
+# -----------------------------
+# 🗣️ SAMPLE TEXT PER LANGUAGE
+# -----------------------------
+# Questions users send and a passage the fake LLM answers with (repeated to length)
+SAMPLE_QUESTIONS: Dict[str, List[str]] = {
+    "hindi": ["मुझे आज का मौसम बताओ", "गेहूं की बुवाई कब करनी चाहिए?", "प्रधानमंत्री किसान योजना क्या है?"],
+    "marathi": ["मला आजचे हवामान सांग", "गव्हाची पेरणी कधी करावी?", "पीक विमा योजना काय आहे?"],
+    "bengali": ["আজকের আবহাওয়া কেমন?", "ধান চাষের সেরা সময় কখন?"],
+    "tamil": ["இன்றைய வானிலை எப்படி இருக்கிறது?", "நெல் சாகுபடிக்கு சிறந்த நேரம் எது?"],
+    "telugu": ["ఈ రోజు వాతావరణం ఎలా ఉంది?", "వరి సాగుకు ఉత్తమ సమయం ఏది?"],
+    "urdu": ["آج موسم کیسا ہے؟", "گندم کی بوائی کب کرنی چاہیے؟"],
+    "english": ["What is the weather today?", "When should I sow wheat?", "How do I apply for a crop loan?"],
+    "spanish": ["¿Qué tiempo hace hoy?", "¿Cuándo debo sembrar trigo?"],
+}
+
+SAMPLE_ANSWERS: Dict[str, str] = {
+    "hindi": "गेहूं की बुवाई के लिए नवंबर का पहला पखवाड़ा सबसे अच्छा समय है। बीज को उपचारित करके बोएं और पहली सिंचाई तीन हफ्ते बाद करें।",
+    "marathi": "गव्हाच्या पेरणीसाठी नोव्हेंबरचा पहिला पंधरवडा सर्वोत्तम वेळ आहे। बियाण्यावर प्रक्रिया करून पेरणी करा आणि तीन आठवड्यांनी पहिले पाणी द्या।",
+    "bengali": "ধান চাষের জন্য বর্ষার শুরু সবচেয়ে ভালো সময়। ভালো বীজ বেছে নিন এবং জমিতে পর্যাপ্ত জল রাখুন।",
+    "tamil": "நெல் சாகுபடிக்கு பருவமழை தொடக்கம் சிறந்த நேரம். நல்ல விதைகளைத் தேர்ந்தெடுத்து வயலில் போதுமான நீர் வைத்திருங்கள்.",
+    "telugu": "వరి సాగుకు వర్షాకాలం ప్రారంభం ఉత్తమ సమయం. మంచి విత్తనాలను ఎంచుకుని పొలంలో తగినంత నీరు ఉంచండి.",
+    "urdu": "گندم کی بوائی کے لیے نومبر کا پہلا پندرہواڑا بہترین وقت ہے۔ بیج کو صاف کر کے بوئیں اور تین ہفتے بعد پہلا پانی دیں۔",
+    "english": "The first half of November is the best time to sow wheat. Treat the seed before sowing and give the first irrigation after three weeks.",
+    "spanish": "La primera quincena de noviembre es el mejor momento para sembrar trigo. Trate la semilla antes de sembrar y riegue por primera vez a las tres semanas.",
+}
+
+def answer_text(language: str, words: int) -> str:
+    """A reply of roughly `words` words in `language` (English for unknown languages)."""
+    passage = SAMPLE_ANSWERS.get(language, SAMPLE_ANSWERS["english"]).split()
+    return " ".join(passage[i % len(passage)] for i in range(max(words, 1)))
+
+# -----------------------------
+# 📬 SYNTHETIC UPDATE STREAMS
+# -----------------------------
+def _parse_weights(languages: Optional[Dict[str, float]]) -> Dict[str, float]:
+    weights = languages or {"hindi": 4, "english": 3, "marathi": 1, "tamil": 1, "bengali": 1}
+    unknown = set(weights) - set(SAMPLE_QUESTIONS)
+    if unknown:
+        raise ValueError(f"No sample text for: {', '.join(sorted(unknown))}")
+    return weights
+
+def _arrival_times(count: int, rng: random.Random, rate: Optional[float], burst_size: int,
+                   burst_interval: float) -> List[Optional[float]]:
+    """
+    Offsets (seconds from the start) at which each update is sent. None means a closed
+    loop (send as soon as a worker is free); `rate` gives Poisson arrivals; `burst_size`
+    > 1 sends groups of updates at once every `burst_interval` seconds.
+    """
+    if burst_size > 1:
+        return [(index // burst_size) * burst_interval for index in range(count)]
+    if not rate:
+        return [None] * count
+    times, now = [], 0.0
+    for _ in range(count):
+        now += rng.expovariate(rate)
+        times.append(now)
+    return times
+
+def generate_updates(world, count: int, voice_ratio: float = 0.3, languages: Optional[Dict[str, float]] = None,
+                     users: int = 50, repeat_ratio: float = 0.0, rate: Optional[float] = None,
+                     burst_size: int = 1, burst_interval: float = 1.0, voice_seconds: float = 8.0,
+                     seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Builds a synthetic stream of Telegram updates. Voice notes are registered with
+    `world` so the fake Bot API can serve them and the fake Whisper can transcribe them.
+    `repeat_ratio` is the share of messages that repeat an earlier question verbatim.
+    Returns [{"at": offset or None, "update": {...}}].
+    """
+    rng = random.Random(seed)
+    weights = _parse_weights(languages)
+    names, values = list(weights), list(weights.values())
+    arrivals = _arrival_times(count, rng, rate, burst_size, burst_interval)
+    asked: List[tuple] = []
+    stream = []
+    for index in range(count):
+        user_id = 1000 + rng.randrange(users)
+        if asked and rng.random() < repeat_ratio:
+            language, question = rng.choice(asked)
+        else:
+            language = rng.choices(names, values)[0]
+            question = rng.choice(SAMPLE_QUESTIONS[language])
+            asked.append((language, question))
+        message = {
+            "message_id": index + 1,
+            "from": {"id": user_id, "is_bot": False},
+            "chat": {"id": user_id, "type": "private"},
+            "date": 0,
+        }
+        if rng.random() < voice_ratio:
+            file_id = f"bench_voice_{index}"
+            duration = max(1.0, rng.gauss(voice_seconds, voice_seconds / 3))
+            world.add_voice_note(file_id, question, language, duration)
+            message["voice"] = {"file_id": file_id, "duration": round(duration), "mime_type": "audio/ogg",
+                                "file_size": len(world.voice_notes[file_id]["data"])}
+        else:
+            message["text"] = question
+        stream.append({"at": arrivals[index], "update": {"update_id": 10_000 + index, "message": message}})
+    return stream
+
+def load_updates(world, path: str, rate: Optional[float] = None, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Replays recorded updates from a JSONL file (one Telegram update per line). A line
+    may carry a "bench" object with "at", and for voice notes "text", "language" and
+    "duration", describing what the fake services should return.
+    """
+    rng = random.Random(seed)
+    stream = []
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    arrivals = _arrival_times(len(lines), rng, rate, 1, 0.0)
+    for index, update in enumerate(lines):
+        extra = update.pop("bench", {})
+        voice = (update.get("message") or {}).get("voice")
+        if voice and voice["file_id"] not in world.voice_notes:
+            language = extra.get("language", "english")
+            world.add_voice_note(voice["file_id"], extra.get("text") or SAMPLE_QUESTIONS[language][0], language,
+                                 float(extra.get("duration") or voice.get("duration") or 5))
+        stream.append({"at": extra.get("at", arrivals[index]), "update": update})
+    return stream
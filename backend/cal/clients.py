@@ -0,0 +1,187 @@
+import json
+import logging
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils import tracing
+from app.utils.config import get_config
+
+# -----------------------------
+# ⏱️ PER-SERVICE TIMEOUTS (seconds)
+# -----------------------------
+TELEGRAM_TIMEOUT = (3.05, float(get_config("TELEGRAM_TIMEOUT", 20)))  # (connect, read)
+OPENAI_TIMEOUT = float(get_config("OPENAI_TIMEOUT", 30))
+OPENAI_MAX_RETRIES = int(get_config("OPENAI_MAX_RETRIES", 2))
+TTS_TIMEOUT = float(get_config("TTS_TIMEOUT", 15))
+SECRET_MANAGER_TIMEOUT = float(get_config("SECRET_MANAGER_TIMEOUT", 10))
+GCS_TIMEOUT = float(get_config("GCS_TIMEOUT", 30))
+HTTP_POOL_SIZE = int(get_config("HTTP_POOL_SIZE", 10))
+# Connections kept by the asyncio HTTP client; one instance can have dozens of requests in flight
+ASYNC_HTTP_POOL_SIZE = int(get_config("ASYNC_HTTP_POOL_SIZE", 50))
+
+# -----------------------------
+# 🔧 PROCESS-WIDE CLIENT REGISTRY
+# -----------------------------
+# Every client is built lazily on first use and then reused for the life of the
+# instance, so TLS handshakes, gRPC channels and credential parsing are paid once.
+# CLIENT_CONSTRUCTIONS counts how often each one was built; anything above 1 per
+# process means a per-request construction has crept back in.
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+CLIENT_CONSTRUCTIONS: Counter = Counter()
+
+def _get_or_create(name: str, factory: Callable[[], Any]) -> Any:
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            client = factory()
+            _clients[name] = client
+            CLIENT_CONSTRUCTIONS[name] += 1
+            logging.info(f"[clients] Constructed {name} client")
+        return client
+
+def set_client(name: str, client: Any):
+    """Registers a ready-made client under `name` (e.g. a local stand-in for benchmarks)."""
+    with _lock:
+        _clients[name] = client
+
+def reset_clients():
+    """Drops every cached client; the next accessor call rebuilds it."""
+    with _lock:
+        _clients.clear()
+
+def get_client_stats() -> Dict[str, int]:
+    """Returns how many times each client has been constructed in this process."""
+    with _lock:
+        return dict(CLIENT_CONSTRUCTIONS)
+
+tracing.metrics.register_provider("client_constructions", get_client_stats)
+
+# -----------------------------
+# 🏭 CLIENT FACTORIES
+# -----------------------------
+def _build_http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _build_openai_client():
+    from openai import DefaultHttpxClient, OpenAI
+    from cal.secrets import get_secret
+    # The request hook fires once per HTTP attempt, so SDK retries show up on the calling span
+    http_client = DefaultHttpxClient(event_hooks={"request": [tracing.count_attempt]})
+    return OpenAI(api_key=get_secret("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES,
+                  http_client=http_client)
+
+def _google_credentials():
+    from google.oauth2 import service_account
+    from cal.secrets import get_secret
+    creds = get_secret("GOOGLE_APPLICATION_CREDENTIALS")
+    if isinstance(creds, str):
+        service_account_info = json.loads(creds)
+    else:
+        service_account_info = creds
+
+    try:
+        credentials_object = service_account.Credentials.from_service_account_info(
+            service_account_info
+        )
+    except Exception as e:
+        # This catch is helpful for debugging bad JSON structure
+        raise ValueError(f"Failed to create Google Credentials object. Check JSON key format: {e}")
+    return credentials_object
+
+def _build_tts_client():
+    from google.cloud import texttospeech
+    return texttospeech.TextToSpeechClient(credentials=_google_credentials())
+
+def _build_secret_manager_client():
+    from google.cloud import secretmanager_v1
+    return secretmanager_v1.SecretManagerServiceClient()
+
+def _build_storage_client():
+    from google.cloud import storage
+    return storage.Client()
+
+def _build_firestore_client():
+    from google.cloud import firestore
+    return firestore.Client()
+
+# The asyncio clients hold connections tied to the event loop that first used them,
+# so they must be built (and used) from inside the server's single running loop.
+def _build_async_http_client():
+    import httpx
+    connect, read = TELEGRAM_TIMEOUT
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(read, connect=connect),
+        limits=httpx.Limits(max_connections=ASYNC_HTTP_POOL_SIZE, max_keepalive_connections=ASYNC_HTTP_POOL_SIZE),
+    )
+
+def _build_async_openai_client():
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    from cal.secrets import get_secret
+    http_client = DefaultAsyncHttpxClient(event_hooks={"request": [tracing.count_attempt_async]})
+    return AsyncOpenAI(api_key=get_secret("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES,
+                       http_client=http_client)
+
+def _build_async_tts_client():
+    from google.cloud import texttospeech
+    return texttospeech.TextToSpeechAsyncClient(credentials=_google_credentials())
+
+# -----------------------------
+# 🔌 ACCESSORS
+# -----------------------------
+def get_http_session() -> requests.Session:
+    """Keep-alive HTTP session with a connection pool, used for the Telegram Bot API."""
+    return _get_or_create("http", _build_http_session)
+
+def get_openai_client():
+    return _get_or_create("openai", _build_openai_client)
+
+def get_tts_client():
+    return _get_or_create("tts", _build_tts_client)
+
+def get_secret_manager_client():
+    return _get_or_create("secret_manager", _build_secret_manager_client)
+
+def get_storage_client():
+    return _get_or_create("storage", _build_storage_client)
+
+def get_firestore_db():
+    return _get_or_create("firestore", _build_firestore_client)
+
+def get_async_http_client():
+    """httpx.AsyncClient with a keep-alive pool, used for the Telegram Bot API by the asyncio pipeline."""
+    return _get_or_create("async_http", _build_async_http_client)
+
+def get_async_openai_client():
+    return _get_or_create("async_openai", _build_async_openai_client)
+
+def get_async_tts_client():
+    return _get_or_create("async_tts", _build_async_tts_client)
+
+ASYNC_CLIENTS = ("async_http", "async_openai", "async_tts")
+
+async def close_async_clients():
+    """Closes and drops the asyncio clients (on server shutdown, before the event loop goes away)."""
+    with _lock:
+        clients = [(name, _clients.pop(name)) for name in ASYNC_CLIENTS if name in _clients]
+    for name, client in clients:
+        try:
+            if hasattr(client, "aclose"):
+                await client.aclose()
+            elif hasattr(client, "close"):
+                await client.close()
+            elif hasattr(client, "transport"):
+                await client.transport.close()
+        except Exception as e:
+            logging.warning(f"[clients] Closing {name} client failed: {e}")
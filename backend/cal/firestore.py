@@ -1,13 +1,33 @@
 import logging
 import os
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Any, Optional, List
 
-# --- GUARANTEED IMPORTS ---
-# We assume these imports will not fail, even locally, 
-# because the module is installed in the virtual environment.
-from google.cloud import firestore
-from google.cloud.firestore import Client, DocumentReference, DocumentSnapshot, ArrayUnion, Increment, SERVER_TIMESTAMP
+from app.utils.config import get_config
+from app.utils import tracing
+from app.utils.tracing import traced
+from cal.clients import get_firestore_db
+from cal.log_buffer import FIRESTORE_MAX_BATCH, LogBuffer, register_shutdown_flush
+
+# google.cloud.firestore takes a large share of cold-start import time, so it (and
+# the local engine built on it) is imported by the functions that use it
+if TYPE_CHECKING:
+    from google.cloud.firestore import Client, DocumentReference, DocumentSnapshot
+    from cal.local_firestore import LocalFirestore
+
+_LOCAL_FIRESTORE_NAMES = {
+    "LocalCollection", "LocalDoc", "LocalDocSnapshot", "LocalFirestore",
+    "LocalTransaction", "LocalWriteBatch",
+}
+
+def __getattr__(name):
+    # Keeps `from cal.firestore import LocalDoc` (etc.) working without an eager import
+    if name in _LOCAL_FIRESTORE_NAMES:
+        from cal import local_firestore
+        return getattr(local_firestore, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- ENVIRONMENT CHECK (Placeholder) ---
 # Replace with your actual import path: from app.utils.env import is_local
@@ -15,106 +35,83 @@ def is_local():
     """Mocks your environment check."""
     return os.environ.get("ENV") == "local"
 
-# --- LOCAL MOCK DB ---
-# Mocks the top-level collections as Python dictionaries
-_local_db: Dict[str, Any] = {
-    "public_stats": {}, # Stores 'overall_summary' and 'week_YYYYMMDD' documents
-    "logs": {},         # Stores custom-named log documents
-}
+def transactional(fn):
+    """firestore.transactional, or the local mock's look-alike when running locally."""
+    if is_local():
+        from cal.local_firestore import transactional as local_transactional
+        return local_transactional(fn)
+    from google.cloud.firestore import transactional as cloud_transactional
+    return cloud_transactional(fn)
 
-# -----------------------------
-# 🔧 LOCAL MOCK DB IMPLEMENTATION
-# -----------------------------
-class LocalDocSnapshot:
-    """Mock for a Firestore DocumentSnapshot."""
-    def __init__(self, data: Dict):
-        # Handle the SERVER_TIMESTAMP field mock when reading
-        if data.get("date") == SERVER_TIMESTAMP:
-            data["date"] = datetime.now()
-        self._data = data
-
-    def to_dict(self) -> Dict:
-        """Returns the document data."""
-        return self._data
-
-    @property
-    def exists(self) -> bool:
-        """Mock for snapshot.exists."""
-        return bool(self._data) and self._data != {}
-
-class LocalDoc:
-    """Mock for a Firestore DocumentReference."""
-    def __init__(self, doc_id: str, parent_data: Dict):
-        self.id = doc_id
-        self._parent_data = parent_data
-        # Initialize an empty dict if the document ID doesn't exist yet
-        self._data = self._parent_data.setdefault(doc_id, {})
-
-    def get(self) -> LocalDocSnapshot:
-        """Mimics doc_ref.get()."""
-        return LocalDocSnapshot(self._data)
-
-    def set(self, new_data: Dict, merge: bool = False):
-        """
-        Mimics doc_ref.set(data, merge=...). 
-        Critically, it handles Firestore's native Increment/ArrayUnion/SERVER_TIMESTAMP objects.
-        """
-        current_data = self._data
-
-        for key, value in new_data.items():
-            if isinstance(value, Increment):
-                # Handle Increment using the actual imported Increment class
-                current_value = current_data.get(key, 0)
-                current_data[key] = current_value + value.value
-            
-            # NOTE: For language_distribution, the R-M-W logic in handle_new_interaction
-            # ensures we don't need a complex ArrayUnion mock here.
-            
-            elif merge:
-                current_data[key] = value
-            else:
-                # If not merging, just set the value
-                current_data[key] = value
-
-        if not merge: 
-            # If not merging, we clear existing data before updating.
-            # We preserve increment logic results, as they are implicitly merged.
-            temp_data = {}
-            for key, value in new_data.items():
-                 if not isinstance(value, Increment):
-                    temp_data[key] = value
-            
-            if temp_data:
-                self._data.clear()
-                self._data.update(temp_data)
-
-class LocalCollection:
-    """Mock for a Firestore CollectionReference."""
-    def __init__(self, name: str):
-        self.name = name
-        self._data: Dict = _local_db.setdefault(name, {})
-
-    def document(self, doc_id: str) -> LocalDoc:
-        """Mimics col_ref.document(doc_id)."""
-        return LocalDoc(doc_id, self._data)
-
-class LocalFirestore:
-    """Mock for the Firestore Client."""
-    def collection(self, name: str) -> LocalCollection:
-        """Mimics db.collection(name)."""
-        return LocalCollection(name)
+# --- LOCAL MOCK DB ---
+# In-memory engine with queries, batches and transactions (see cal/local_firestore.py).
+# Set LOCAL_FIRESTORE_SNAPSHOT to a file path to keep the data between runs.
+LOCAL_FIRESTORE_SNAPSHOT = get_config("LOCAL_FIRESTORE_SNAPSHOT", "")
+_local_client: Optional["LocalFirestore"] = None
+_local_client_lock = threading.Lock()
 
 # -----------------------------
 # 🔧 GET FIRESTORE CLIENT
 # -----------------------------
 def get_firestore_client() -> 'Client | LocalFirestore':
     """Get the appropriate Firestore client (Cloud or Local Mock)."""
+    global _local_client
     if is_local():
-        print("Using Local Mock Firestore.")
-        return LocalFirestore()
+        with _local_client_lock:
+            if _local_client is None:
+                from cal.local_firestore import LocalFirestore
+                _local_client = LocalFirestore(snapshot_path=LOCAL_FIRESTORE_SNAPSHOT or None)
+            return _local_client
     
-    # Cloud environment: use the official client
-    return firestore.Client()
+    # Cloud environment: use the process-wide official client
+    return get_firestore_db()
+
+# -----------------------------
+# 📝 WRITE-BEHIND LOG BUFFER
+# -----------------------------
+# "sync" writes each log document on the request path; "buffered" hands it to a
+# LogBuffer that commits in batches of up to 500 off the request path
+LOG_WRITE_MODE = get_config("LOG_WRITE_MODE", "sync")
+_log_buffer: Optional[LogBuffer] = None
+_log_buffer_lock = threading.Lock()
+
+@traced("firestore.commit_log_batch")
+def commit_log_batch(entries: List[tuple]):
+    """Writes (doc_id, data) log entries to the logs collection in a single batch commit."""
+    db = get_firestore_client()
+    logs = db.collection("logs")
+    batch = db.batch()
+    for doc_id, data in entries:
+        batch.set(logs.document(doc_id), data)
+    batch.commit()
+
+def get_log_buffer(on_sigterm: bool = True) -> LogBuffer:
+    """Returns the process-wide log buffer, starting it (and its shutdown hooks) on first use."""
+    global _log_buffer
+    with _log_buffer_lock:
+        if _log_buffer is None:
+            _log_buffer = LogBuffer(commit_log_batch)
+            register_shutdown_flush(_log_buffer, on_sigterm=on_sigterm)
+        return _log_buffer
+
+def start_log_buffer(on_sigterm: bool = True) -> Optional[LogBuffer]:
+    """
+    Starts the log buffer up front when LOG_WRITE_MODE is "buffered". Call it at
+    import time on the main thread, the only one where its SIGTERM flush can be
+    installed; starting it also replays entries spilled by a previous buffer.
+    """
+    if LOG_WRITE_MODE != "buffered":
+        return None
+    return get_log_buffer(on_sigterm=on_sigterm)
+
+def flush_log_buffer():
+    """
+    Writes the buffered log entries now (a no-op unless the buffer was started).
+    The entry points call it at the end of each request, since Cloud Functions
+    gives the age-based flush no CPU between requests.
+    """
+    if _log_buffer is not None:
+        _log_buffer.flush()
 
 # -----------------------------
 # 📅 DATE UTILITY
@@ -176,11 +173,216 @@ def set_weekly_stats(week_start_date_str: str, data: Dict[str, Any], merge: bool
     doc_ref: DocumentReference = db.collection("public_stats").document(doc_id)
     doc_ref.set(data, merge=merge)
 
+# --- PUBLIC_STATS: dashboard read model ---
+# public_stats/dashboard holds the overall totals and the last DASHBOARD_WEEKS weeks
+# in one document, so the dashboard loads with a single read however much history
+# exists. It is kept current by the same batched Increments as the stats documents:
+#   {"overall": {counters}, "weeks": {"week_YYYYMMDD": {"week_start_date", counters}}, "built_at"}
+# where counters are interactions, voice, active_users and lang_counts. Readers only
+# trust it once rebuild_dashboard has set built_at (Increments may arrive earlier).
+# The scheduled roll-up (main.rollup_stats) builds it and prunes old weeks.
+DASHBOARD_READ_MODEL = bool(get_config("DASHBOARD_READ_MODEL", False))
+DASHBOARD_DOC_ID = "dashboard"
+DASHBOARD_WEEKS = int(get_config("DASHBOARD_WEEKS", 52))
+
+# --- PUBLIC_STATS: contention-free counters ---
+def _interaction_counters(lang: str, is_voice: bool) -> Dict[str, Any]:
+    """Field updates for one interaction; every counter is a server-side Increment."""
+    from google.cloud.firestore import Increment
+    voice = 1 if is_voice else 0
+    return {
+        "interactions": Increment(1),
+        "voice": Increment(voice),
+        # Per-language counters live in a map so no read-modify-write of an array is needed
+        "lang_counts": {lang: {"interactions": Increment(1), "voice": Increment(voice)}},
+    }
+
+# --- USERS COLLECTION (ID: Telegram user_id) ---
+# Created on a user's first interaction, in the same batch as the stats, so
+# active_users is incremented exactly once per user across instances. Users this
+# instance has already seen skip the create.
+KNOWN_USERS_CACHE_SIZE = int(get_config("KNOWN_USERS_CACHE_SIZE", 10000))
+_known_users: "OrderedDict[str, bool]" = OrderedDict()
+_known_users_lock = threading.Lock()
+
+def _is_known_user(user_id: str) -> bool:
+    with _known_users_lock:
+        if user_id in _known_users:
+            _known_users.move_to_end(user_id)
+            return True
+        return False
+
+def _remember_user(user_id: str):
+    with _known_users_lock:
+        _known_users[user_id] = True
+        while len(_known_users) > KNOWN_USERS_CACHE_SIZE:
+            _known_users.popitem(last=False)
+
+def _commit_stats(db: "Client", week_start_date_str: str, lang: str, is_voice: bool,
+                  is_new_user: bool, new_user_id: Optional[str] = None):
+    from google.cloud.firestore import Increment
+    stats = db.collection("public_stats")
+    weekly_updates = _interaction_counters(lang, is_voice)
+    weekly_updates["week_start_date"] = week_start_date_str
+    overall_updates = _interaction_counters(lang, is_voice)
+    if is_new_user:
+        weekly_updates["active_users"] = Increment(1)
+        overall_updates["active_users"] = Increment(1)
+
+    batch = db.batch()
+    if new_user_id is not None:
+        # Fails the whole batch with AlreadyExists if another instance has seen the user
+        batch.create(db.collection("users").document(new_user_id), {"first_seen_week": week_start_date_str})
+    batch.set(stats.document(f"week_{week_start_date_str}"), weekly_updates, merge=True)
+    batch.set(stats.document("overall_summary"), overall_updates, merge=True)
+    if DASHBOARD_READ_MODEL:
+        dashboard_updates = {
+            "overall": overall_updates,
+            "weeks": {f"week_{week_start_date_str}": weekly_updates},
+        }
+        batch.set(stats.document(DASHBOARD_DOC_ID), dashboard_updates, merge=True)
+    batch.commit()
+
+@traced("firestore.record_stats")
+def record_interaction_stats(week_start_date_str: str, lang: str, is_voice: bool, is_new_user: bool = False,
+                             user_id: Optional[str] = None):
+    """
+    Updates the weekly and overall stats for one interaction in a single batched
+    write. No reads are needed, and concurrent instances never overwrite each
+    other because every counter is an Increment.
+    With user_id, whether the user is new is decided by creating users/<user_id>
+    in the same batch; is_new_user is then ignored.
+    """
+    db = get_firestore_client()
+    lang = lang or "unknown"
+    if user_id is None:
+        _commit_stats(db, week_start_date_str, lang, is_voice, is_new_user)
+        return
+    user_id = str(user_id)
+    if _is_known_user(user_id):
+        _commit_stats(db, week_start_date_str, lang, is_voice, False)
+        return
+    from google.api_core.exceptions import AlreadyExists
+    try:
+        _commit_stats(db, week_start_date_str, lang, is_voice, True, new_user_id=user_id)
+    except AlreadyExists:
+        _commit_stats(db, week_start_date_str, lang, is_voice, False)
+    _remember_user(user_id)
+
+def _build_language_distribution(base: List[Dict[str, Any]], lang_counts: Dict[str, Dict[str, int]]) -> List[Dict[str, Any]]:
+    """Combines the pre-migration array with the lang_counts map into the array shape the dashboard reads."""
+    totals: Dict[str, Dict[str, int]] = {}
+    for item in base:
+        entry = totals.setdefault(item.get("lang"), {"interactions": 0, "voice": 0})
+        entry["interactions"] += item.get("interactions", 0)
+        entry["voice"] += item.get("voice", 0)
+    for lang, counts in lang_counts.items():
+        entry = totals.setdefault(lang, {"interactions": 0, "voice": 0})
+        entry["interactions"] += counts.get("interactions", 0)
+        entry["voice"] += counts.get("voice", 0)
+    distribution = [{"lang": lang, **counts} for lang, counts in totals.items()]
+    return sorted(distribution, key=lambda item: item["interactions"], reverse=True)
+
+def rollup_language_distribution() -> int:
+    """
+    Periodic roll-up: rewrites `language_distribution` on every public_stats document
+    from its `lang_counts` map. Counts recorded before the map existed are kept once
+    in `language_distribution_base`. Commits in batches of at most 500 writes.
+    Returns the number of documents rolled up.
+    """
+    db = get_firestore_client()
+    stats = db.collection("public_stats")
+    batch = db.batch()
+    pending = 0
+    rolled_up = 0
+    for snapshot in stats.stream():
+        data = snapshot.to_dict() or {}
+        if "lang_counts" not in data or snapshot.id == DASHBOARD_DOC_ID:
+            continue
+        updates: Dict[str, Any] = {}
+        base = data.get("language_distribution_base")
+        if base is None:
+            base = data.get("language_distribution", [])
+            updates["language_distribution_base"] = base
+        updates["language_distribution"] = _build_language_distribution(base, data["lang_counts"])
+        batch.set(stats.document(snapshot.id), updates, merge=True)
+        pending += 1
+        rolled_up += 1
+        if pending == FIRESTORE_MAX_BATCH:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    logging.info(f"[rollup] Rolled up language_distribution for {rolled_up} documents")
+    return rolled_up
+
+def _dashboard_counters(data: Dict[str, Any]) -> Dict[str, Any]:
+    """A stats document's totals as dashboard counters (lang_counts include pre-migration counts)."""
+    base = data.get("language_distribution_base", data.get("language_distribution", []))
+    distribution = _build_language_distribution(base, data.get("lang_counts", {}))
+    return {
+        "interactions": data.get("interactions", 0),
+        "voice": data.get("voice", 0),
+        "active_users": data.get("active_users", 0),
+        "lang_counts": {item["lang"]: {"interactions": item["interactions"], "voice": item["voice"]} for item in distribution},
+    }
+
+def rebuild_dashboard(weeks: int = DASHBOARD_WEEKS) -> int:
+    """
+    Rebuilds public_stats/dashboard from overall_summary and the newest `weeks` week
+    documents, all read in one transaction so the snapshot is consistent and
+    Increments recorded meanwhile are not lost. Run once when enabling
+    DASHBOARD_READ_MODEL. Returns the number of weeks written.
+    """
+    from google.cloud.firestore import SERVER_TIMESTAMP
+    db = get_firestore_client()
+    stats = db.collection("public_stats")
+    # Only week documents carry week_start_date, and its YYYYMMDD value sorts by date
+    newest = stats.order_by("week_start_date", direction="DESCENDING").limit(weeks)
+
+    def rebuild(transaction):
+        overall = transaction.get(stats.document("overall_summary")).to_dict() or {}
+        week_docs = {snapshot.id: snapshot.to_dict() or {} for snapshot in transaction.get(newest)}
+        transaction.set(stats.document(DASHBOARD_DOC_ID), {
+            "overall": _dashboard_counters(overall),
+            "weeks": {
+                week_id: {"week_start_date": data["week_start_date"], **_dashboard_counters(data)}
+                for week_id, data in week_docs.items()
+            },
+            "built_at": SERVER_TIMESTAMP,
+        })
+        return len(week_docs)
+
+    rebuilt = transactional(rebuild)(db.transaction())
+    logging.info(f"[dashboard] Rebuilt the dashboard document with {rebuilt} weeks")
+    return rebuilt
+
+def prune_dashboard(weeks: int = DASHBOARD_WEEKS) -> int:
+    """Drops weeks older than the newest `weeks` from the dashboard document. Returns how many were dropped."""
+    from google.cloud.firestore import DELETE_FIELD
+    db = get_firestore_client()
+    doc_ref = db.collection("public_stats").document(DASHBOARD_DOC_ID)
+    snapshot = doc_ref.get()
+    if not snapshot.exists:
+        return 0
+    stale = sorted((snapshot.to_dict() or {}).get("weeks", {}), reverse=True)[weeks:]
+    if stale:
+        doc_ref.update({f"weeks.{week_id}": DELETE_FIELD for week_id in stale})
+        logging.info(f"[dashboard] Pruned {len(stale)} weeks from the dashboard document")
+    return len(stale)
+
+def maintain_dashboard(weeks: int = DASHBOARD_WEEKS) -> Dict[str, int]:
+    """Periodic job: builds the dashboard document if it was never built, otherwise prunes old weeks."""
+    db = get_firestore_client()
+    snapshot = db.collection("public_stats").document(DASHBOARD_DOC_ID).get()
+    if not snapshot.exists or "built_at" not in (snapshot.to_dict() or {}):
+        return {"rebuilt_weeks": rebuild_dashboard(weeks)}
+    return {"pruned_weeks": prune_dashboard(weeks)}
+
 # --- LOGS COLLECTION (Custom ID: <YYYMMDD><HHMMSS>_<user_id>) ---
 def log_interaction(entry: Dict[str, Any]):
-    logging.info("log_interaction entry point")
-    db = get_firestore_client()
-    logging.info(f"[log_interaction] entry: {entry}")
+    # Entries carry the user's question and the reply; only ids are logged
     user_id = entry.get('user_id')
     timestamp = entry.get('date')
     if not user_id or not timestamp:
@@ -189,11 +391,97 @@ def log_interaction(entry: Dict[str, Any]):
     entry.pop('date')
     log_doc_id = generate_log_doc_id(user_id, timestamp)
     entry_for_db = entry.copy()
+
+    if LOG_WRITE_MODE == "buffered":
+        # The write may land seconds later, so keep the interaction time rather than SERVER_TIMESTAMP
+        entry_for_db["date"] = timestamp
+        get_log_buffer().add(log_doc_id, entry_for_db)
+        logging.debug(f"[log_interaction] Buffered log {log_doc_id}")
+        return
+
+    from google.cloud.firestore import SERVER_TIMESTAMP
     entry_for_db["date"] = SERVER_TIMESTAMP
-    logging.info(f"[log_interaction] Writing to logs/{log_doc_id}: {entry_for_db}")
+    db = get_firestore_client()
     doc_ref: DocumentReference = db.collection("logs").document(log_doc_id)
     try:
-        doc_ref.set(entry_for_db)
-        logging.info(f"[log_interaction] Successfully wrote log {log_doc_id}")
+        with tracing.span("firestore.log_interaction"):
+            doc_ref.set(entry_for_db)
+        logging.debug(f"[log_interaction] Successfully wrote log {log_doc_id}")
     except Exception as e:
-        logging.error(f"[log_interaction] Error writing log: {e}")
+        logging.error(f"[log_interaction] Error writing log {log_doc_id}: {e}")
+
+# --- PROCESSED_UPDATES COLLECTION (ID: Telegram update_id) ---
+# Claims carry expire_at for the collection's TTL policy (infra/telegram.tf). Telegram
+# gives up redelivering an update after 24 hours, so older claims are dead weight.
+PROCESSED_UPDATE_TTL_HOURS = int(get_config("PROCESSED_UPDATE_TTL_HOURS", 48))
+
+@traced("firestore.claim_update")
+def claim_update_id(update_id: int) -> bool:
+    """
+    Atomically records that an update is being processed.
+    Returns False if another request or instance has already claimed it.
+    """
+    from google.api_core.exceptions import AlreadyExists
+    from google.cloud.firestore import SERVER_TIMESTAMP
+    db = get_firestore_client()
+    doc_ref: DocumentReference = db.collection("processed_updates").document(str(update_id))
+    try:
+        doc_ref.create({
+            "claimed_at": SERVER_TIMESTAMP,
+            "expire_at": datetime.now(timezone.utc) + timedelta(hours=PROCESSED_UPDATE_TTL_HOURS),
+        })
+        return True
+    except AlreadyExists:
+        return False
+
+def release_update_id(update_id: int):
+    """Removes a claim so a failed update can be processed again on redelivery."""
+    db = get_firestore_client()
+    db.collection("processed_updates").document(str(update_id)).delete()
+
+# --- CONVERSATIONS COLLECTION (ID: Telegram user_id) ---
+@traced("firestore.get_conversation")
+def get_conversation(user_id: str) -> Dict[str, Any]:
+    """Retrieves a user's conversation history document ({} if there is none)."""
+    db = get_firestore_client()
+    snapshot: DocumentSnapshot = db.collection("conversations").document(str(user_id)).get()
+    return snapshot.to_dict() if snapshot.exists else {}
+
+# Both updates are read-modify-writes in a transaction, so two instances answering the
+# same user at once can't overwrite each other's turns.
+@traced("firestore.append_conversation_turns")
+def append_conversation_turns(user_id: str, turns: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Appends turns to a user's conversation history; returns the updated document."""
+    db = get_firestore_client()
+    ref = db.collection("conversations").document(str(user_id))
+
+    def append(transaction):
+        snapshot = ref.get(transaction=transaction)
+        stored = snapshot.to_dict() if snapshot.exists else {}
+        data = {"summary": stored.get("summary", ""), "turns": list(stored.get("turns", [])) + list(turns)}
+        transaction.set(ref, data)
+        return data
+
+    return transactional(append)(db.transaction())
+
+@traced("firestore.compact_conversation")
+def compact_conversation(user_id: str, previous_summary: str, folded_turns: List[Dict[str, str]],
+                         summary: str) -> Optional[Dict[str, Any]]:
+    """
+    Replaces the leading `folded_turns` (and `previous_summary`) with `summary`.
+    Returns the updated document, or None if another writer compacted meanwhile.
+    """
+    db = get_firestore_client()
+    ref = db.collection("conversations").document(str(user_id))
+
+    def compact(transaction):
+        snapshot = ref.get(transaction=transaction)
+        stored = snapshot.to_dict() if snapshot.exists else {}
+        turns = list(stored.get("turns", []))
+        if stored.get("summary", "") != previous_summary or turns[:len(folded_turns)] != folded_turns:
+            return None
+        data = {"summary": summary, "turns": turns[len(folded_turns):]}
+        transaction.set(ref, data)
+        return data
+
+    return transactional(compact)(db.transaction())
@@ -0,0 +1,884 @@
+import atexit
+import base64
+import bisect
+import copy
+import json
+import logging
+import os
+import random
+import string
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists, Aborted, InvalidArgument, NotFound
+from google.cloud.firestore import (
+    ArrayRemove,
+    ArrayUnion,
+    DELETE_FIELD,
+    Increment,
+    Maximum,
+    Minimum,
+    SERVER_TIMESTAMP,
+)
+from google.cloud import firestore
+
+FIRESTORE_MAX_BATCH = 500
+DOCUMENT_ID = "__name__"  # FieldPath.document_id()
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+TRANSACTION_MAX_ATTEMPTS = 5
+
+# -----------------------------
+# 🔢 VALUE ORDERING
+# -----------------------------
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def sort_key(value: Any) -> Tuple:
+    """
+    Total order over Firestore values: null < bool < number < timestamp < string
+    < bytes < reference < array < map, then by value within a type.
+    """
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, _timestamp(value))
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, (bytes, bytearray)):
+        return (5, bytes(value))
+    if isinstance(value, LocalDoc):
+        return (6, value.path)
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(sort_key(item) for item in value))
+    if isinstance(value, dict):
+        return (9, tuple(sorted((key, sort_key(item)) for key, item in value.items())))
+    return (10, repr(value))
+
+_MISSING = object()
+
+def _split_path(field_path: str) -> List[str]:
+    return [part.strip("`") for part in field_path.split(".")]
+
+def get_field(data: Dict[str, Any], field_path: str, doc_id: Optional[str] = None) -> Any:
+    """Reads a dotted field path; returns _MISSING if any segment is absent."""
+    if field_path == DOCUMENT_ID:
+        return doc_id
+    value: Any = data
+    for part in _split_path(field_path):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+# -----------------------------
+# ✍️ WRITE SEMANTICS
+# -----------------------------
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _is_transform(value: Any) -> bool:
+    return isinstance(value, (Increment, ArrayUnion, ArrayRemove, Maximum, Minimum)) or value is SERVER_TIMESTAMP
+
+def _apply_value(current: Any, value: Any, now: datetime) -> Any:
+    """Resolves a field value against the stored one, applying server-side transforms."""
+    if value is SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, Maximum):
+        return value.value if not isinstance(current, (int, float)) else max(current, value.value)
+    if isinstance(value, Minimum):
+        return value.value if not isinstance(current, (int, float)) else min(current, value.value)
+    if isinstance(value, ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        keys = [sort_key(item) for item in result]
+        for item in value.values:
+            if sort_key(item) not in keys:
+                result.append(copy.deepcopy(item))
+                keys.append(sort_key(item))
+        return result
+    if isinstance(value, ArrayRemove):
+        removed = {sort_key(item) for item in value.values}
+        return [item for item in current if sort_key(item) not in removed] if isinstance(current, list) else []
+    if isinstance(value, dict):
+        return {key: _apply_value(None, item, now) for key, item in value.items() if item is not DELETE_FIELD}
+    return copy.deepcopy(value)
+
+def _merge_into(target: Dict[str, Any], data: Dict[str, Any], now: datetime):
+    """set(..., merge=True): map fields merge key by key, DELETE_FIELD removes the key."""
+    for key, value in data.items():
+        if value is DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and not _is_transform(value):
+            nested = target.get(key)
+            if not isinstance(nested, dict):
+                nested = {}
+                target[key] = nested
+            _merge_into(nested, value, now)
+        else:
+            target[key] = _apply_value(target.get(key), value, now)
+
+def _set_path(target: Dict[str, Any], field_path: str, value: Any, now: datetime):
+    """update(): dotted keys address nested fields; intermediate maps are created as needed."""
+    parts = _split_path(field_path)
+    for part in parts[:-1]:
+        nested = target.get(part)
+        if not isinstance(nested, dict):
+            if value is DELETE_FIELD:
+                return
+            nested = {}
+            target[part] = nested
+        target = nested
+    if value is DELETE_FIELD:
+        target.pop(parts[-1], None)
+    else:
+        target[parts[-1]] = _apply_value(target.get(parts[-1]), value, now)
+
+def _check_no_delete(data: Dict[str, Any]):
+    for value in data.values():
+        if value is DELETE_FIELD:
+            raise ValueError("DELETE_FIELD is only allowed with update() or set(..., merge=True)")
+        if isinstance(value, dict):
+            _check_no_delete(value)
+
+# -----------------------------
+# 🗂️ PER-FIELD INDEXES
+# -----------------------------
+class _FieldIndex:
+    """Sorted (sort_key(value), doc_id) entries for one field of one collection."""
+    def __init__(self):
+        self.entries: List[Tuple[Tuple, str]] = []
+        self.array_members: Dict[Tuple, set] = {}
+
+    def add(self, doc_id: str, value: Any):
+        if value is _MISSING:
+            return
+        bisect.insort(self.entries, (sort_key(value), doc_id))
+        if isinstance(value, list):
+            for item in value:
+                self.array_members.setdefault(sort_key(item), set()).add(doc_id)
+
+    def remove(self, doc_id: str, value: Any):
+        if value is _MISSING:
+            return
+        entry = (sort_key(value), doc_id)
+        position = bisect.bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+        if isinstance(value, list):
+            for item in value:
+                members = self.array_members.get(sort_key(item))
+                if members is not None:
+                    members.discard(doc_id)
+
+    def equal(self, value: Any) -> List[str]:
+        key = sort_key(value)
+        lo = bisect.bisect_left(self.entries, (key,))
+        hi = bisect.bisect_left(self.entries, (key, "\U0010ffff"))
+        return [doc_id for _, doc_id in self.entries[lo:hi]]
+
+    def range(self, op: str, value: Any) -> List[str]:
+        """Ids whose value compares to `value` with `op`, restricted to values of the same type."""
+        key = sort_key(value)
+        type_lo = bisect.bisect_left(self.entries, ((key[0],),))
+        type_hi = bisect.bisect_left(self.entries, ((key[0] + 1,),))
+        if op in (">", ">="):
+            lo = bisect.bisect_left(self.entries, (key,)) if op == ">=" else bisect.bisect_left(self.entries, (key, "\U0010ffff"))
+            lo, hi = max(lo, type_lo), type_hi
+        else:
+            hi = bisect.bisect_left(self.entries, (key, "\U0010ffff")) if op == "<=" else bisect.bisect_left(self.entries, (key,))
+            lo, hi = type_lo, min(hi, type_hi)
+        return [doc_id for _, doc_id in self.entries[lo:hi]]
+
+    def contains(self, value: Any) -> set:
+        return set(self.array_members.get(sort_key(value), ()))
+
+# -----------------------------
+# 🧠 STORE
+# -----------------------------
+class _StoredDoc:
+    __slots__ = ("data", "create_time", "update_time", "version")
+
+    def __init__(self, data: Dict[str, Any], create_time: datetime, update_time: datetime, version: int):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.version = version
+
+class LocalStore:
+    """
+    The data behind LocalFirestore: collections keyed by path, each a dict of
+    documents carrying a version for optimistic concurrency. One re-entrant lock
+    makes every read and every (batched) write atomic. Field indexes are built on
+    first use by a query and kept up to date by every write afterwards.
+    `request_hook(kind)`, if given, runs before every simulated RPC ("get", "query",
+    "commit") outside the lock, e.g. to add network latency in benchmarks.
+    """
+    def __init__(self, request_hook: Optional[Callable[[str], None]] = None):
+        self.request_hook = request_hook
+        self.lock = threading.RLock()
+        self.collections: Dict[str, Dict[str, _StoredDoc]] = {}
+        self.indexes: Dict[str, Dict[str, _FieldIndex]] = {}
+        self._version = 0
+
+    def rpc(self, kind: str):
+        if self.request_hook is not None:
+            self.request_hook(kind)
+
+    def next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    def index(self, collection_path: str, field_path: str) -> _FieldIndex:
+        indexes = self.indexes.setdefault(collection_path, {})
+        index = indexes.get(field_path)
+        if index is None:
+            index = _FieldIndex()
+            for doc_id, doc in self.collections.get(collection_path, {}).items():
+                index.add(doc_id, get_field(doc.data, field_path))
+            indexes[field_path] = index
+        return index
+
+    def put(self, collection_path: str, doc_id: str, data: Optional[Dict[str, Any]], now: datetime):
+        """Stores a new version of a document (None deletes it) and updates the indexes."""
+        docs = self.collections.setdefault(collection_path, {})
+        old = docs.get(doc_id)
+        for field_path, index in self.indexes.get(collection_path, {}).items():
+            if old is not None:
+                index.remove(doc_id, get_field(old.data, field_path))
+            if data is not None:
+                index.add(doc_id, get_field(data, field_path))
+        if data is None:
+            docs.pop(doc_id, None)
+        else:
+            create_time = old.create_time if old is not None else now
+            docs[doc_id] = _StoredDoc(data, create_time, now, self.next_version())
+
+    def version(self, collection_path: str, doc_id: str) -> int:
+        doc = self.collections.get(collection_path, {}).get(doc_id)
+        return doc.version if doc is not None else 0
+
+    # --- snapshot persistence ---
+    def dump(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                path: {doc_id: _encode(doc.data) for doc_id, doc in docs.items()}
+                for path, docs in self.collections.items()
+            }
+
+    def load(self, snapshot: Dict[str, Any]):
+        now = _now()
+        with self.lock:
+            self.collections.clear()
+            self.indexes.clear()
+            for path, docs in snapshot.items():
+                for doc_id, data in docs.items():
+                    self.put(path, doc_id, _decode(data), now)
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, LocalDoc):
+        return {"__ref__": value.path}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "__datetime__" in value:
+            return datetime.fromisoformat(value["__datetime__"])
+        if "__bytes__" in value:
+            return base64.b64decode(value["__bytes__"])
+        if "__ref__" in value:
+            return value["__ref__"]  # References come back as their path
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+# -----------------------------
+# 📄 DOCUMENTS
+# -----------------------------
+class LocalDocSnapshot:
+    """Mock for a Firestore DocumentSnapshot: an immutable copy of a document at read time."""
+    def __init__(self, data: Optional[Dict], doc_id: Optional[str] = None, reference: Optional["LocalDoc"] = None,
+                 exists: Optional[bool] = None, create_time: Optional[datetime] = None,
+                 update_time: Optional[datetime] = None):
+        self.id = doc_id
+        self.reference = reference
+        self.create_time = create_time
+        self.update_time = update_time
+        self._data = data
+        self._exists = bool(data) if exists is None else exists
+
+    def to_dict(self) -> Optional[Dict]:
+        """Returns the document data (None if the document does not exist)."""
+        return copy.deepcopy(self._data) if self._exists else None
+
+    def get(self, field_path: str) -> Any:
+        """Mimics snapshot.get("a.b"); raises KeyError for a missing field."""
+        value = get_field(self._data or {}, field_path, self.id)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+    @property
+    def exists(self) -> bool:
+        return self._exists
+
+def _snapshot(store: LocalStore, reference: "LocalDoc", doc: Optional[_StoredDoc]) -> LocalDocSnapshot:
+    if doc is None:
+        return LocalDocSnapshot(None, reference.id, reference, exists=False)
+    return LocalDocSnapshot(copy.deepcopy(doc.data), reference.id, reference, exists=True,
+                            create_time=doc.create_time, update_time=doc.update_time)
+
+class LocalDoc:
+    """Mock for a Firestore DocumentReference."""
+    def __init__(self, store: LocalStore, collection_path: str, doc_id: str):
+        self._store = store
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self) -> "LocalCollection":
+        return LocalCollection(self._store, self._collection_path)
+
+    def collection(self, name: str) -> "LocalCollection":
+        """Mimics doc_ref.collection(name) for subcollections."""
+        return LocalCollection(self._store, f"{self.path}/{name}")
+
+    def __eq__(self, other):
+        return isinstance(other, LocalDoc) and other.path == self.path and other._store is self._store
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def _read(self) -> Optional[_StoredDoc]:
+        return self._store.collections.get(self._collection_path, {}).get(self.id)
+
+    def get(self, field_paths=None, transaction: Optional["LocalTransaction"] = None) -> LocalDocSnapshot:
+        """Mimics doc_ref.get(); inside a transaction the read is tracked for conflicts."""
+        if transaction is not None:
+            return transaction.get(self)
+        self._store.rpc("get")
+        with self._store.lock:
+            return _snapshot(self._store, self, self._read())
+
+    # Writes go through a one-operation batch so they share the batch semantics
+    def create(self, document_data: Dict):
+        """Mimics doc_ref.create(data): fails with AlreadyExists if the document exists."""
+        batch = LocalWriteBatch(self._store)
+        batch.create(self, document_data)
+        return batch.commit()[0]
+
+    def set(self, document_data: Dict, merge=False):
+        """Mimics doc_ref.set(data, merge=...); merge may also be a list of field paths."""
+        batch = LocalWriteBatch(self._store)
+        batch.set(self, document_data, merge=merge)
+        return batch.commit()[0]
+
+    def update(self, field_updates: Dict):
+        """Mimics doc_ref.update(): dotted keys are field paths; fails with NotFound if missing."""
+        batch = LocalWriteBatch(self._store)
+        batch.update(self, field_updates)
+        return batch.commit()[0]
+
+    def delete(self):
+        """Mimics doc_ref.delete(); deleting a missing document is not an error."""
+        batch = LocalWriteBatch(self._store)
+        batch.delete(self)
+        return batch.commit()[0]
+
+# -----------------------------
+# 📦 WRITE BATCHES
+# -----------------------------
+class LocalWriteResult:
+    def __init__(self, update_time: datetime):
+        self.update_time = update_time
+
+class LocalWriteBatch:
+    """
+    Mock for a Firestore WriteBatch: queues writes and applies all of them atomically
+    on commit(). Preconditions (create on an existing document, update on a missing
+    one) fail the whole batch, and at most 500 writes are accepted, like Firestore.
+    """
+    def __init__(self, store: LocalStore):
+        self._store = store
+        self._writes: List[Tuple[str, LocalDoc, Any, Any]] = []
+
+    def _add(self, kind: str, reference: LocalDoc, data: Any = None, option: Any = None):
+        self._writes.append((kind, reference, data, option))
+
+    def create(self, reference: LocalDoc, document_data: Dict):
+        _check_no_delete(document_data)
+        self._add("create", reference, document_data)
+
+    def set(self, reference: LocalDoc, document_data: Dict, merge=False):
+        if not merge:
+            _check_no_delete(document_data)
+        self._add("set", reference, document_data, merge)
+
+    def update(self, reference: LocalDoc, field_updates: Dict):
+        self._add("update", reference, field_updates)
+
+    def delete(self, reference: LocalDoc):
+        self._add("delete", reference)
+
+    def __len__(self):
+        return len(self._writes)
+
+    def _check_and_apply(self, check: Optional[Callable[[], None]] = None) -> List[LocalWriteResult]:
+        if len(self._writes) > FIRESTORE_MAX_BATCH:
+            raise InvalidArgument(f"maximum {FIRESTORE_MAX_BATCH} writes allowed per request")
+        store = self._store
+        store.rpc("commit")
+        now = _now()
+        with store.lock:
+            if check is not None:
+                check()
+            # Resolve every write against a working copy first so a failing precondition changes nothing
+            pending: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+            for kind, reference, data, option in self._writes:
+                key = (reference._collection_path, reference.id)
+                if key in pending:
+                    current = pending[key]
+                else:
+                    stored = reference._read()
+                    current = copy.deepcopy(stored.data) if stored is not None else None
+                if kind == "create":
+                    if current is not None:
+                        raise AlreadyExists(f"Document already exists: {reference.path}")
+                    new = _apply_value(None, data, now)
+                elif kind == "set":
+                    if option is True:
+                        new = current if current is not None else {}
+                        _merge_into(new, data, now)
+                    elif option:
+                        # merge=[field paths]: only the listed fields are written
+                        new = current if current is not None else {}
+                        for field_path in option:
+                            value = get_field(data, field_path)
+                            _set_path(new, field_path, DELETE_FIELD if value is _MISSING else value, now)
+                    else:
+                        # Without merge the document is replaced; transforms start from empty fields
+                        new = _apply_value(None, data, now)
+                elif kind == "update":
+                    if current is None:
+                        raise NotFound(f"No document to update: {reference.path}")
+                    new = current
+                    for field_path, value in data.items():
+                        _set_path(new, field_path, value, now)
+                else:
+                    new = None
+                pending[key] = new
+            for (collection_path, doc_id), data in pending.items():
+                store.put(collection_path, doc_id, data, now)
+        self._writes = []
+        return [LocalWriteResult(now) for _ in pending]
+
+    def commit(self) -> List[LocalWriteResult]:
+        return self._check_and_apply()
+
+# -----------------------------
+# 🔍 QUERIES
+# -----------------------------
+def _matches(value: Any, op: str, operand: Any) -> bool:
+    if op == "==":
+        return value is not _MISSING and sort_key(value) == sort_key(operand)
+    if op == "!=":
+        return value is not _MISSING and value is not None and sort_key(value) != sort_key(operand)
+    if op == "in":
+        return value is not _MISSING and sort_key(value) in {sort_key(item) for item in operand}
+    if op == "not-in":
+        return value is not _MISSING and value is not None and sort_key(value) not in {sort_key(item) for item in operand}
+    if op == "array-contains":
+        return isinstance(value, list) and sort_key(operand) in {sort_key(item) for item in value}
+    if op == "array-contains-any":
+        return isinstance(value, list) and bool({sort_key(item) for item in value} & {sort_key(item) for item in operand})
+    if value is _MISSING:
+        return False
+    left, right = sort_key(value), sort_key(operand)
+    if left[0] != right[0]:
+        return False  # Range filters only match values of the same type
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+RANGE_OPERATORS = {"<", "<=", ">", ">=", "!=", "not-in"}
+
+class LocalQuery:
+    """
+    Mock for a Firestore Query. Results are ordered by the order_by fields and then
+    by document id, like Firestore. Candidate documents come from a field index:
+    an equality, `in`, range or array-contains filter narrows the scan, and the
+    remaining filters are checked per document.
+    """
+    def __init__(self, store: LocalStore, collection_path: str):
+        self._store = store
+        self._collection_path = collection_path
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._orders: List[Tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._limit_to_last = False
+        self._offset = 0
+        self._start: Optional[Tuple[List[Any], bool]] = None  # (values, inclusive)
+        self._end: Optional[Tuple[List[Any], bool]] = None
+        self._projection: Optional[List[str]] = None
+
+    def _copy(self) -> "LocalQuery":
+        query = copy.copy(self)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        return query
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None,
+              *, filter=None) -> "LocalQuery":
+        """Mimics query.where(field, op, value) and query.where(filter=FieldFilter(...))."""
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if field_path == DOCUMENT_ID:
+            # Document id filters accept references as well as plain ids
+            value = [v.id if isinstance(v, LocalDoc) else v for v in value] if op_string in ("in", "not-in") else \
+                (value.id if isinstance(value, LocalDoc) else value)
+        query = self._copy()
+        query._filters.append((field_path, op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "LocalQuery":
+        query = self._copy()
+        query._orders.append((field_path, direction))
+        return query
+
+    def select(self, field_paths: List[str]) -> "LocalQuery":
+        """Mimics query.select(): snapshots carry only the listed top-level fields."""
+        query = self._copy()
+        query._projection = list(field_paths)
+        return query
+
+    def limit(self, count: int) -> "LocalQuery":
+        query = self._copy()
+        query._limit, query._limit_to_last = count, False
+        return query
+
+    def limit_to_last(self, count: int) -> "LocalQuery":
+        query = self._copy()
+        query._limit, query._limit_to_last = count, True
+        return query
+
+    def offset(self, num_to_skip: int) -> "LocalQuery":
+        query = self._copy()
+        query._offset = num_to_skip
+        return query
+
+    def _cursor(self, document_fields, inclusive: bool, start: bool) -> "LocalQuery":
+        query = self._copy()
+        values = document_fields
+        if isinstance(document_fields, LocalDocSnapshot):
+            # A snapshot cursor covers every order field plus the document id
+            values = [document_fields.get(field) if field != DOCUMENT_ID else document_fields.id
+                      for field, _ in query._effective_orders()]
+        elif isinstance(document_fields, dict):
+            values = [document_fields[field] for field, _ in query._orders if field in document_fields]
+        cursor = (list(values), inclusive)
+        if start:
+            query._start = cursor
+        else:
+            query._end = cursor
+        return query
+
+    def start_at(self, document_fields) -> "LocalQuery":
+        return self._cursor(document_fields, True, True)
+
+    def start_after(self, document_fields) -> "LocalQuery":
+        return self._cursor(document_fields, False, True)
+
+    def end_at(self, document_fields) -> "LocalQuery":
+        return self._cursor(document_fields, True, False)
+
+    def end_before(self, document_fields) -> "LocalQuery":
+        return self._cursor(document_fields, False, False)
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        orders = list(self._orders)
+        ordered = {field for field, _ in orders}
+        # Inequality fields are ordered implicitly, then ties break on the document id
+        for field, op, _ in self._filters:
+            if op in RANGE_OPERATORS and field not in ordered:
+                orders.append((field, ASCENDING))
+                ordered.add(field)
+        if DOCUMENT_ID not in ordered:
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else ASCENDING))
+        return orders
+
+    def _candidates(self, docs: Dict[str, _StoredDoc]) -> List[str]:
+        store, path = self._store, self._collection_path
+        for field, op, value in self._filters:
+            if field != DOCUMENT_ID and op == "==":
+                return store.index(path, field).equal(value)
+        for field, op, value in self._filters:
+            if field == DOCUMENT_ID:
+                continue
+            if op == "in":
+                index = store.index(path, field)
+                return sorted({doc_id for item in value for doc_id in index.equal(item)})
+            if op in ("<", "<=", ">", ">="):
+                return store.index(path, field).range(op, value)
+            if op == "array-contains":
+                return sorted(store.index(path, field).contains(value))
+        if self._orders and self._orders[0][0] != DOCUMENT_ID:
+            # Documents without the first order field are excluded by Firestore anyway
+            return [doc_id for _, doc_id in store.index(path, self._orders[0][0]).entries]
+        return list(docs)
+
+    def _compare_cursor(self, keys: List[Tuple], cursor: List[Any], orders: List[Tuple[str, str]]) -> int:
+        for key, value, (_, direction) in zip(keys, cursor, orders):
+            other = sort_key(value)
+            if key != other:
+                result = -1 if key < other else 1
+                return -result if direction == DESCENDING else result
+        return 0
+
+    def _run(self) -> List[LocalDocSnapshot]:
+        store = self._store
+        orders = self._effective_orders()
+        with store.lock:
+            docs = store.collections.get(self._collection_path, {})
+            rows = []
+            for doc_id in self._candidates(docs):
+                doc = docs.get(doc_id)
+                if doc is None:
+                    continue
+                if not all(_matches(get_field(doc.data, field, doc_id), op, value) for field, op, value in self._filters):
+                    continue
+                values = [get_field(doc.data, field, doc_id) for field, _ in orders]
+                if any(value is _MISSING for value in values):
+                    continue
+                rows.append(([sort_key(value) for value in values], doc_id, doc))
+
+            # Stable sorts from the last order field to the first give the mixed-direction order
+            for position in range(len(orders) - 1, -1, -1):
+                rows.sort(key=lambda row: row[0][position], reverse=orders[position][1] == DESCENDING)
+
+            if self._start is not None:
+                cursor, inclusive = self._start
+                rows = [row for row in rows if (self._compare_cursor(row[0], cursor, orders) >= 0 if inclusive
+                                                else self._compare_cursor(row[0], cursor, orders) > 0)]
+            if self._end is not None:
+                cursor, inclusive = self._end
+                rows = [row for row in rows if (self._compare_cursor(row[0], cursor, orders) <= 0 if inclusive
+                                                else self._compare_cursor(row[0], cursor, orders) < 0)]
+            rows = rows[self._offset:]
+            if self._limit is not None:
+                rows = rows[-self._limit:] if self._limit_to_last else rows[:self._limit]
+
+            snapshots = [_snapshot(store, LocalDoc(store, self._collection_path, doc_id), doc) for _, doc_id, doc in rows]
+        if self._projection is not None:
+            for snapshot in snapshots:
+                snapshot._data = {field: snapshot._data[field] for field in self._projection if field in snapshot._data}
+        return snapshots
+
+    def stream(self, transaction: Optional["LocalTransaction"] = None) -> Iterator[LocalDocSnapshot]:
+        """Mimics query.stream(); results are a consistent snapshot taken when the stream starts."""
+        if transaction is not None:
+            return iter(transaction.get(self))
+        self._store.rpc("query")
+        return iter(self._run())
+
+    def get(self, transaction: Optional["LocalTransaction"] = None) -> List[LocalDocSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+class LocalCollection(LocalQuery):
+    """Mock for a Firestore CollectionReference (a query over the whole collection)."""
+    def __init__(self, store: LocalStore, path: str):
+        super().__init__(store, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def name(self) -> str:
+        return self.id
+
+    def document(self, doc_id: Optional[str] = None) -> LocalDoc:
+        """Mimics col_ref.document(doc_id); without an id a random 20-character one is used."""
+        if doc_id is None:
+            doc_id = "".join(random.choices(string.ascii_letters + string.digits, k=20))
+        return LocalDoc(self._store, self._collection_path, doc_id)
+
+    def add(self, document_data: Dict, document_id: Optional[str] = None):
+        """Mimics col_ref.add(data): returns (update_time, doc_ref)."""
+        reference = self.document(document_id)
+        result = reference.create(document_data)
+        return result.update_time, reference
+
+    def list_documents(self) -> List[LocalDoc]:
+        with self._store.lock:
+            return [LocalDoc(self._store, self._collection_path, doc_id)
+                    for doc_id in self._store.collections.get(self._collection_path, {})]
+
+# -----------------------------
+# 🔒 TRANSACTIONS
+# -----------------------------
+class LocalTransaction(LocalWriteBatch):
+    """
+    Mock for a Firestore Transaction with optimistic concurrency: every document read
+    through the transaction records its version, and commit() fails with Aborted if
+    any of them changed in the meantime. Reads must come before writes.
+    """
+    def __init__(self, store: LocalStore, max_attempts: int = TRANSACTION_MAX_ATTEMPTS):
+        super().__init__(store)
+        self._max_attempts = max_attempts
+        self._read_versions: Dict[Tuple[str, str], int] = {}
+
+    def _begin(self):
+        self._writes = []
+        self._read_versions = {}
+
+    def get(self, ref_or_query):
+        """Reads a document (returns a snapshot) or a query (returns a list) inside the transaction."""
+        if self._writes:
+            raise firestore.ReadAfterWriteError("Attempted read after write in a transaction.")
+        store = self._store
+        store.rpc("get")
+        with store.lock:
+            if isinstance(ref_or_query, LocalDoc):
+                key = (ref_or_query._collection_path, ref_or_query.id)
+                self._read_versions.setdefault(key, store.version(*key))
+                return _snapshot(store, ref_or_query, ref_or_query._read())
+            snapshots = ref_or_query._run()
+            for snapshot in snapshots:
+                key = (ref_or_query._collection_path, snapshot.id)
+                self._read_versions.setdefault(key, store.version(*key))
+            return snapshots
+
+    def _check_versions(self):
+        for key, version in self._read_versions.items():
+            if self._store.version(*key) != version:
+                raise Aborted(f"Transaction contention on {key[0]}/{key[1]}")
+
+    def commit(self) -> List[LocalWriteResult]:
+        try:
+            return self._check_and_apply(self._check_versions)
+        finally:
+            self._read_versions = {}
+
+    def rollback(self):
+        self._begin()
+
+def transactional(fn: Callable) -> Callable:
+    """
+    Look-alike of firestore.transactional for LocalTransaction: calls
+    fn(transaction, ...) and commits, retrying on contention.
+    """
+    @wraps(fn)
+    def wrapper(transaction: LocalTransaction, *args, **kwargs):
+        for attempt in range(1, transaction._max_attempts + 1):
+            transaction._begin()
+            try:
+                result = fn(transaction, *args, **kwargs)
+                transaction.commit()
+                return result
+            except Aborted:
+                if attempt == transaction._max_attempts:
+                    raise
+                logging.debug(f"[local_firestore] Transaction aborted, retrying (attempt {attempt})")
+            except Exception:
+                transaction.rollback()
+                raise
+    return wrapper
+
+# -----------------------------
+# 🔥 CLIENT
+# -----------------------------
+class LocalFirestore:
+    """
+    In-memory stand-in for the Firestore Client. Instances created without a store
+    share one process-wide store, so every module sees the same data. When
+    `snapshot_path` is set, the data is loaded from that JSON file at startup and
+    written back on save() and at interpreter exit.
+    """
+    def __init__(self, store: Optional[LocalStore] = None, snapshot_path: Optional[str] = None):
+        self._store = store if store is not None else _default_store()
+        self._snapshot_path = snapshot_path
+        if snapshot_path:
+            self.load(snapshot_path)
+            atexit.register(self.save)
+
+    def collection(self, path: str) -> LocalCollection:
+        """Mimics db.collection(path); "a/b/c" addresses subcollection c of document a/b."""
+        return LocalCollection(self._store, path)
+
+    def document(self, path: str) -> LocalDoc:
+        """Mimics db.document("collection/doc_id")."""
+        collection_path, _, doc_id = path.rpartition("/")
+        return LocalDoc(self._store, collection_path, doc_id)
+
+    def collections(self) -> List[LocalCollection]:
+        with self._store.lock:
+            return [LocalCollection(self._store, path) for path in self._store.collections if "/" not in path]
+
+    def batch(self) -> LocalWriteBatch:
+        """Mimics db.batch()."""
+        return LocalWriteBatch(self._store)
+
+    def transaction(self, max_attempts: int = TRANSACTION_MAX_ATTEMPTS) -> LocalTransaction:
+        """Mimics db.transaction(); use with `transactional`."""
+        return LocalTransaction(self._store, max_attempts=max_attempts)
+
+    def get_all(self, references: List[LocalDoc], field_paths=None, transaction=None) -> Iterator[LocalDocSnapshot]:
+        for reference in references:
+            yield reference.get(transaction=transaction)
+
+    def save(self, path: Optional[str] = None):
+        """Writes every collection to a JSON snapshot (atomically, via a temp file)."""
+        path = path or self._snapshot_path
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._store.dump(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logging.info(f"[local_firestore] Saved snapshot to {path}")
+
+    def load(self, path: str):
+        """Replaces the data with a snapshot written by save(); a missing file is ignored."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        self._store.load(snapshot)
+        logging.info(f"[local_firestore] Loaded snapshot from {path}")
+
+_store: Optional[LocalStore] = None
+_store_lock = threading.Lock()
+
+def _default_store() -> LocalStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LocalStore()
+        return _store
@@ -0,0 +1,223 @@
+import atexit
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils import tracing
+from app.utils.config import get_config
+
+FIRESTORE_MAX_BATCH = 500  # Hard limit on writes per Firestore batch commit
+BATCH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, FIRESTORE_MAX_BATCH)
+
+LOG_BUFFER_FLUSH_SIZE = int(get_config("LOG_BUFFER_FLUSH_SIZE", 100))
+LOG_BUFFER_MAX_AGE = float(get_config("LOG_BUFFER_MAX_AGE", 5.0))
+LOG_BUFFER_CAPACITY = int(get_config("LOG_BUFFER_CAPACITY", 5000))
+LOG_BUFFER_MAX_RETRIES = int(get_config("LOG_BUFFER_MAX_RETRIES", 4))
+# Where entries go when commits keep failing; replayed on startup. /tmp is in memory
+# on Cloud Functions, so point it at a mounted volume to survive restarts.
+LOG_BUFFER_SPILL_PATH = get_config("LOG_BUFFER_SPILL_PATH", "/tmp/log_spill.jsonl")
+
+LogEntry = Tuple[str, Dict[str, Any]]  # (document id, document data)
+
+# -----------------------------
+# 💾 SPILL FILE (JSON lines)
+# -----------------------------
+def _encode_entry(doc_id: str, data: Dict[str, Any]) -> str:
+    encoded = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in data.items()}
+    return json.dumps({"id": doc_id, "data": encoded, "datetime_fields": [k for k, v in data.items() if isinstance(v, datetime)]})
+
+def _decode_entry(line: str) -> LogEntry:
+    record = json.loads(line)
+    data = record["data"]
+    for key in record.get("datetime_fields", []):
+        data[key] = datetime.fromisoformat(data[key])
+    return record["id"], data
+
+# -----------------------------
+# 📝 WRITE-BEHIND LOG BUFFER
+# -----------------------------
+class LogBuffer:
+    """
+    Collects log entries off the request path and writes them in batched commits.
+
+    A background thread flushes when `flush_size` entries are waiting or the oldest
+    entry is `max_age` seconds old; close() flushes whatever is left. Failed commits
+    are retried with exponential backoff and then appended to a local spill file,
+    which is replayed when the buffer starts and on every flush, so entries are
+    never dropped. When `capacity` entries are already waiting, add() blocks
+    (backpressure) until the flusher catches up, spilling to disk if it cannot.
+    After close(), add() commits the entry itself.
+    """
+    def __init__(self, commit_fn: Callable[[List[LogEntry]], None],
+                 flush_size: int = LOG_BUFFER_FLUSH_SIZE,
+                 max_age: float = LOG_BUFFER_MAX_AGE,
+                 capacity: int = LOG_BUFFER_CAPACITY,
+                 max_retries: int = LOG_BUFFER_MAX_RETRIES,
+                 spill_path: str = LOG_BUFFER_SPILL_PATH):
+        self._commit_fn = commit_fn
+        self._flush_size = min(flush_size, FIRESTORE_MAX_BATCH)
+        self._max_age = max_age
+        self._capacity = capacity
+        self._max_retries = max_retries
+        self._spill_path = spill_path
+        self._entries: List[LogEntry] = []
+        self._oldest_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-buffer", daemon=True)
+        self._thread.start()
+
+    def add(self, doc_id: str, data: Dict[str, Any], timeout: float = 2.0):
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._append(doc_id, data, timeout)
+        if closed:
+            # Shutting down: commit on the caller's thread (spilling on failure) instead
+            self._write([(doc_id, data)])
+
+    def _append(self, doc_id: str, data: Dict[str, Any], timeout: float):
+        deadline = time.monotonic() + timeout
+        while len(self._entries) >= self._capacity:
+            self._cond.notify_all()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.warning(f"[log_buffer] Buffer full, spilling {doc_id} to disk")
+                self._spill([(doc_id, data)])
+                return
+            self._cond.wait(remaining)
+        if not self._entries:
+            self._oldest_at = time.monotonic()
+        self._entries.append((doc_id, data))
+        if len(self._entries) >= self._flush_size:
+            self._cond.notify_all()
+
+    def _take(self) -> List[LogEntry]:
+        entries, self._entries, self._oldest_at = self._entries, [], None
+        self._cond.notify_all()  # Wake writers blocked on a full buffer
+        return entries
+
+    def _run(self):
+        # Entries spilled by an earlier buffer (or process) are written before new ones
+        if self._has_spill():
+            self._write([])
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._entries) >= self._flush_size:
+                        break
+                    if self._oldest_at is not None:
+                        age = time.monotonic() - self._oldest_at
+                        if age >= self._max_age:
+                            break
+                        self._cond.wait(self._max_age - age)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+                entries = self._take()
+            self._write(entries)
+
+    def flush(self):
+        """Writes everything currently buffered, plus any previously spilled entries."""
+        with self._cond:
+            entries = self._take()
+        self._write(entries)
+
+    def close(self):
+        """Stops the background flusher and flushes the remaining entries. Safe to call twice."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=self._max_age + 1)
+        self.flush()
+
+    def _write(self, entries: List[LogEntry]):
+        with self._flush_lock:
+            entries = self._load_spill() + entries
+            for start in range(0, len(entries), FIRESTORE_MAX_BATCH):
+                chunk = entries[start:start + FIRESTORE_MAX_BATCH]
+                if not self._commit_with_retry(chunk):
+                    self._spill(chunk)
+
+    def _commit_with_retry(self, chunk: List[LogEntry]) -> bool:
+        delay = 0.2
+        for attempt in range(1, self._max_retries + 1):
+            try:
+                with tracing.span("firestore.log_batch", attempts=attempt):
+                    self._commit_fn(chunk)
+                logging.debug(f"[log_buffer] Committed {len(chunk)} log entries")
+                tracing.metrics.observe("log_buffer.batch_size", len(chunk), bounds=BATCH_SIZE_BUCKETS)
+                return True
+            except Exception as e:
+                logging.warning(f"[log_buffer] Commit of {len(chunk)} entries failed (attempt {attempt}): {e}")
+                tracing.metrics.increment("log_buffer.commit_failures")
+                if attempt < self._max_retries:
+                    time.sleep(delay)
+                    delay *= 2
+        return False
+
+    def _spill(self, entries: List[LogEntry]):
+        with self._spill_lock, open(self._spill_path, "a") as f:
+            for doc_id, data in entries:
+                f.write(_encode_entry(doc_id, data) + "\n")
+        logging.error(f"[log_buffer] Spilled {len(entries)} log entries to {self._spill_path}")
+
+    def _has_spill(self) -> bool:
+        return os.path.exists(self._spill_path) or os.path.exists(self._spill_path + ".replay")
+
+    def _load_spill(self) -> List[LogEntry]:
+        # Claim the file first so entries spilled while replaying land in a fresh one.
+        # A leftover .replay file means a previous replay was interrupted.
+        replay_path = self._spill_path + ".replay"
+        with self._spill_lock:
+            if os.path.exists(self._spill_path) and not os.path.exists(replay_path):
+                os.replace(self._spill_path, replay_path)
+            if not os.path.exists(replay_path):
+                return []
+            with open(replay_path) as f:
+                entries = [_decode_entry(line) for line in f if line.strip()]
+            os.remove(replay_path)
+        logging.info(f"[log_buffer] Replaying {len(entries)} spilled log entries")
+        return entries
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._entries)
+
+# -----------------------------
+# 🛑 SHUTDOWN HOOKS
+# -----------------------------
+def register_shutdown_flush(buffer: LogBuffer, on_sigterm: bool = True):
+    """
+    Flushes the buffer at interpreter exit and, with on_sigterm, when the platform
+    sends SIGTERM. Signal handlers can only be installed from the main thread, so
+    the buffer must be created there (main.py does it at import time via
+    start_log_buffer). Servers that handle SIGTERM themselves pass on_sigterm=False.
+    """
+    atexit.register(buffer.close)
+    if not on_sigterm:
+        return
+    try:
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def _on_sigterm(signum, frame):
+            buffer.close()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, _on_sigterm)
+    except ValueError:
+        # Off the main thread only atexit applies, and the platform's SIGTERM skips it
+        logging.warning("[log_buffer] SIGTERM flush not installed: the buffer was started off the main thread")
@@ -1,37 +1,186 @@
 # cal/secrets.py
 import os
 import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
+from app.utils import tracing
 from app.utils.env import is_local, get_env_var
 from app.utils.config import get_config
-from google.cloud import secretmanager_v1
+from cal.clients import get_secret_manager_client, SECRET_MANAGER_TIMEOUT
 
-SECRETS_CACHE = {}
+# "secret_manager" reads GCP Secret Manager; "file" reads LOCAL_SECRETS_PATH (a JSON object).
+# LOCAL runs default to the file.
+SECRETS_SOURCE = get_config("SECRETS_SOURCE", "file" if is_local() else "secret_manager")
+LOCAL_SECRETS_PATH = get_config("LOCAL_SECRETS_PATH", "secrets.local.json")
+# Seconds before a cached secret is refetched; 0 keeps it for the life of the instance.
+# An expired value is still served while the refetch runs in the background.
+SECRETS_TTL = float(get_config("SECRETS_TTL", 0))
+# Minimum seconds between on-demand refreshes of one secret (see refresh_soon)
+SECRETS_MIN_REFRESH_INTERVAL = float(get_config("SECRETS_MIN_REFRESH_INTERVAL", 30))
 
-# Load all secrets locally if local
-if is_local():
-    local_secrets_path = get_config("LOCAL_SECRETS_PATH", "secrets.local.json")
-    with open(local_secrets_path) as f:
-        SECRETS_CACHE = json.load(f)
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="secrets")
 
+# -----------------------------
+# 📦 SOURCES
+# -----------------------------
+_project_id: Optional[str] = None
+
+def _resolve_project_id() -> str:
+    """GCP_PROJECT_ID from config, looked up once per process."""
+    global _project_id
+    if _project_id is None:
+        project_id = get_config("GCP_PROJECT_ID")
+        if not project_id:
+            raise ValueError("GCP_PROJECT_ID is not set in config")
+        _project_id = project_id
+    return _project_id
+
+def _fetch_from_secret_manager(key: str) -> str:
+    secret_name = f"projects/{_resolve_project_id()}/secrets/{key}/versions/latest"
+    with tracing.span("secret_manager.access", secret=key):
+        response = get_secret_manager_client().access_secret_version(
+            request={"name": secret_name}, timeout=SECRET_MANAGER_TIMEOUT
+        )
+    return response.payload.data.decode("UTF-8")
+
+_file_lock = threading.Lock()
+_file_cache: Dict[str, Any] = {"mtime": None, "values": {}}
+
+def _fetch_from_file(key: str) -> Optional[str]:
+    """Reads the key from LOCAL_SECRETS_PATH, re-reading the file only when it changes."""
+    with _file_lock:
+        mtime = os.path.getmtime(LOCAL_SECRETS_PATH)
+        if mtime != _file_cache["mtime"]:
+            with open(LOCAL_SECRETS_PATH) as f:
+                _file_cache["values"] = json.load(f)
+            _file_cache["mtime"] = mtime
+        return _file_cache["values"].get(key)
+
+# -----------------------------
+# 🔐 SECRET CACHE
+# -----------------------------
+class SecretCache:
+    """
+    Thread-safe secret cache. A miss fetches the secret (once, however many threads
+    ask for it at the same time). After `ttl` seconds the cached value keeps being
+    served while a background refetch replaces it (stale-while-revalidate), so only
+    the very first lookup of a secret ever waits for the source.
+    """
+    def __init__(self, fetch, ttl: float = SECRETS_TTL, min_refresh_interval: float = SECRETS_MIN_REFRESH_INTERVAL):
+        self._fetch = fetch
+        self._ttl = ttl
+        self._min_refresh_interval = min_refresh_interval
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # key -> {"value", "fetched_at"}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._refreshing: set = set()
+        self._metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _load(self, key: str) -> Any:
+        value = self._fetch(key)
+        with self._lock:
+            self._entries[key] = {"value": value, "fetched_at": time.monotonic()}
+        return value
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stale = self._ttl > 0 and time.monotonic() - entry["fetched_at"] > self._ttl
+                self._metrics["stale_hits" if stale else "hits"] += 1
+        if entry is not None:
+            if stale:
+                self._refresh_in_background(key)
+            return entry["value"]
+
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:  # Another thread fetched it while we waited
+                return entry["value"]
+            with self._lock:
+                self._metrics["misses"] += 1
+            return self._load(key)
+
+    def refresh_soon(self, key: str):
+        """Refetches `key` in the background unless it was fetched within min_refresh_interval."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry["fetched_at"] < self._min_refresh_interval:
+                return
+        self._refresh_in_background(key)
+
+    def _refresh_in_background(self, key: str):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        _refresh_executor.submit(self._refresh, key)
+
+    def _refresh(self, key: str):
+        try:
+            self._load(key)
+            with self._lock:
+                self._metrics["refreshes"] += 1
+        except Exception as e:
+            # Keep serving the cached value; the next stale hit tries again
+            with self._lock:
+                self._metrics["refresh_failures"] += 1
+            logging.warning(f"[secrets] Background refresh of {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def cached(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._metrics, "entries": len(self._entries), "ttl": self._ttl}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+secret_cache = SecretCache(_fetch_from_file if SECRETS_SOURCE == "file" else _fetch_from_secret_manager)
+tracing.metrics.register_provider("secrets", secret_cache.stats)
+
+# -----------------------------
+# 🔑 PUBLIC API
+# -----------------------------
 def get_secret(key: str) -> str:
-    """Get a secret by key — from local file or GCP Secret Manager"""
-    project_id = get_config("GCP_PROJECT_ID")
-    if not project_id:
-        raise ValueError("GCP_PROJECT_ID is not set in config")
-    if is_local():
-        return SECRETS_CACHE.get(key)
-
-    if key in SECRETS_CACHE:
-        return SECRETS_CACHE[key]
-
-    # Get GCP project ID from config, not environment
-    project_id = get_config("GCP_PROJECT_ID")
-    if not project_id:
-        raise ValueError("GCP_PROJECT_ID is not set in config")
-
-    client = secretmanager_v1.SecretManagerServiceClient()
-    secret_name = f"projects/{project_id}/secrets/{key}/versions/latest"
-    response = client.access_secret_version(request={"name": secret_name})
-    secret_value = response.payload.data.decode("UTF-8")
-    SECRETS_CACHE[key] = secret_value
-    return secret_value
+    """Get a secret by key — from local file or GCP Secret Manager (cached, see SecretCache)"""
+    return secret_cache.get(key)
+
+def refresh_soon(key: str):
+    """Asks for a background refetch, e.g. when a request presents a secret that may have been rotated."""
+    secret_cache.refresh_soon(key)
+
+def prefetch_secrets(keys: Iterable[str]) -> Dict[str, bool]:
+    """
+    Loads several secrets into the cache in one parallel batch, so startup pays one
+    Secret Manager round trip instead of one per secret. Failures are logged and left
+    for get_secret to retry on first use. Returns {key: fetched}.
+    """
+    keys = [key for key in keys if not secret_cache.cached(key)]
+    if not keys:
+        return {}
+
+    def fetch(key):
+        try:
+            get_secret(key)
+            return True
+        except Exception as e:
+            logging.warning(f"[secrets] Prefetch of {key} failed: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=len(keys), thread_name_prefix="secrets") as pool:
+        return dict(zip(keys, pool.map(fetch, keys)))
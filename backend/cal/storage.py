@@ -1,25 +1,33 @@
 import os
-from google.api_core import exceptions
-from google.cloud import storage
+from app.utils import tracing
 from app.utils.env import is_local, get_env_var
+from cal.clients import get_storage_client, GCS_TIMEOUT
 
 GCS_AUDIO_LOG_BUCKET = get_env_var("GCS_AUDIO_LOG_BUCKET", "error-bucket-name")
-storage_client = storage.Client()
 
-def upload_to_gcs(local_file_path, user_id):
+def upload_to_gcs(audio, user_id):
+    """Uploads an AudioBuffer (or a local file path) under input_audio/<user_id>/."""
     # Use user_id and a unique filename to prevent collisions and aid debugging
-    original_filename = os.path.basename(local_file_path)
+    from_path = isinstance(audio, str)
+    original_filename = os.path.basename(audio) if from_path else audio.filename
     uploaded_blob_name = f"input_audio/{user_id}/{original_filename}"
     full_gcs_uri = f"gs://{GCS_AUDIO_LOG_BUCKET}/{uploaded_blob_name}"
 
     if is_local():
         return full_gcs_uri
 
+    from google.api_core import exceptions
     try:
-        bucket = storage_client.bucket(GCS_AUDIO_LOG_BUCKET)
+        bucket = get_storage_client().bucket(GCS_AUDIO_LOG_BUCKET)
         blob = bucket.blob(uploaded_blob_name)
-        blob.upload_from_filename(local_file_path)
-        print(f"[INFO] Successfully uploaded {local_file_path} to {full_gcs_uri}")
+        size = os.path.getsize(audio) if from_path else audio.size
+        with tracing.span("gcs.upload", request_bytes=size):
+            if from_path:
+                blob.upload_from_filename(audio, timeout=GCS_TIMEOUT)
+            else:
+                with audio.open() as audio_file:
+                    blob.upload_from_file(audio_file, size=audio.size, content_type=audio.content_type, timeout=GCS_TIMEOUT)
+        print(f"[INFO] Successfully uploaded {original_filename} to {full_gcs_uri}")
         return full_gcs_uri
     except exceptions.NotFound:
         # Handles cases where the bucket does not exist or the client cannot find it
@@ -28,11 +36,35 @@ def upload_to_gcs(local_file_path, user_id):
         raise
     except exceptions.GoogleAPICallError as e:
         # Handles network issues, permission errors, etc.
-        print(f"[ERROR] GCS Upload failed for {local_file_path}: {e}")
+        print(f"[ERROR] GCS Upload failed for {original_filename}: {e}")
         # Consider re-raising or returning a specific error/empty string
         raise
     except FileNotFoundError:
         # Handles case where the local file doesn't exist
-        print(f"[ERROR] Local file not found: {local_file_path}")
+        print(f"[ERROR] Local file not found: {original_filename}")
         raise
 
+def upload_bytes_to_gcs(blob_name, data: bytes, content_type="application/octet-stream"):
+    """Uploads in-memory bytes to the audio bucket and returns the gs:// URI."""
+    full_gcs_uri = f"gs://{GCS_AUDIO_LOG_BUCKET}/{blob_name}"
+    if is_local():
+        return full_gcs_uri
+    bucket = get_storage_client().bucket(GCS_AUDIO_LOG_BUCKET)
+    with tracing.span("gcs.upload", request_bytes=len(data)):
+        bucket.blob(blob_name).upload_from_string(data, content_type=content_type, timeout=GCS_TIMEOUT)
+    return full_gcs_uri
+
+def download_bytes_from_gcs(blob_name):
+    """Returns the blob's bytes from the audio bucket, or None if it does not exist."""
+    if is_local():
+        return None
+    from google.api_core import exceptions
+    bucket = get_storage_client().bucket(GCS_AUDIO_LOG_BUCKET)
+    with tracing.span("gcs.download") as span:
+        try:
+            data = bucket.blob(blob_name).download_as_bytes(timeout=GCS_TIMEOUT)
+        except exceptions.NotFound:
+            span.set("found", False)
+            return None
+        span.set("response_bytes", len(data))
+        return data
@@ -1,34 +1,72 @@
-from flask import Flask, request
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import json
 import logging
 from app.channels import telegram
+from app.utils import tracing, webhook, work_queue
 from app.utils.env import is_local
+from cal.firestore import DASHBOARD_READ_MODEL, flush_log_buffer, maintain_dashboard, rollup_language_distribution
 from cal.secrets import get_secret
 
 logging.basicConfig(level=logging.INFO)
+# Runs on the main thread at import, where the log buffer's SIGTERM flush can be installed
+webhook.start_instance(_IMPORT_STARTED)
 
-def telegram_webhook(request):
-    TELEGRAM_BOT_TOKEN = get_secret("TELEGRAM_BOT_TOKEN")
-    EXPECTED_SECRET = get_secret("WEBHOOK_SECRET")
+def process_queued_update(update):
+    telegram.handle_update(get_secret("TELEGRAM_BOT_TOKEN"), update)
+
+def _has_webhook_secret(request) -> bool:
+    return webhook.has_webhook_secret(request.headers.get(webhook.SECRET_HEADER))
 
-    # Telegram sends the secret token in the X-Telegram-Bot-Api-Secret-Token header
-    received_secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
-    if received_secret != EXPECTED_SECRET:
+def telegram_webhook(request):
+    if not _has_webhook_secret(request):
         # Log the rejection for debugging, but return a non-200 status code
         print("[SECURITY] Unauthorized webhook call blocked.")
         return 'Unauthorized', 403
-    
+    TELEGRAM_BOT_TOKEN = get_secret("TELEGRAM_BOT_TOKEN")
+
     update = request.get_json()
-    telegram.handle_update(TELEGRAM_BOT_TOKEN, update)
+    if webhook.WEBHOOK_MODE == "queue":
+        work_queue.start_workers(process_queued_update)
+        work_queue.enqueue(update)
+        return json.dumps({"ok": True}), 200
+
+    try:
+        telegram.handle_update(TELEGRAM_BOT_TOKEN, update)
+    finally:
+        flush_log_buffer()
     return json.dumps({"ok": True}), 200
 
 
+def rollup_stats(request):
+    """Entry point for a scheduled job that refreshes language_distribution and the dashboard document."""
+    rolled_up = rollup_language_distribution()
+    result = {"ok": True, "rolled_up": rolled_up}
+    if DASHBOARD_READ_MODEL:
+        result["dashboard"] = maintain_dashboard()
+    return json.dumps(result), 200
+
+
+def metrics(request):
+    """Entry point returning this instance's latency histograms, usage counters and cache stats as JSON."""
+    if not _has_webhook_secret(request):
+        return 'Unauthorized', 403
+    return tracing.metrics_json(), 200, {"Content-Type": "application/json"}
+
+
 if __name__ == "__main__" and is_local():
+    # Flask is only needed for the local server; Cloud Functions passes its own request object
+    from flask import Flask, request
     app = Flask(__name__)
 
     @app.route("/", methods=["POST"])
     def telegram_route():
         return telegram_webhook(request)
 
+    @app.route("/metrics", methods=["GET"])
+    def metrics_route():
+        return metrics(request)
+
     app.run(host="0.0.0.0", port=8080, debug=True)
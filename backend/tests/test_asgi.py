@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+import asgi
+from app.utils import webhook
+
+SECRETS = {"WEBHOOK_SECRET": "s3cret", "TELEGRAM_BOT_TOKEN": "token"}
+
+@pytest.fixture
+def handled(monkeypatch):
+    async def secret(key):
+        return SECRETS[key]
+    monkeypatch.setattr(asgi, "_secret", secret)
+    monkeypatch.setattr(webhook, "get_secret", SECRETS.get)
+    monkeypatch.setattr(webhook, "refresh_soon", lambda key: None)
+    monkeypatch.setattr(webhook, "WEBHOOK_MODE", "inline")
+    updates = []
+    async def handle_update_async(token, update):
+        updates.append((token, update))
+    monkeypatch.setattr(asgi, "handle_update_async", handle_update_async)
+    return updates
+
+def _call(method, path, body=b"", secret=None):
+    headers = [(b"content-type", b"application/json")]
+    if secret is not None:
+        headers.append((b"x-telegram-bot-api-secret-token", secret.encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    return sent[0]["status"], sent[1]["body"]
+
+def test_webhook_without_the_secret_is_rejected(handled):
+    assert _call("POST", "/", b'{"update_id": 1}', secret="wrong") == (403, b"Unauthorized")
+    assert _call("POST", "/", b'{"update_id": 1}') == (403, b"Unauthorized")
+    assert handled == []
+
+def test_webhook_hands_the_update_to_the_async_pipeline(handled):
+    status, body = _call("POST", "/", b'{"update_id": 1}', secret="s3cret")
+    assert (status, json.loads(body)) == (200, {"ok": True})
+    assert handled == [("token", {"update_id": 1})]
+    assert asgi.get_stats()["in_flight"] == 0
+
+def test_metrics_and_unknown_routes(handled):
+    status, body = _call("GET", "/metrics", secret="s3cret")
+    assert status == 200 and "asgi" in json.loads(body)["stats"]
+    assert _call("GET", "/nope", secret="s3cret") == (404, b"Not Found")
+
+def test_handle_update_async_replies_once_per_update(monkeypatch):
+    from app.channels import telegram_async
+    from app.utils.dedup import UpdateDeduplicator
+    sent, recorded = [], []
+
+    async def generate_response_async(prompt, **kwargs):
+        return {"language": "english", "answer": f"re: {prompt}"}
+
+    async def send_message(token, chat_id, text=None, **kwargs):
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(telegram_async, "generate_response_async", generate_response_async)
+    monkeypatch.setattr(telegram_async, "send_message", send_message)
+    monkeypatch.setattr(telegram_async, "handle_new_interaction",
+                        lambda interaction, timestamp=None: recorded.append(interaction["reply"]))
+    monkeypatch.setattr(telegram_async, "update_dedup", UpdateDeduplicator())
+    for name, value in {"REPLY_MODE": "complete", "RESPONSE_CACHE": False, "LANGUAGE_ID": False,
+                        "ANSWER_FORMAT": "json", "CONVERSATION_MEMORY": False}.items():
+        monkeypatch.setattr(telegram_async, name, value)
+
+    update = {"update_id": 7, "message": {"chat": {"id": 1}, "from": {"id": 2}, "text": "hello"}}
+    asyncio.run(telegram_async.handle_update_async("token", update))
+    asyncio.run(telegram_async.handle_update_async("token", update))  # Telegram redelivery
+    assert sent == [(1, "re: hello")]
+    assert recorded == ["re: hello"]
+
+def test_close_async_clients_closes_and_drops_them(monkeypatch):
+    from cal import clients
+    monkeypatch.setattr(clients, "_clients", {})
+
+    class AsyncClient:
+        closed = False
+        async def aclose(self):
+            self.closed = True
+
+    client = AsyncClient()
+    clients.set_client("async_http", client)
+    asyncio.run(clients.close_async_clients())
+    assert client.closed and "async_http" not in clients._clients
@@ -0,0 +1,55 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from app.services import openai_service
+
+class _Stream:
+    def __init__(self, events):
+        self._events = events
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+def _client(stream=None, retrieve=None):
+    runs = SimpleNamespace(create=lambda **kwargs: stream)
+    beta = SimpleNamespace(threads=SimpleNamespace(runs=runs), assistants=SimpleNamespace(retrieve=retrieve))
+    return SimpleNamespace(beta=beta)
+
+def _event(status):
+    return SimpleNamespace(event=f"thread.run.{status}", data=SimpleNamespace(id="run_1", status=status))
+
+def test_stream_is_closed_after_the_terminal_event(monkeypatch):
+    stream = _Stream([_event("queued"), _event("completed"), _event("never.read")])
+    monkeypatch.setattr(openai_service, "get_openai_client", lambda: _client(stream=stream))
+    run = openai_service._stream_run("thread_1", "asst_1", time.monotonic() + 10)
+    assert run.status == "completed" and stream.closed
+
+def test_slow_assistant_retrieve_does_not_block_cached_lookups(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def retrieve(assistant_id):
+        started.set()
+        release.wait(timeout=5)
+        return SimpleNamespace(id=assistant_id)
+
+    monkeypatch.setattr(openai_service, "get_openai_client", lambda: _client(retrieve=retrieve))
+    monkeypatch.setitem(openai_service._assistants, "asst_cached", SimpleNamespace(id="asst_cached"))
+    monkeypatch.setitem(openai_service._threads_cache, "wa_1", "thread_1")
+    slow = threading.Thread(target=openai_service.get_assistant, args=("asst_slow",))
+    slow.start()
+    try:
+        assert started.wait(timeout=5)
+        assert openai_service.get_assistant("asst_cached").id == "asst_cached"
+        assert openai_service.check_if_thread_exists("wa_1") == "thread_1"
+    finally:
+        release.set()
+        slow.join()
+    openai_service._assistants.pop("asst_slow", None)
@@ -0,0 +1,29 @@
+import pytest
+
+from app.utils.audio import AudioTooLargeError, buffer_from_chunks
+
+def test_in_memory_buffer_readers_are_independent():
+    audio = buffer_from_chunks("voice.ogg", [b"abc" * 100, b"", b"xyz" * 100], memory_limit=1000)
+    first, second = audio.open(), audio.open()
+    assert first.read(3) == b"abc"
+    assert second.read() == b"abc" * 100 + b"xyz" * 100
+    first.seek(-3, 2)
+    assert first.read() == b"xyz"
+    assert audio.size == 600 and audio.in_memory
+
+def test_buffer_keeps_the_downloaded_bytes_without_copying():
+    audio = buffer_from_chunks("voice.ogg", [b"a" * 10, b"b" * 10])
+    assert audio.read() is audio.read()
+    assert audio.read() == b"a" * 10 + b"b" * 10
+
+def test_over_the_memory_limit_without_spilling_is_rejected():
+    with pytest.raises(AudioTooLargeError):
+        buffer_from_chunks("voice.ogg", [b"x" * 600, b"x" * 600], memory_limit=1000, spill_to_disk=False)
+
+def test_over_the_memory_limit_spills_to_disk_until_the_hard_limit(tmp_path):
+    with buffer_from_chunks("voice.ogg", [b"x" * 600, b"y" * 600], memory_limit=1000, spill_to_disk=True) as audio:
+        assert not audio.in_memory
+        with audio.open() as f:
+            assert f.read() == b"x" * 600 + b"y" * 600
+    with pytest.raises(AudioTooLargeError):
+        buffer_from_chunks("voice.ogg", [b"x" * 600] * 3, memory_limit=1000, max_bytes=1500, spill_to_disk=True)
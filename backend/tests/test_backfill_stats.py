@@ -0,0 +1,40 @@
+import pytest
+
+import backfill_stats
+import cal.firestore
+from cal.local_firestore import LocalFirestore, LocalStore
+
+@pytest.fixture
+def db(monkeypatch):
+    client = LocalFirestore(LocalStore())
+    monkeypatch.setattr(backfill_stats, "get_firestore_client", lambda: client)
+    monkeypatch.setattr(cal.firestore, "is_local", lambda: True)
+    return client
+
+def _log(db, doc_id, modal="text"):
+    db.collection("logs").document(doc_id).set({"user_id": doc_id.partition("_")[2], "lang": "hindi", "modal": modal})
+
+def test_overall_active_users_counts_distinct_users_including_live_weeks(db, tmp_path):
+    _log(db, "20260105100000_1")
+    _log(db, "20260106100000_2", modal="audio")
+    _log(db, "20260113100000_1")
+    # The live week (from --until on): users 2 and 3, its document never counted them
+    _log(db, "20260119100000_2")
+    _log(db, "20260120100000_3")
+    db.collection("public_stats").document("week_20260119").set(
+        {"interactions": 2, "voice": 0, "active_users": 0, "lang_counts": {"hindi": {"interactions": 2, "voice": 0}}}
+    )
+
+    result = backfill_stats.backfill("20260119", workers=2, checkpoint_path=str(tmp_path / "checkpoint.json"),
+                                     rebuild=False)
+    overall = db.collection("public_stats").document("overall_summary").get().to_dict()
+    assert overall["active_users"] == 3 and overall["interactions"] == 5 and overall["voice"] == 1
+    assert result["weeks_written"] == 2 and result["all_users"] == 3
+    week = db.collection("public_stats").document("week_20260112").get().to_dict()
+    assert week["active_users"] == 0  # User 1 was first seen the week before
+    users = {snapshot.id: snapshot.to_dict() for snapshot in db.collection("users").stream()}
+    assert users == {"1": {"first_seen_week": "20260105"}, "2": {"first_seen_week": "20260105"}}
+
+def test_dashboard_rebuild_can_be_turned_off():
+    assert backfill_stats.parse_args(["--no-rebuild-dashboard"]).rebuild_dashboard is False
+    assert backfill_stats.parse_args(["--rebuild-dashboard"]).rebuild_dashboard is True
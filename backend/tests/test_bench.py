@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+from bench.run import compare, percentile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _bench(*args):
+    # A subprocess, since the harness swaps config and clients for the whole process
+    return subprocess.run([sys.executable, "-m", "bench.run", "--profile", "zero", "--no-tracemalloc", *args],
+                          cwd=BACKEND, capture_output=True, text=True, timeout=120)
+
+def test_percentile_interpolates():
+    assert percentile([], 50) is None
+    assert percentile([10, 20, 30, 40], 50) == 25.0
+    assert percentile([10, 20, 30, 40], 100) == 40
+
+def test_harness_processes_every_update_and_compares_runs(tmp_path):
+    out = tmp_path / "results.json"
+    result = _bench("--updates", "20", "--out", str(out))
+    assert result.returncode == 0, result.stderr
+    results = json.loads(out.read_text())["results"]
+    assert results["processed"] == 20 and results["errors"] == {}
+    assert results["webhook_latency_ms"]["count"] == 20
+
+    baseline = json.loads(out.read_text())
+    slower = json.loads(out.read_text())
+    slower["results"]["throughput_per_s"] = baseline["results"]["throughput_per_s"] / 2
+    assert compare(baseline, baseline, tolerance=0.1) == []
+    assert "throughput_per_s" in compare(slower, baseline, tolerance=0.1)
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+from app.services import openai_service
+from app.services.openai_service import _segment_language
+
+def test_a_language_switch_is_kept_and_only_misdetections_are_redone():
+    mixed = [("namaste aap kaise hain", "hindi"), ("the meeting is at five", "english"), ("theek hai", "hindi")]
+    assert _segment_language(mixed) == ("hindi", [])
+    misheard = [("namaste aap kaise hain", "hindi"), ("naa", "welsh"), ("theek hai", "hindi")]
+    assert _segment_language(misheard) == ("hindi", [1])
+
+def test_mixed_language_note_costs_one_whisper_call_per_segment(monkeypatch):
+    heard = {"part0": ("namaste aap kaise hain", "hindi"), "part1": ("see you at five", "english"),
+             "part2": ("phir milte hain", "hindi")}
+    calls = []
+
+    def transcribe(file, size, language=None):
+        calls.append((file[0], language))
+        return heard[file[0]]
+
+    monkeypatch.setattr(openai_service, "_transcribe", transcribe)
+    audio = SimpleNamespace(size=300)
+    text, language = openai_service._transcribe_segments(audio, [(name, b"x" * 100) for name in heard])
+    assert language == "hindi" and sorted(calls) == [("part0", None), ("part1", None), ("part2", None)]
+    assert text == "namaste aap kaise hain see you at five phir milte hain"
@@ -0,0 +1,36 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from cal import clients
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(clients, "_clients", {})
+    monkeypatch.setattr(clients, "CLIENT_CONSTRUCTIONS", Counter())
+
+def test_concurrent_first_use_builds_the_client_once():
+    barrier = threading.Barrier(8)
+    sessions = []
+    def use():
+        barrier.wait()
+        sessions.append(clients.get_http_session())
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(session) for session in sessions}) == 1
+    assert clients.get_client_stats() == {"http": 1}
+    adapter = sessions[0].get_adapter("https://api.telegram.org")
+    assert adapter._pool_maxsize == clients.HTTP_POOL_SIZE
+
+def test_set_client_and_reset():
+    stand_in = object()
+    clients.set_client("openai", stand_in)
+    assert clients.get_openai_client() is stand_in
+    first = clients.get_http_session()
+    clients.reset_clients()
+    assert clients.get_http_session() is not first
+    assert clients.get_client_stats() == {"http": 2}
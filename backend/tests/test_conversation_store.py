@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+import cal.firestore
+from app.services.conversation_store import ConversationStore
+from cal.local_firestore import LocalFirestore, LocalStore
+
+@pytest.fixture
+def db(monkeypatch):
+    client = LocalFirestore(LocalStore())
+    monkeypatch.setattr(cal.firestore, "get_firestore_client", lambda: client)
+    monkeypatch.setattr(cal.firestore, "is_local", lambda: True)
+    return client
+
+def _stored(db, user_id):
+    return db.collection("conversations").document(user_id).get().to_dict()
+
+def test_concurrent_appends_from_two_instances_keep_every_turn(db):
+    stores = [ConversationStore(token_budget=100000), ConversationStore(token_budget=100000)]
+
+    def talk(store, name):
+        for i in range(10):
+            store.append_turn("42", f"{name} question {i}", f"{name} answer {i}")
+
+    threads = [threading.Thread(target=talk, args=(store, name)) for store, name in zip(stores, "ab")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(_stored(db, "42")["turns"]) == 40
+
+def test_turn_is_written_before_summarizing_and_turns_added_meanwhile_survive(db):
+    summarizing, release = threading.Event(), threading.Event()
+
+    def summarizer(summary, messages):
+        summarizing.set()
+        release.wait(timeout=5)
+        return f"{len(messages)} messages"
+
+    store = ConversationStore(summarizer=summarizer, token_budget=30, keep_turns=1)
+    store.append_turn("7", "first question here", "first answer here")
+    store.append_turn("7", "second question here", "second answer here")
+    assert summarizing.wait(timeout=5)
+    # The summarizer is still running, yet the newest turn is already stored
+    assert _stored(db, "7")["turns"][-1]["content"] == "second answer here"
+
+    ConversationStore(token_budget=100000).append_turn("7", "third", "reply three")
+    release.set()
+    store.flush(timeout=5)
+    stored = _stored(db, "7")
+    assert stored["summary"] == "2 messages"
+    assert [turn["content"] for turn in stored["turns"]] == [
+        "second question here", "second answer here", "third", "reply three",
+    ]
+
+def test_prompt_stays_within_budget_while_compaction_is_pending(db):
+    store = ConversationStore(token_budget=20, keep_turns=1)
+    store._compactor.submit(threading.Event().wait, 0.2)  # Hold the compactor
+    for i in range(5):
+        store.append_turn("9", f"question number {i}", f"answer number {i}")
+    assert len(_stored(db, "9")["turns"]) == 10
+    messages = store.get_messages("9")
+    assert len(messages) == 2 and messages[-1]["content"] == "answer number 4"
+    store.flush(timeout=5)
+    assert len(_stored(db, "9")["turns"]) == 2
@@ -0,0 +1,30 @@
+from app.utils.dedup import UpdateDeduplicator
+
+def test_redeliveries_are_caught_in_memory():
+    dedup = UpdateDeduplicator(max_size=2)
+    assert dedup.claim(1) and not dedup.claim(1)
+    dedup.claim(2)
+    dedup.claim(3)  # evicts 1
+    assert dedup.claim(1)
+    assert dedup.stats() == {"hits": 1, "persistent_hits": 0, "misses": 4, "cached": 2}
+
+def test_persistent_claim_only_runs_on_an_lru_miss():
+    claimed = set()
+    def claim(update_id):
+        if update_id in claimed:
+            return False
+        claimed.add(update_id)
+        return True
+    first, second = UpdateDeduplicator(persistent_claim=claim), UpdateDeduplicator(persistent_claim=claim)
+    assert first.claim(7)
+    assert not first.claim(7)
+    assert not second.claim(7)  # another instance sees the stored claim
+    assert first.stats()["hits"] == 1 and second.stats()["persistent_hits"] == 1
+
+def test_store_outage_fails_open_and_release_allows_a_retry():
+    def claim(update_id):
+        raise RuntimeError("unavailable")
+    dedup = UpdateDeduplicator(persistent_claim=claim)
+    assert dedup.claim(5)
+    dedup.release(5)
+    assert dedup.claim(5)
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+import cal.firestore
+from cal.firestore import record_interaction_stats, rollup_language_distribution
+from cal.local_firestore import LocalFirestore, LocalStore
+
+@pytest.fixture
+def db(monkeypatch):
+    client = LocalFirestore(LocalStore())
+    monkeypatch.setattr(cal.firestore, "get_firestore_client", lambda: client)
+    monkeypatch.setattr(cal.firestore, "_known_users", type(cal.firestore._known_users)())
+    return client
+
+def _active_users(db, doc_id):
+    return db.collection("public_stats").document(doc_id).get().to_dict().get("active_users", 0)
+
+def test_concurrent_interactions_are_all_counted(db):
+    def record(lang, is_voice):
+        for _ in range(25):
+            record_interaction_stats("20260105", lang, is_voice)
+    threads = [threading.Thread(target=record, args=(lang, lang == "hindi")) for lang in ("hindi", "tamil") * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    week = db.collection("public_stats").document("week_20260105").get().to_dict()
+    assert (week["interactions"], week["voice"]) == (200, 100)
+    assert week["lang_counts"] == {"hindi": {"interactions": 100, "voice": 100}, "tamil": {"interactions": 100, "voice": 0}}
+    assert db.collection("public_stats").document("overall_summary").get().to_dict()["interactions"] == 200
+
+def test_rollup_keeps_pre_migration_counts_once(db):
+    overall = db.collection("public_stats").document("overall_summary")
+    overall.set({"interactions": 5, "language_distribution": [{"lang": "hindi", "interactions": 5, "voice": 2}]})
+    record_interaction_stats("20260105", "hindi", True)
+    record_interaction_stats("20260105", "english", False)
+    for _ in range(2):  # A second roll-up must not count the old array again
+        assert rollup_language_distribution() == 2
+    assert overall.get().to_dict()["language_distribution"] == [
+        {"lang": "hindi", "interactions": 6, "voice": 3},
+        {"lang": "english", "interactions": 1, "voice": 0},
+    ]
+
+def test_a_user_is_new_once_across_instances(db):
+    record_interaction_stats("20260105", "hindi", True, user_id="42")
+    record_interaction_stats("20260105", "hindi", False, user_id="42")
+    cal.firestore._known_users.clear()  # Another instance, which has not seen the user
+    record_interaction_stats("20260112", "hindi", False, user_id="42")
+    assert db.collection("users").document("42").get().to_dict() == {"first_seen_week": "20260105"}
+    assert _active_users(db, "week_20260105") == 1
+    assert _active_users(db, "week_20260112") == 0
+    assert _active_users(db, "overall_summary") == 1
+    assert db.collection("public_stats").document("overall_summary").get().to_dict()["interactions"] == 3
+
+def test_transactions_use_the_cloud_decorator_outside_local(monkeypatch):
+    from google.cloud.firestore_v1.transaction import _Transactional
+    monkeypatch.setattr(cal.firestore, "is_local", lambda: False)
+    assert isinstance(cal.firestore.transactional(lambda transaction: None), _Transactional)
+
+def test_dashboard_rebuild_keeps_the_newest_weeks(db, monkeypatch):
+    monkeypatch.setattr(cal.firestore, "is_local", lambda: True)
+    for week in ("20260105", "20260112", "20260119"):
+        record_interaction_stats(week, "hindi", True, user_id=f"user-{week}")
+    db.collection("public_stats").document("week_notes").set({"interactions": 99})
+
+    assert cal.firestore.rebuild_dashboard(weeks=2) == 2
+    dashboard = db.collection("public_stats").document("dashboard").get().to_dict()
+    assert sorted(dashboard["weeks"]) == ["week_20260112", "week_20260119"]
+    assert dashboard["weeks"]["week_20260119"]["lang_counts"] == {"hindi": {"interactions": 1, "voice": 1}}
+    assert dashboard["overall"]["interactions"] == 3 and dashboard["overall"]["active_users"] == 3
@@ -0,0 +1,24 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services import google_service
+
+def test_abandoned_chunk_stream_cancels_unstarted_synthesis(monkeypatch):
+    release = threading.Event()
+    synthesized = []
+    def synthesize(text, language_code, voice_code, audio_format):
+        synthesized.append(text)
+        if text != "one":
+            release.wait(timeout=5)  # Holds the only worker on "two", so "three" stays queued
+        return text.encode("utf-8")
+    monkeypatch.setattr(google_service, "synthesize_speech_bytes_with_google", synthesize)
+    monkeypatch.setattr(google_service, "split_sentences", lambda text: ["one", "two", "three"])
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(google_service, "_tts_executor", executor)
+
+    chunks = google_service.iter_speech_chunks_with_google("one two three")
+    assert next(chunks) == b"one"
+    chunks.close()
+    release.set()
+    executor.shutdown(wait=True)
+    assert "three" not in synthesized
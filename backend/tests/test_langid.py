@@ -0,0 +1,37 @@
+import pytest
+
+from app.utils.langid import detect_language, identify_language, validate_language
+
+# The same everyday question in Hindi and in Marathi; none of these are in the seed text
+HINDI_MARATHI_PAIRS = [
+    ("मुझे भूख लगी है, खाना कब मिलेगा?", "मला भूक लागली आहे, जेवण कधी मिळेल?"),
+    ("मेरा बेटा बीमार है, डॉक्टर कहाँ मिलेगा?", "माझा मुलगा आजारी आहे, डॉक्टर कुठे मिळेल?"),
+    ("आज बारिश होगी क्या?", "आज पाऊस पडेल का?"),
+    ("गेहूं की फसल में कौन सी खाद डालनी चाहिए?", "गव्हाच्या पिकाला कोणते खत घालावे?"),
+    ("तुम्हारा घर कहाँ है?", "तुमचे घर कुठे आहे?"),
+    ("मुझे बैंक खाता खोलना है", "मला बँक खाते उघडायचे आहे"),
+]
+
+@pytest.mark.parametrize("hindi, marathi", HINDI_MARATHI_PAIRS)
+def test_hindi_and_marathi_pairs_are_told_apart(hindi, marathi):
+    assert identify_language(hindi)[0] == "hindi"
+    assert identify_language(marathi)[0] == "marathi"
+
+@pytest.mark.parametrize("hindi, marathi", HINDI_MARATHI_PAIRS)
+def test_claim_in_the_same_script_is_never_overridden(hindi, marathi):
+    assert validate_language("hindi", hindi) == "hindi"
+    assert validate_language("Hindi", marathi) == "hindi"
+    assert validate_language("marathi", hindi) == "marathi"
+
+def test_near_tie_is_not_confident():
+    # Hindi by a hair; a near tie must not clear the default threshold either way
+    assert detect_language("मैं स्कूल जाता हूँ") in ("hindi", None)
+    assert identify_language("मैं स्कूल जाता हूँ")[1] < 0.5
+
+def test_claim_in_another_script_is_overridden():
+    assert validate_language("english", "मला भूक लागली आहे, जेवण कधी मिळेल?") == "marathi"
+    assert validate_language("hindi", "நான் பள்ளிக்கு செல்கிறேன்") == "tamil"
+
+def test_without_letters_the_claim_stands():
+    assert validate_language("hindi", "12345 ?!") == "hindi"
+    assert identify_language("") == (None, 0.0)
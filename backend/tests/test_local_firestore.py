@@ -0,0 +1,82 @@
+import pytest
+from google.api_core.exceptions import Aborted, AlreadyExists
+from google.cloud.firestore import Increment
+
+from cal.local_firestore import LocalFirestore, LocalStore, transactional
+
+@pytest.fixture
+def db():
+    return LocalFirestore(LocalStore())
+
+def test_create_fails_on_an_existing_document_and_changes_nothing(db):
+    doc = db.collection("processed_updates").document("1")
+    doc.create({"claimed": 1})
+    with pytest.raises(AlreadyExists):
+        doc.create({"claimed": 2})
+    assert doc.get().to_dict() == {"claimed": 1}
+
+    # A batch is all or nothing: the failing create keeps the other write out too
+    batch = db.batch()
+    batch.set(db.collection("processed_updates").document("2"), {"claimed": 3})
+    batch.create(doc, {"claimed": 4})
+    with pytest.raises(AlreadyExists):
+        batch.commit()
+    assert not db.collection("processed_updates").document("2").get().exists
+
+def test_merge_applies_nested_increments_and_keeps_sibling_fields(db):
+    doc = db.collection("public_stats").document("week_20260105")
+    doc.set({"week_start_date": "20260105", "lang_counts": {"hindi": {"interactions": 2, "voice": 1}}})
+    for lang, voice in (("hindi", 1), ("tamil", 0), ("hindi", 0)):
+        doc.set({"interactions": Increment(1),
+                 "lang_counts": {lang: {"interactions": Increment(1), "voice": Increment(voice)}}}, merge=True)
+    assert doc.get().to_dict() == {
+        "week_start_date": "20260105",
+        "interactions": 3,
+        "lang_counts": {"hindi": {"interactions": 4, "voice": 2}, "tamil": {"interactions": 1, "voice": 0}},
+    }
+
+def test_start_after_pages_through_ties_exactly_once(db):
+    logs = db.collection("logs")
+    for i in range(7):
+        logs.document(f"log_{i}").set({"lang": "hindi" if i % 2 else "tamil", "n": i})
+    query = logs.order_by("lang").limit(3)
+    seen, last = [], None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        seen.extend(snapshot.id for snapshot in page)
+        if len(page) < 3:
+            break
+        last = page[-1]
+    # Ties on "lang" are broken by document ID, so a page boundary inside a tie loses nothing
+    assert seen == ["log_1", "log_3", "log_5", "log_0", "log_2", "log_4", "log_6"]
+
+def test_transaction_retries_after_a_concurrent_write(db):
+    doc = db.collection("conversations").document("42")
+    doc.set({"turns": ["a"]})
+    attempts = []
+
+    @transactional
+    def append(transaction):
+        turns = doc.get(transaction=transaction).to_dict()["turns"]
+        attempts.append(list(turns))
+        if len(attempts) == 1:
+            doc.set({"turns": turns + ["from another instance"]})  # Lands between the read and the commit
+        transaction.set(doc, {"turns": turns + ["b"]})
+
+    append(db.transaction())
+    assert attempts == [["a"], ["a", "from another instance"]]
+    assert doc.get().to_dict() == {"turns": ["a", "from another instance", "b"]}
+
+def test_transaction_gives_up_after_max_attempts(db):
+    counter = db.collection("public_stats").document("overall_summary")
+    counter.set({"interactions": 0})
+
+    @transactional
+    def always_contended(transaction):
+        value = counter.get(transaction=transaction).to_dict()["interactions"]
+        counter.set({"interactions": Increment(1)}, merge=True)
+        transaction.set(counter, {"interactions": value + 100})
+
+    with pytest.raises(Aborted):
+        always_contended(db.transaction(max_attempts=2))
+    assert counter.get().to_dict() == {"interactions": 2}
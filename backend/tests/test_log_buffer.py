@@ -0,0 +1,47 @@
+import signal
+from datetime import datetime
+
+from cal.log_buffer import LogBuffer, register_shutdown_flush
+
+def _buffer(commit, tmp_path, **kwargs):
+    return LogBuffer(commit, flush_size=10, max_age=60, max_retries=1, spill_path=str(tmp_path / "spill.jsonl"), **kwargs)
+
+def test_failed_commits_spill_and_are_replayed_when_the_next_buffer_starts(tmp_path):
+    def failing(entries):
+        raise RuntimeError("firestore down")
+    first = _buffer(failing, tmp_path)
+    first.add("20250101120000_1", {"user_id": "1", "date": datetime(2025, 1, 1, 12)})
+    first.close()
+    assert (tmp_path / "spill.jsonl").exists()
+
+    committed = []
+    second = _buffer(committed.extend, tmp_path)
+    second._thread.join(timeout=0.5)  # Replays at startup, then waits for new entries
+    assert committed == [("20250101120000_1", {"user_id": "1", "date": datetime(2025, 1, 1, 12)})]
+    assert not (tmp_path / "spill.jsonl").exists()
+    second.close()
+
+def test_close_flushes_pending_entries(tmp_path):
+    committed = []
+    buffer = _buffer(committed.extend, tmp_path)
+    buffer.add("a", {"n": 1})
+    buffer.add("b", {"n": 2})
+    buffer.close()
+    assert [doc_id for doc_id, _ in committed] == ["a", "b"]
+
+def test_sigterm_flush_is_installed_from_the_main_thread(tmp_path):
+    previous = signal.getsignal(signal.SIGTERM)
+    try:
+        buffer = _buffer(lambda entries: None, tmp_path)
+        register_shutdown_flush(buffer)
+        assert signal.getsignal(signal.SIGTERM) is not previous
+        buffer.close()
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+def test_add_after_close_commits_on_the_callers_thread(tmp_path):
+    committed = []
+    buffer = _buffer(committed.extend, tmp_path)
+    buffer.close()
+    buffer.add("late", {"n": 1})
+    assert committed == [("late", {"n": 1})]
@@ -0,0 +1,105 @@
+import random
+import struct
+
+import pytest
+
+from app.utils.ogg import (
+    BOS, CONTINUED, EOS, OPUS_RATE, OggError, OggPage, ogg_crc, opus_duration, opus_stream, parse_pages,
+    split_opus, write_page,
+)
+
+def _reference_crc(data):
+    crc = 0
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1
+        crc &= 0xFFFFFFFF
+    return crc
+
+def _mux(packet_sizes, page_bytes, samples_per_packet=960, serial=7):
+    """An Ogg Opus stream whose pages close at ~page_bytes, so long packets span pages."""
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, 312, OPUS_RATE, 0, 0)
+    tags = b"OpusTags" + struct.pack("<II", 0, 0)
+    pages = [OggPage(BOS, 0, serial, 0, bytes([len(head)]), head), OggPage(0, 0, serial, 1, bytes([len(tags)]), tags)]
+    rng = random.Random(1)
+    lacing, body, granule, completed, continued = bytearray(), bytearray(), 0, False, False
+
+    def close(next_continued):
+        nonlocal lacing, body, completed, continued
+        pages.append(OggPage(CONTINUED if continued else 0, granule if completed else -1, serial, len(pages),
+                             bytes(lacing), bytes(body)))
+        lacing, body, completed, continued = bytearray(), bytearray(), False, next_continued
+
+    for size in packet_sizes:
+        remaining = size
+        while True:
+            segment = min(remaining, 255)
+            lacing.append(segment)
+            body.extend(rng.randbytes(segment))
+            remaining -= segment
+            if segment < 255:
+                granule += samples_per_packet
+                completed = True
+                if len(body) >= page_bytes:
+                    close(False)
+                break
+            if len(body) >= page_bytes or len(lacing) == 255:
+                close(True)
+    if lacing:
+        close(False)
+    pages[-1] = pages[-1]._replace(header_type=pages[-1].header_type | EOS)
+    return b"".join(write_page(page) for page in pages)
+
+def test_crc_matches_the_bitwise_definition():
+    rng = random.Random(0)
+    for size in (0, 1, 27, 300):
+        data = rng.randbytes(size)
+        assert ogg_crc(data) == _reference_crc(data)
+
+def test_pages_round_trip_and_a_corrupt_byte_is_caught():
+    data = opus_stream(5, [[b"\x01" * 40] * 3 for _ in range(10)])
+    pages = parse_pages(data)
+    assert len(pages) == 12 and pages[-1].granule == 30 * 960 and pages[-1].header_type & EOS
+    assert b"".join(write_page(page) for page in pages) == data
+    corrupt = bytearray(data)
+    corrupt[-1] ^= 0xFF
+    with pytest.raises(OggError, match="Bad CRC"):
+        parse_pages(bytes(corrupt))
+
+def test_segments_are_complete_streams_with_rebased_granules():
+    data = opus_stream(5, [[b"\x02" * 30] * 5 for _ in range(100)])  # 0.1 s pages, 10 s in all
+    original = parse_pages(data)
+    segments = split_opus(data, segment_seconds=4, overlap_seconds=1)
+    assert len(segments) > 1 and segments[0][0] == 0.0
+    audio_seconds = 0.0
+    for index, (start, segment) in enumerate(segments):
+        pages = parse_pages(segment)  # Checks every rewritten CRC
+        assert pages[:2] == original[:2]
+        audio = pages[2:]
+        assert [page.sequence for page in pages] == list(range(len(pages)))
+        assert audio[0].granule == 5 * 960  # Counted from the segment's own start
+        assert [bool(page.header_type & EOS) for page in audio] == [False] * (len(audio) - 1) + [True]
+        end = start + opus_duration(segment) + 312 / OPUS_RATE
+        if index:
+            assert start <= audio_seconds - 1  # Overlaps the previous segment by at least a second
+        audio_seconds = end
+    assert audio_seconds == pytest.approx(opus_duration(data) + 312 / OPUS_RATE, abs=0.11)
+
+def test_segments_never_split_a_packet_continued_across_pages():
+    rng = random.Random(3)
+    sizes = [rng.choice((60, 120, 700)) for _ in range(400)]
+    data = _mux(sizes, page_bytes=600)
+    assert any(page.header_type & CONTINUED for page in parse_pages(data))
+    for _, segment in split_opus(data, segment_seconds=3, overlap_seconds=0.5):
+        audio = parse_pages(segment)[2:]
+        assert not audio[0].header_type & CONTINUED
+        assert audio[-1].ends_packet and audio[-1].granule >= 0
+        # Every packet in the segment is whole: its granule counts exactly the packets it ends
+        finished = sum(1 for page in audio for value in page.lacing if value < 255)
+        assert audio[-1].granule == finished * 960
+        assert all(page.granule == -1 for page in audio if not any(value < 255 for value in page.lacing))
+
+def test_a_short_stream_comes_back_whole():
+    data = opus_stream(5, [[b"\x03" * 10] * 5 for _ in range(10)])
+    assert split_opus(data, segment_seconds=4, overlap_seconds=1) == [(0.0, data)]
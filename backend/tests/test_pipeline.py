@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from app.channels import telegram
+
+UPDATE = {"message": {"chat": {"id": 1}, "from": {"id": 2}, "text": "hello"}}
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    calls = {"sent": [], "recorded": [], "stages": []}
+
+    def generate_response(prompt, **kwargs):
+        return {"language": "english", "answer": f"re: {prompt}"}
+
+    def send_message(token, chat_id, text=None, **kwargs):
+        calls["sent"].append((chat_id, text))
+
+    def handle_new_interaction(interaction, timestamp=None):
+        calls["recorded"].append((interaction["reply"], threading.current_thread().name))
+
+    log = telegram.StageTimer.log
+    def capture_log(timer, mode, content_type, reply_ms=None):
+        calls["stages"].append(set(timer.stages))
+        log(timer, mode, content_type, reply_ms=reply_ms)
+
+    monkeypatch.setattr(telegram, "generate_response", generate_response)
+    monkeypatch.setattr(telegram, "send_message", send_message)
+    monkeypatch.setattr(telegram, "handle_new_interaction", handle_new_interaction)
+    monkeypatch.setattr(telegram.StageTimer, "log", capture_log)
+    for name, value in {"REPLY_MODE": "complete", "RESPONSE_CACHE": False, "LANGUAGE_ID": False,
+                        "ANSWER_FORMAT": "json", "CONVERSATION_MEMORY": False}.items():
+        monkeypatch.setattr(telegram, name, value)
+    return calls
+
+def test_sequential_mode_records_on_the_request_thread(pipeline):
+    telegram.handle_update("token", UPDATE, mode="sequential")
+    assert pipeline["sent"] == [(1, "re: hello")]
+    assert pipeline["recorded"] == [("re: hello", threading.current_thread().name)]
+    assert {"llm", "send_text", "firestore"} <= pipeline["stages"][0]
+
+def test_concurrent_mode_moves_the_firestore_writes_off_the_reply_path(pipeline):
+    telegram.handle_update("token", UPDATE, mode="concurrent")
+    assert pipeline["sent"] == [(1, "re: hello")]
+    (reply, thread_name), = pipeline["recorded"]
+    assert reply == "re: hello" and thread_name.startswith("pipeline")
+    assert {"llm", "send_text", "firestore"} <= pipeline["stages"][0]
+
+def test_stage_timer_records_durations_and_marks():
+    timer = telegram.StageTimer()
+    with timer.stage("llm"):
+        pass
+    timer.mark("first_text")
+    assert set(timer.stages) == {"llm", "first_text"}
+    assert 0 <= timer.stages["llm"] <= timer.stages["first_text"] <= timer.total_ms()
@@ -0,0 +1,27 @@
+import pytest
+
+from app.services.response_cache import ResponseCache
+
+pytest.importorskip("numpy")
+
+def test_semantic_miss_then_put_embeds_the_question_once():
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return [1.0, 0.0] if "weather" in text else [0.0, 1.0]
+
+    cache = ResponseCache("v1", embed_fn=embed)
+    assert cache.get("What is the weather?", "english") is None
+    cache.put("What is the weather?", {"language": "english", "answer": "Sunny"}, "english")
+    assert calls == ["what is the weather?"]
+    # The reused vector still serves near-duplicates
+    assert cache.get("weather today", "english") == {"language": "english", "answer": "Sunny"}
+
+def test_a_reply_is_only_reused_for_the_same_language_and_format():
+    cache = ResponseCache("v1")
+    cache.put("What is the weather?", {"language": "hindi", "answer": "धूप"}, "hindi", True)
+    assert cache.get("what is  the weather?", "hindi", True) == {"language": "hindi", "answer": "धूप"}
+    assert cache.get("What is the weather?", "tamil", True) is None
+    assert cache.get("What is the weather?", "hindi", False) is None
+    assert cache.get("What is the weather?") is None
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from cal.secrets import SecretCache
+
+class Source:
+    """A secret source whose value changes on every fetch; counts its fetches."""
+    def __init__(self, delay=0.0):
+        self.fetches = 0
+        self._delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self, key):
+        time.sleep(self._delay)
+        with self._lock:
+            self.fetches += 1
+            return f"{key}-v{self.fetches}"
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_concurrent_misses_fetch_once():
+    source = Source(delay=0.05)
+    cache = SecretCache(source, ttl=0)
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(cache.get("TOKEN"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert values == ["TOKEN-v1"] * 8 and source.fetches == 1
+
+def test_stale_value_is_served_while_it_is_refetched():
+    source = Source()
+    cache = SecretCache(source, ttl=0.05)
+    assert cache.get("TOKEN") == "TOKEN-v1"
+    time.sleep(0.06)
+    assert cache.get("TOKEN") == "TOKEN-v1"  # Stale, refreshed in the background
+    _wait_for(lambda: cache.stats()["refreshes"] == 1)
+    assert cache.get("TOKEN") == "TOKEN-v2"
+    assert cache.stats()["stale_hits"] == 1
+
+def test_refresh_soon_is_rate_limited():
+    source = Source()
+    cache = SecretCache(source, ttl=0, min_refresh_interval=60)
+    cache.get("WEBHOOK_SECRET")
+    cache.refresh_soon("WEBHOOK_SECRET")  # Fetched moments ago: ignored
+    assert source.fetches == 1
+
+    cache = SecretCache(source, ttl=0, min_refresh_interval=0)
+    cache.get("WEBHOOK_SECRET")
+    cache.refresh_soon("WEBHOOK_SECRET")
+    _wait_for(lambda: cache.stats()["refreshes"] == 1)
+    assert cache.get("WEBHOOK_SECRET") == "WEBHOOK_SECRET-v3"
+
+def test_failed_refresh_keeps_the_cached_value():
+    calls = []
+    def fetch(key):
+        calls.append(key)
+        if len(calls) > 1:
+            raise RuntimeError("unavailable")
+        return "v1"
+    cache = SecretCache(fetch, ttl=0, min_refresh_interval=0)
+    assert cache.get("TOKEN") == "v1"
+    cache.refresh_soon("TOKEN")
+    _wait_for(lambda: cache.stats()["refresh_failures"] == 1)
+    assert cache.get("TOKEN") == "v1"
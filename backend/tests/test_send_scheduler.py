@@ -0,0 +1,56 @@
+import pytest
+import requests
+from urllib3.exceptions import ProtocolError
+
+from app.utils import send_scheduler as scheduler_module
+from app.utils.send_scheduler import SendScheduler, send_budget
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "TELEGRAM_RETRY_BASE_DELAY", 0.0)
+
+def _failing(*errors):
+    """A call that raises the given errors in turn, then returns "ok"; counts its attempts."""
+    pending = list(errors)
+    def call():
+        call.attempts += 1
+        if pending:
+            raise pending.pop(0)
+        return "ok"
+    call.attempts = 0
+    return call
+
+def _rate_limited(retry_after):
+    response = requests.Response()
+    response.status_code = 429
+    response._content = b'{"ok": false, "parameters": {"retry_after": %d}}' % retry_after
+    return requests.HTTPError("429 Too Many Requests", response=response)
+
+def _scheduler():
+    return SendScheduler(chat_rate=1000, chat_burst=100, global_rate=1000, global_burst=100, enabled=True)
+
+def test_send_is_retried_after_a_connect_failure():
+    call = _failing(requests.ConnectTimeout("connect timed out"), requests.ConnectionError("refused"))
+    assert _scheduler().send(1, "sendMessage", call) == "ok"
+    assert call.attempts == 3
+
+@pytest.mark.parametrize("error", [
+    requests.ReadTimeout("read timed out"),
+    requests.ConnectionError(ProtocolError("Connection aborted.")),
+])
+def test_send_is_not_retried_once_it_may_have_been_delivered(error):
+    call = _failing(error)
+    with pytest.raises(type(error)):
+        _scheduler().send(1, "sendMessage", call)
+    assert call.attempts == 1
+
+def test_edit_is_retried_after_a_read_timeout():
+    call = _failing(requests.ReadTimeout("read timed out"))
+    assert _scheduler().send(1, "editMessageText", call) == "ok"
+    assert call.attempts == 2
+
+def test_retry_after_beyond_the_request_budget_is_not_waited_for():
+    call = _failing(_rate_limited(5))
+    with send_budget(2), pytest.raises(requests.HTTPError):
+        _scheduler().send(1, "sendMessage", call)
+    assert call.attempts == 1
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import cal.secrets
+from app.utils import startup
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def prefetched(monkeypatch):
+    monkeypatch.setattr(startup, "_started", False)
+    monkeypatch.setattr(startup, "warm_up_done", threading.Event())
+    calls = []
+    def prefetch_secrets(keys):
+        calls.append(list(keys))
+        return dict.fromkeys(keys, True)
+    monkeypatch.setattr(cal.secrets, "prefetch_secrets", prefetch_secrets)
+    return calls
+
+def test_lazy_mode_fetches_nothing_and_runs_once(prefetched):
+    startup.start(mode="lazy")
+    startup.start(mode="prefetch")  # Already started: ignored
+    assert prefetched == [] and startup.warm_up_done.is_set()
+
+def test_prefetch_mode_loads_the_startup_secrets(prefetched):
+    startup.start(mode="prefetch")
+    assert prefetched == [startup.STARTUP_SECRETS]
+
+def test_warm_mode_builds_clients_in_the_background_and_survives_failures(prefetched, monkeypatch):
+    built = []
+    def broken():
+        raise RuntimeError("no credentials")
+    monkeypatch.setattr(startup, "_warm_up_steps", lambda: [("broken", broken), ("http", lambda: built.append("http"))])
+    startup.start(mode="warm")
+    assert startup.warm_up_done.wait(timeout=2)
+    assert prefetched == [startup.STARTUP_SECRETS] and built == ["http"]
+
+def test_importing_the_entry_point_defers_the_heavy_sdks():
+    heavy = ["google.cloud.firestore", "google.cloud.texttospeech", "google.cloud.storage", "openai", "numpy"]
+    code = f"import sys, main; print([name for name in {heavy!r} if name in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,21 @@
+from app.services.openai_service import stitch_transcripts
+
+def test_overlap_is_dropped_once():
+    # Matching ignores case and punctuation; the earlier segment's wording is kept
+    assert stitch_transcripts(["Hello, how are you", "How are you? I am fine"]) == "Hello, how are you I am fine"
+
+def test_half_words_at_the_cut_are_skipped():
+    assert (stitch_transcripts(["we will go to the mar", "ket go to the market tomorrow"])
+            == "we will go to the market tomorrow")
+
+def test_a_single_matching_word_is_not_an_overlap():
+    assert stitch_transcripts(["I want the", "the red one"]) == "I want the the red one"
+
+def test_repeated_words_inside_a_segment_are_kept():
+    texts = ["bahut bahut dhanyavaad aapka", "aapka swagat hai, swagat hai ji"]
+    assert stitch_transcripts(texts) == "bahut bahut dhanyavaad aapka aapka swagat hai, swagat hai ji"
+    texts = ["no no no I said", "I said no no"]
+    assert stitch_transcripts(texts) == "no no no I said no no"
+
+def test_segments_without_overlap_are_joined():
+    assert stitch_transcripts(["first part", "", "second part"]) == "first part second part"
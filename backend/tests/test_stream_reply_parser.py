@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+from app.services.openai_service import _StreamReplyParser
+
+def _chunk(text):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+def _parse(*deltas):
+    parser = _StreamReplyParser(span=None, language=None, plain=False)
+    pairs = [pair for delta in deltas for pair in parser.feed(_chunk(delta))] + parser.finish()
+    return pairs[-1][0] if pairs else parser._language, "".join(text for _, text in pairs)
+
+def test_language_tag_line_is_consumed():
+    assert _parse("Hin", "di\n", "नमस्ते, ", "कैसे हैं?") == ("hindi", "नमस्ते, कैसे हैं?")
+
+def test_one_word_opener_is_kept_as_answer():
+    assert _parse("Sure!\n", "Here is how.") == (None, "Sure!\nHere is how.")
+    assert _parse("Namaste!\nAap kaise hain?") == (None, "Namaste!\nAap kaise hain?")
+
+def test_single_line_reply_without_newline_is_answer():
+    assert _parse("Hello!") == (None, "Hello!")
+
+def test_tag_only_reply_has_no_text():
+    assert _parse("English") == ("english", "")
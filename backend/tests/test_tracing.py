@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.utils import tracing
+
+@pytest.fixture
+def metrics(monkeypatch):
+    registry = tracing.MetricsRegistry()
+    monkeypatch.setattr(tracing, "metrics", registry)
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    return registry
+
+def test_histogram_percentiles_stay_within_the_observed_range():
+    histogram = tracing.Histogram()
+    for value in range(1, 101):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert (snapshot["count"], snapshot["min"], snapshot["max"], snapshot["mean"]) == (100, 1, 100, 50.5)
+    assert 20 <= snapshot["p50"] <= 50 and 50 <= snapshot["p95"] <= 100
+    assert tracing.Histogram().snapshot()["p50"] is None
+
+def test_spans_in_worker_threads_join_the_interaction_trace(metrics):
+    def work():
+        with tracing.span("openai.chat", model="gpt", prompt_tokens=12, response_bytes=300):
+            pass
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        with tracing.trace("interaction") as trace:
+            with tracing.span("stage.llm"):
+                tracing.submit(pool, work).result()
+
+    assert set(trace.breakdown()) == {"interaction", "stage.llm", "openai.chat"}
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["usage.prompt_tokens{model=gpt}"] == 12
+    assert snapshot["histograms"]["span.response_bytes{span=openai.chat}"]["count"] == 1
+
+def test_errors_and_retries_are_counted(metrics):
+    with pytest.raises(ValueError):
+        with tracing.span("telegram.sendMessage"):
+            tracing.current_span().add("attempts")
+            tracing.current_span().add("attempts")
+            raise ValueError("bad request")
+    counters = metrics.snapshot()["counters"]
+    assert counters["span.errors{error=ValueError,span=telegram.sendMessage}"] == 1
+    assert counters["span.retries{span=telegram.sendMessage}"] == 1
+
+def test_providers_are_polled_and_failures_reported(metrics):
+    metrics.register_provider("cache", lambda: {"hits": 3})
+    metrics.register_provider("broken", lambda: 1 / 0)
+    stats = metrics.snapshot()["stats"]
+    assert stats["cache"] == {"hits": 3} and "error" in stats["broken"]
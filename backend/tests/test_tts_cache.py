@@ -0,0 +1,25 @@
+from app.services.tts_cache import TTSCache
+
+def test_file_ids_are_an_lru_with_a_cap():
+    cache = TTSCache(max_file_ids=2)
+    cache.put_file_id("a", "file-a", 10)
+    cache.put_file_id("b", "file-b", 10)
+    assert cache.get_file_id("a") == "file-a"  # "b" is now the least recently used
+    cache.put_file_id("c", "file-c", 10)
+    assert cache.get_file_id("b") is None
+    assert cache.get_file_id("a") == "file-a" and cache.get_file_id("c") == "file-c"
+    assert cache.stats()["file_ids"] == 2
+
+def test_audio_lru_is_bounded_by_bytes():
+    cache = TTSCache(max_memory_bytes=10)
+    cache.put("a", b"x" * 6)
+    cache.put("b", b"y" * 6)
+    assert cache.get("a") is None and cache.get("b") == b"y" * 6
+
+def test_disabled_cache_stores_nothing():
+    cache = TTSCache(enabled=False)
+    cache.put("a", b"audio")
+    cache.put_file_id("a", "file-a", 5)
+    assert cache.get("a") is None
+    assert cache.get_file_id("a") is None
+    assert cache.stats()["memory_entries"] == 0 and cache.stats()["file_ids"] == 0
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from app.channels import telegram
+from app.services import google_service
+from app.services.tts_cache import TTSCache
+
+texttospeech = SimpleNamespace(
+    AudioConfig=lambda **kwargs: kwargs,
+    AudioEncoding=SimpleNamespace(MP3="MP3", OGG_OPUS="OGG_OPUS"),
+)
+
+def test_audio_config_per_format():
+    assert google_service._audio_config(texttospeech, "mp3") == {"audio_encoding": "MP3"}
+    assert google_service._audio_config(texttospeech, "ogg_opus") == {
+        "audio_encoding": "OGG_OPUS",
+        "sample_rate_hertz": google_service.GOOGLE_OPUS_SAMPLE_RATE_HZ,
+    }
+
+def _capture_posts(monkeypatch, file_ids):
+    posts = []
+    def post(token, method, payload_bytes=0, chat_id=None, coalesce_key=None, **kwargs):
+        posts.append((method, kwargs))
+        return {"result": {"voice": {"file_id": file_ids.pop(0)}}}
+    monkeypatch.setattr(telegram, "_telegram_post", post)
+    return posts
+
+def test_ogg_opus_reply_is_sent_as_a_voice_note_then_by_file_id(monkeypatch):
+    posts = _capture_posts(monkeypatch, ["voice-1", "voice-2"])
+    synthesized = []
+    def synthesize(text, language_code, voice_code, audio_format):
+        synthesized.append(audio_format)
+        return b"OggS-opus"
+    monkeypatch.setattr(telegram, "synthesize_speech_bytes_with_google", synthesize)
+    monkeypatch.setattr(telegram, "tts_cache", TTSCache())
+    monkeypatch.setattr(telegram, "TTS_MODE", "single")
+
+    for _ in range(2):
+        telegram._reply_with_audio("token", 1, "namaste", "hi-IN", None, telegram.StageTimer(),
+                                   audio_format="ogg_opus")
+
+    assert synthesized == ["ogg_opus"]
+    (method, first), (resent, second) = posts
+    assert method == resent == "sendVoice"
+    assert first["files"] == {"voice": ("reply.ogg", b"OggS-opus", "audio/ogg")}
+    assert second["json"] == {"chat_id": 1, "voice": "voice-1"}
+
+def test_mp3_stays_the_default_reply_format(monkeypatch):
+    posts = _capture_posts(monkeypatch, ["audio-1"])
+    telegram.send_message("token", 1, audio_bytes=b"ID3")
+    assert posts[0][0] == "sendAudio"
+    assert posts[0][1]["files"] == {"audio": ("reply.mp3", b"ID3", "audio/mpeg")}
+    assert telegram.VOICE_REPLY_FORMAT == "mp3"
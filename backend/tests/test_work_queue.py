@@ -0,0 +1,54 @@
+import os
+import time
+
+from app.utils import work_queue
+from app.utils.work_queue import FileQueue, InProcessQueue
+
+def test_in_process_nack_backs_off(monkeypatch):
+    monkeypatch.setattr(work_queue, "retry_delay", lambda attempts: 0.2)
+    queue = InProcessQueue()
+    queue.put({"update_id": 1})
+    item = queue.get(timeout=0.1)
+    queue.nack(item)
+    assert queue.depth() == 1
+    assert queue.get(timeout=0.05) is None  # Still backing off
+    item = queue.get(timeout=1.0)
+    assert item["attempts"] == 1 and item["update"] == {"update_id": 1}
+
+def test_file_queue_holds_a_retry_until_it_is_due(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_queue, "retry_delay", lambda attempts: 0.3)
+    queue = FileQueue(str(tmp_path))
+    queue.put({"update_id": 1})
+    queue.nack(queue.get(timeout=0.1))
+    assert queue.get(timeout=0.1) is None
+    item = queue.get(timeout=1.0)
+    assert item["attempts"] == 1
+    queue.ack(item)
+    assert queue.depth() == 0
+
+def test_file_queue_only_reclaims_expired_leases(tmp_path):
+    queue = FileQueue(str(tmp_path), lease_seconds=60)
+    queue.put({"update_id": "stale"})
+    queue.put({"update_id": "live"})
+    stale, live = queue.get(timeout=0.1), queue.get(timeout=0.1)
+    old = time.time() - 120
+    os.utime(stale["_path"], (old, old))
+
+    # A second instance starting up (e.g. after a crash) takes back only the stale claim
+    restarted = FileQueue(str(tmp_path), lease_seconds=60)
+    item = restarted.get(timeout=0.1)
+    assert item["update"] == {"update_id": "stale"}
+    assert restarted.get(timeout=0.1) is None
+    assert os.path.exists(live["_path"])
+
+def test_queue_mode_needs_cpu_and_a_persistent_file_queue(monkeypatch):
+    monkeypatch.setattr(work_queue, "CPU_ALWAYS_ALLOCATED", False)
+    monkeypatch.setattr(work_queue, "QUEUE_BACKEND", "file")
+    monkeypatch.setattr(work_queue, "QUEUE_DIR", "/mnt/queue")
+    assert work_queue.queue_mode_refusal() == "CPU_ALWAYS_ALLOCATED is off"
+    monkeypatch.setattr(work_queue, "CPU_ALWAYS_ALLOCATED", True)
+    assert work_queue.queue_mode_refusal() is None
+    monkeypatch.setattr(work_queue, "QUEUE_DIR", "")
+    assert "QUEUE_DIR" in work_queue.queue_mode_refusal()
+    monkeypatch.setattr(work_queue, "QUEUE_BACKEND", "memory")
+    assert "QUEUE_BACKEND" in work_queue.queue_mode_refusal()
@@ -7,6 +7,33 @@ import { query, where } from 'firebase/firestore';
 
 const PUBLIC_STATS_COLLECTION = "public_stats";
 const OVERALL_SUMMARY_DOC = "overall_summary";
+// Maintained by the backend: overall totals plus the last N weeks in one document.
+// Only complete once the backend has built it from the history (built_at is set).
+const DASHBOARD_DOC = "dashboard";
+
+// { hindi: { interactions, voice }, ... } -> [{ lang, interactions, voice }], largest first
+const toLanguageDistribution = (langCounts = {}) =>
+    Object.entries(langCounts)
+        .map(([lang, counts]) => ({ lang, interactions: counts.interactions || 0, voice: counts.voice || 0 }))
+        .sort((a, b) => b.interactions - a.interactions);
+
+// Converts the dashboard document into the { overall, weekly } shape the components read
+const fromDashboardDoc = (dashboard) => {
+    const { lang_counts, ...overallCounts } = dashboard.overall;
+    const weekly = Object.entries(dashboard.weeks || {})
+        .map(([id, { lang_counts: weekLangCounts, ...week }]) => ({
+            id,
+            sortKey: parseInt(week.week_start_date),
+            ...week,
+            language_distribution: toLanguageDistribution(weekLangCounts),
+        }))
+        // Sort data from latest week (highest sortKey) to oldest (lowest sortKey)
+        .sort((a, b) => b.sortKey - a.sortKey);
+    return {
+        overall: { ...overallCounts, language_distribution: toLanguageDistribution(lang_counts) },
+        weekly,
+    };
+};
 
 export const useDashboardData = () => {
     const [data, setData] = useState({ overall: null, weekly: [] });
@@ -16,6 +43,14 @@ export const useDashboardData = () => {
     useEffect(() => {
         const fetchData = async () => {
             try {
+                // 0. One read when the precomputed dashboard document exists
+                const dashboardDocSnap = await getDoc(doc(db, PUBLIC_STATS_COLLECTION, DASHBOARD_DOC));
+                if (dashboardDocSnap.exists() && dashboardDocSnap.data().built_at) {
+                    setData(fromDashboardDoc(dashboardDocSnap.data()));
+                    return;
+                }
+
+                // Fallback until the backend has built it: summary plus a scan of the weekly documents
                 // 1. Fetch OVERALL SUMMARY
                 const overallDocRef = doc(db, PUBLIC_STATS_COLLECTION, OVERALL_SUMMARY_DOC);
                 const overallDocSnap = await getDoc(overallDocRef);
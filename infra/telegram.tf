@@ -174,6 +174,21 @@ resource "google_project_iam_member" "function_firestore_user" {
   member  = "serviceAccount:${google_service_account.sa_for_function.email}"
 }
 
+# 6.6. EXPIRE OLD DEDUP CLAIMS
+# --------------------------------------------------------------------------------
+
+# processed_updates holds one claim per Telegram update; Firestore deletes each
+# document once its expire_at has passed (set by cal/firestore.claim_update_id)
+resource "google_firestore_field" "processed_updates_ttl" {
+  project    = var.project_id
+  database   = "(default)"
+  collection = "processed_updates"
+  field      = "expire_at"
+
+  ttl_config {}
+  index_config {} # The TTL field is never queried, so skip its single-field indexes
+}
+
 # 7. OUTPUT THE FUNCTION URL
 # --------------------------------------------------------------------------------
 
@@ -200,4 +215,83 @@ resource "google_cloud_run_v2_service_iam_member" "allow_unauthenticated" {
   name     = google_cloudfunctions2_function.python_function.name
   role     = "roles/run.invoker"
   member   = "allUsers"
+}
+
+# 9. SCHEDULED STATS ROLL-UP
+# --------------------------------------------------------------------------------
+
+# Rebuilds language_distribution from the lang_counts maps (and maintains the
+# dashboard document) on a schedule. Same source as the webhook, another entry point.
+variable "rollup_schedule" {
+  description = "Cron schedule (in the region's time zone) for the stats roll-up job."
+  type        = string
+  default     = "*/15 * * * *"
+}
+
+resource "google_project_service" "cloud_scheduler" {
+  project = var.project_id
+  service = "cloudscheduler.googleapis.com"
+}
+
+resource "google_cloudfunctions2_function" "rollup_function" {
+  name     = "${var.function_name}-rollup"
+  location = var.region
+  project  = var.project_id
+
+  depends_on = [google_project_service.cloud_run]
+
+  build_config {
+    runtime     = "python312"
+    entry_point = "rollup_stats"
+    source {
+      storage_source {
+        bucket = google_storage_bucket.source_bucket.name
+        object = google_storage_bucket_object.archive.name
+      }
+    }
+  }
+
+  service_config {
+    max_instance_count    = 1
+    min_instance_count    = 0
+    available_memory      = "256Mi"
+    ingress_settings      = "ALLOW_ALL"
+    service_account_email = google_service_account.sa_for_function.email
+    timeout_seconds       = 300
+  }
+}
+
+# Only the scheduler may invoke the roll-up; it authenticates with an OIDC token
+resource "google_service_account" "sa_for_scheduler" {
+  project      = var.project_id
+  account_id   = "sa-voice-bot-scheduler"
+  display_name = "Service Account for the Stats Roll-up Schedule"
+}
+
+resource "google_cloud_run_v2_service_iam_member" "rollup_invoker" {
+  location = google_cloudfunctions2_function.rollup_function.location
+  name     = google_cloudfunctions2_function.rollup_function.name
+  role     = "roles/run.invoker"
+  member   = "serviceAccount:${google_service_account.sa_for_scheduler.email}"
+}
+
+resource "google_cloud_scheduler_job" "rollup_schedule" {
+  name      = "${var.function_name}-rollup"
+  region    = var.region
+  project   = var.project_id
+  schedule  = var.rollup_schedule
+  time_zone = "Asia/Kolkata"
+
+  depends_on = [google_project_service.cloud_scheduler]
+
+  attempt_deadline = "320s"
+
+  http_target {
+    http_method = "POST"
+    uri         = google_cloudfunctions2_function.rollup_function.service_config[0].uri
+    oidc_token {
+      service_account_email = google_service_account.sa_for_scheduler.email
+      audience              = google_cloudfunctions2_function.rollup_function.service_config[0].uri
+    }
+  }
 }
\ No newline at end of file